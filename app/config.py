@@ -15,6 +15,8 @@ DATABASE_CONFIG = {
     'dbname': os.getenv('DB_NAME', 'nl2sql_demo'),
     'user': os.getenv('DB_USER', 'postgres'),
     'password': os.getenv('DB_PASSWORD', ''),
+    'pool_size': int(os.getenv('DB_POOL_SIZE', '5')),
+    'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '10')),
 }
 
 # LLM配置
@@ -25,6 +27,7 @@ LLM_CONFIG = {
     'model': os.getenv('LLM_MODEL', ''),  # 具体的模型名称
     'temperature': float(os.getenv('LLM_TEMPERATURE', '0.1')),
     'max_tokens': int(os.getenv('LLM_MAX_TOKENS', '1024')),
+    'context_window': int(os.getenv('LLM_CONTEXT_WINDOW', '32768')),  # 模型上下文窗口（token）
 }
 
 # Embedding配置
@@ -33,6 +36,11 @@ EMBEDDING_CONFIG = {
     'api_uri': os.getenv('EMBEDDING_API_URI', ''),
     'api_key': os.getenv('EMBEDDING_API_KEY', ''),
     'model': os.getenv('EMBEDDING_MODEL', ''),
+    'batch_size': int(os.getenv('EMBEDDING_BATCH_SIZE', '10')),  # 单次请求的最大文本数（服务商批量上限）
+    'max_concurrency': int(os.getenv('EMBEDDING_MAX_CONCURRENCY', '4')),  # 并发批次数
+    'max_retries': int(os.getenv('EMBEDDING_MAX_RETRIES', '3')),  # 429/5xx重试次数
+    'backoff_factor': float(os.getenv('EMBEDDING_BACKOFF_FACTOR', '0.5')),  # 指数退避系数（秒）
+    'timeout': float(os.getenv('EMBEDDING_TIMEOUT', '30')),  # 请求超时（秒）
 }
 
 # Vanna配置
@@ -43,6 +51,38 @@ VANNA_CONFIG = {
     'db_impl': os.getenv('VANNA_DB_IMPL', 'pgvector'),  # 使用pgvector
 }
 
+# Embedding缓存配置
+EMBEDDING_CACHE_CONFIG = {
+    'enabled': os.getenv('EMBEDDING_CACHE_ENABLED', 'true').lower() == 'true',
+    'memory_size': int(os.getenv('EMBEDDING_CACHE_MEMORY_SIZE', '10000')),  # 内存LRU层条目数
+    'persist': os.getenv('EMBEDDING_CACHE_PERSIST', 'true').lower() == 'true',  # 是否启用持久层
+    'file_name': os.getenv('EMBEDDING_CACHE_FILE', 'embedding_cache.sqlite3'),  # 位于persist_directory下
+    'max_disk_entries': int(os.getenv('EMBEDDING_CACHE_MAX_DISK_ENTRIES', '500000')),
+}
+
+# 问题-SQL缓存配置
+QUERY_CACHE_CONFIG = {
+    'enabled': os.getenv('QUERY_CACHE_ENABLED', 'true').lower() == 'true',
+    'max_entries': int(os.getenv('QUERY_CACHE_MAX_ENTRIES', '2000')),
+    'ttl_seconds': int(os.getenv('QUERY_CACHE_TTL', '86400')),
+    'semantic_enabled': os.getenv('QUERY_CACHE_SEMANTIC', 'true').lower() == 'true',
+    'similarity_threshold': float(os.getenv('QUERY_CACHE_SIMILARITY', '0.95')),  # 语义缓存命中的最小余弦相似度
+    'version_check_interval': float(os.getenv('QUERY_CACHE_VERSION_CHECK', '30')),  # 检查训练数据是否变化的间隔（秒）
+}
+
+# 查询结果缓存配置
+RESULT_CACHE_CONFIG = {
+    'enabled': os.getenv('RESULT_CACHE_ENABLED', 'true').lower() == 'true',
+    'max_bytes': int(os.getenv('RESULT_CACHE_MAX_BYTES', str(128 * 1024 * 1024))),  # 缓存结果总大小上限
+    'max_entry_bytes': int(os.getenv('RESULT_CACHE_MAX_ENTRY_BYTES', str(16 * 1024 * 1024))),  # 单个结果大小上限
+    'ttl_seconds': float(os.getenv('RESULT_CACHE_TTL', '300')),
+    # 数据版本：配置version_sql（返回单个值，如数仓最近加载时间）时使用其结果，
+    # 否则使用version_schemas中各表在pg_stat_user_tables里的修改计数
+    'version_sql': os.getenv('RESULT_CACHE_VERSION_SQL', ''),
+    'version_schemas': [s.strip() for s in os.getenv('RESULT_CACHE_VERSION_SCHEMAS', 'public').split(',') if s.strip()],
+    'version_check_interval': float(os.getenv('RESULT_CACHE_VERSION_CHECK', '10')),  # 检查数据版本的间隔（秒）
+}
+
 # 日志配置
 LOGGING_CONFIG = {
     'level': os.getenv('LOG_LEVEL', 'INFO'),
@@ -54,16 +94,153 @@ LOGGING_CONFIG = {
 SECURITY_CONFIG = {
     'allowed_operations': ['SELECT'],  # 只允许SELECT操作，防止潜在的危险操作
     'max_query_execution_time': int(os.getenv('MAX_QUERY_TIME', '30')),  # 最大查询执行时间（秒）
+    # 允许访问的schema，为空时不限制（逗号分隔）；未指定schema的表按public处理
+    'allowed_schemas': [s.strip().lower() for s in os.getenv('SQL_ALLOWED_SCHEMAS', '').split(',') if s.strip()],
+    # 禁止访问的schema（逗号分隔），默认为向量存储、应用程序自身和系统schema
+    'blocked_schemas': [
+        s.strip().lower() for s in os.getenv(
+            'SQL_BLOCKED_SCHEMAS', 'nl2vec,nl2sql,pg_catalog,information_schema'
+        ).split(',') if s.strip()
+    ],
+    # 允许访问的表（schema.table，逗号分隔），为空时不限制
+    'allowed_tables': [s.strip().lower() for s in os.getenv('SQL_ALLOWED_TABLES', '').split(',') if s.strip()],
+    # 禁止调用的函数（逗号分隔）
+    'blocked_functions': [
+        s.strip().lower() for s in os.getenv(
+            'SQL_BLOCKED_FUNCTIONS',
+            'pg_sleep,pg_read_file,pg_read_binary_file,pg_ls_dir,pg_stat_file,lo_import,lo_export,'
+            'dblink,dblink_exec,pg_terminate_backend,pg_cancel_backend,set_config,lo_get,'
+            # 以下函数执行字符串形式的SQL或按名称读取表，会绕过schema和表的访问限制
+            'query_to_xml,query_to_xmlschema,query_to_xml_and_xmlschema,'
+            'table_to_xml,table_to_xmlschema,table_to_xml_and_xmlschema,cursor_to_xml,cursor_to_xmlschema,'
+            'schema_to_xml,schema_to_xmlschema,schema_to_xml_and_xmlschema,'
+            'database_to_xml,database_to_xmlschema,database_to_xml_and_xmlschema,'
+            # 序列函数会修改序列值，不受allowed_operations限制
+            'nextval,setval,pg_notify'
+        ).split(',') if s.strip()
+    ],
+    # 禁止调用的函数名前缀（逗号分隔），覆盖同一族的所有函数（如pg_sleep_for、dblink_connect、lo_put）
+    'blocked_function_prefixes': [
+        s.strip().lower() for s in os.getenv(
+            'SQL_BLOCKED_FUNCTION_PREFIXES',
+            'pg_sleep,dblink,lo_,pg_advisory,pg_try_advisory,pg_ls_,pg_read_,pg_stat_file,pg_file_,'
+            'pg_terminate_,pg_cancel_,pg_reload_,pg_rotate_,pg_promote,pg_create_,pg_drop_,pg_replication_,'
+            'pg_switch_,pg_backup_,pg_start_backup,pg_stop_backup,pg_import_,'
+            'query_to_xml,table_to_xml,cursor_to_xml,schema_to_xml,database_to_xml'
+        ).split(',') if s.strip()
+    ],
+    'ast_cache_size': int(os.getenv('SQL_AST_CACHE_SIZE', '2048')),  # 缓存的SQL解析结果数
+}
+
+# 查询成本准入配置（执行前EXPLAIN估算，阈值为0表示不限制）
+COST_GUARD_CONFIG = {
+    'enabled': os.getenv('COST_GUARD_ENABLED', 'true').lower() == 'true',
+    'max_cost': float(os.getenv('COST_GUARD_MAX_COST', '1000000')),  # 估算总成本阈值
+    'max_rows': float(os.getenv('COST_GUARD_MAX_ROWS', '1000000')),  # 估算返回行数阈值
+    'action': os.getenv('COST_GUARD_ACTION', 'limit'),  # 超过阈值时的处理方式: reject、limit或queue
+    'reject_cost': float(os.getenv('COST_GUARD_REJECT_COST', '100000000')),  # 超过此成本时无论处理方式都拒绝
+    'limit_rows': int(os.getenv('COST_GUARD_LIMIT_ROWS', os.getenv('QUERY_MAX_ROWS', '10000'))),  # 自动添加的LIMIT
+    'queue_concurrency': int(os.getenv('COST_GUARD_QUEUE_CONCURRENCY', '2')),  # 低优先级队列同时执行的查询数
+    'queue_timeout': float(os.getenv('COST_GUARD_QUEUE_TIMEOUT', '30')),  # 低优先级队列最长等待时间（秒）
+}
+
+# 查询执行配置
+QUERY_EXECUTION_CONFIG = {
+    'fetch_size': int(os.getenv('QUERY_FETCH_SIZE', '1000')),  # 服务端游标每次fetchmany的行数
+    'max_rows': int(os.getenv('QUERY_MAX_ROWS', '10000')),  # 单次查询返回行数的硬上限
+    'coalesce': os.getenv('QUERY_COALESCE', 'true').lower() == 'true',  # 合并进行中的相同问题和相同SQL
+}
+
+# 分页查询配置（保持服务端游标打开，后续页从游标当前位置继续读取）
+PAGINATION_CONFIG = {
+    'max_rows': int(os.getenv('PAGINATION_MAX_ROWS', '1000000')),  # 分页查询总行数的硬上限
+    'max_page_size': int(os.getenv('PAGINATION_MAX_PAGE_SIZE', '1000')),  # 每页行数上限
+    'idle_timeout': float(os.getenv('PAGINATION_IDLE_TIMEOUT', '60')),  # 游标空闲超过该时间（秒）后关闭
+    # 每个工作进程同时打开的游标数上限（每个游标独占一个连接），不超过连接池大小减1；
+    # 游标只存在于打开它的进程中，多进程部署时需按query_id/worker粘性路由
+    'max_open': int(os.getenv('PAGINATION_MAX_OPEN', '2')),
+}
+
+# 异步服务模式配置
+ASYNC_SERVER_CONFIG = {
+    'db_pool_size': int(os.getenv('ASYNC_DB_POOL_SIZE', '20')),
+    'db_max_overflow': int(os.getenv('ASYNC_DB_MAX_OVERFLOW', '20')),
+    'blocking_workers': int(os.getenv('ASYNC_BLOCKING_WORKERS', '32')),  # 执行同步检索/训练的线程数
+}
+
+# 提示词组装配置
+PROMPT_CONFIG = {
+    # 提示词token预算，不超过上下文窗口减去输出token数
+    'token_budget': min(
+        int(os.getenv('PROMPT_TOKEN_BUDGET', '4000')),
+        LLM_CONFIG['context_window'] - LLM_CONFIG['max_tokens']
+    ),
+    'candidates_per_type': int(os.getenv('PROMPT_CANDIDATES_PER_TYPE', '10')),  # 每类上下文检索的候选数
+    'min_score': float(os.getenv('PROMPT_MIN_SCORE', '0.0')),  # 低于该相似度的候选不放入提示词
+    'dedup_threshold': float(os.getenv('PROMPT_DEDUP_THRESHOLD', '0.9')),  # 词集合Jaccard相似度不低于该值视为重复
+    'retrieval_workers': int(os.getenv('PROMPT_RETRIEVAL_WORKERS', '12')),  # 并发检索三类上下文的线程数（所有请求共用）
+}
+
+# 预热配置
+WARMUP_CONFIG = {
+    'on_start': os.getenv('WARMUP_ON_START', 'false').lower() == 'true',  # 启动时是否预热
+    'pool_connections': int(os.getenv('WARMUP_POOL_CONNECTIONS', '5')),  # 预先打开的连接数
+    'questions': [q for q in os.getenv('WARMUP_QUESTIONS', '').split('|') if q.strip()],  # 预热Embedding缓存的常见问题，用|分隔
 }
 
 # 向量存储配置
 VECTOR_STORAGE_CONFIG = {
     'schema': 'nl2vec',
-    'table_prefix': 'vanna_'
+    'table_prefix': 'vanna_',
+    'embedding_table': 'langchain_pg_embedding',  # PGVector存放向量和文档的表
+    'collection_table': 'langchain_pg_collection',  # PGVector存放集合的表
+    # Vanna各类训练数据所在的集合名称
+    'collections': {
+        'sql': 'sql',
+        'ddl': 'ddl',
+        'documentation': 'documentation',
+    },
+}
+
+# 向量近似最近邻索引配置（pgvector）
+VECTOR_INDEX_CONFIG = {
+    'enabled': os.getenv('VECTOR_INDEX_ENABLED', 'true').lower() == 'true',  # 初始化Vanna时设置检索参数并检查索引（创建/重建用scripts/manage_vector_index.py）
+    'method': os.getenv('VECTOR_INDEX_METHOD', 'hnsw'),  # hnsw或ivfflat
+    'distance': os.getenv('VECTOR_INDEX_DISTANCE', 'cosine'),  # cosine、l2或ip，需与检索使用的距离一致
+    'm': int(os.getenv('VECTOR_INDEX_HNSW_M', '16')),
+    'ef_construction': int(os.getenv('VECTOR_INDEX_HNSW_EF_CONSTRUCTION', '64')),
+    'ef_search': int(os.getenv('VECTOR_INDEX_HNSW_EF_SEARCH', '40')),
+    'lists': int(os.getenv('VECTOR_INDEX_IVFFLAT_LISTS', '0')),  # 0表示按行数自动计算
+    'probes': int(os.getenv('VECTOR_INDEX_IVFFLAT_PROBES', '10')),
+}
+
+# 进程内向量镜像配置
+VECTOR_MIRROR_CONFIG = {
+    'enabled': os.getenv('VECTOR_MIRROR_ENABLED', 'false').lower() == 'true',  # 启动时加载向量，检索不再访问pgvector
+    'refresh_interval': float(os.getenv('VECTOR_MIRROR_REFRESH_INTERVAL', '30')),  # 检查向量表是否被其他进程修改的间隔（秒）
+}
+
+# 批量训练配置
+TRAINING_CONFIG = {
+    'batch_size': int(os.getenv('TRAINING_BATCH_SIZE', '500')),  # 每批计算向量并写入的条数
+    'data_dir': os.getenv('TRAINING_DATA_DIR', 'data/training'),  # 训练数据目录，训练任务接口只能读取该目录下的文件
+    'job_dir': os.getenv('TRAINING_JOB_DIR', 'data/training_jobs'),  # 训练任务检查点目录
 }
 
 # 应用程序存储配置
 APP_STORAGE_CONFIG = {
     'schema': 'nl2sql',
     'table_prefix': 'app_'
-}
\ No newline at end of file
+}
+# 数据库结构提取配置
+SCHEMA_EXTRACTION_CONFIG = {
+    # 只提取这些schema，为空时提取全部（逗号分隔）
+    'include_schemas': [s.strip() for s in os.getenv('SCHEMA_INCLUDE', '').split(',') if s.strip()],
+    # 排除的schema（逗号分隔），默认排除向量存储和应用程序自身的schema；系统schema始终排除
+    'exclude_schemas': [
+        s.strip() for s in os.getenv(
+            'SCHEMA_EXCLUDE',
+            f"{VECTOR_STORAGE_CONFIG['schema']},{APP_STORAGE_CONFIG['schema']}"
+        ).split(',') if s.strip()
+    ],
+}
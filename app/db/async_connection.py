@@ -0,0 +1,202 @@
+"""
+异步数据库连接管理模块，供ASGI服务模式使用
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, Tuple, List, Dict, Any
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import DATABASE_CONFIG, SECURITY_CONFIG, QUERY_EXECUTION_CONFIG, ASYNC_SERVER_CONFIG, COST_GUARD_CONFIG
+from app.db.connection import RESULT_FORMATS, resolve_max_rows
+from app.db.security import SQLSecurityFilter
+from app.db.cost_guard import QueryCostGuard, CostDecision, parse_plan, ACTION_QUEUE
+from app.utils.helpers import rows_to_columnar
+from app.utils.metrics import metrics, stage_timer, record_cache_lookup
+from app.db.result_cache import QueryResultCache
+from app.utils.single_flight import AsyncSingleFlight
+
+logger = logging.getLogger(__name__)
+
+class AsyncDatabaseConnection:
+    """异步数据库连接管理类，基于psycopg3异步驱动和SQLAlchemy异步连接池"""
+
+    def __init__(self, config: Dict[str, Any] = None, result_cache: Optional[QueryResultCache] = None):
+        """
+        初始化异步数据库连接（只创建引擎，不建立连接）
+
+        Args:
+            config: 数据库配置，如果为None则使用默认配置
+            result_cache: 可选，查询结果缓存（可与同步连接共用）
+        """
+        self.config = config or DATABASE_CONFIG
+        self.result_cache = result_cache
+        self._flight = AsyncSingleFlight("execution")
+        self.security_filter = SQLSecurityFilter(SECURITY_CONFIG)
+        self.cost_guard = QueryCostGuard(COST_GUARD_CONFIG) if COST_GUARD_CONFIG['enabled'] else None
+        connection_string = (
+            f"postgresql+psycopg://{self.config['user']}:{self.config['password']}@"
+            f"{self.config['host']}:{self.config['port']}/{self.config['dbname']}"
+        )
+        self._engine = create_async_engine(
+            connection_string,
+            pool_size=ASYNC_SERVER_CONFIG['db_pool_size'],
+            max_overflow=ASYNC_SERVER_CONFIG['db_max_overflow'],
+            pool_timeout=30,
+            pool_recycle=1800,
+        )
+
+    async def connect(self):
+        """测试连接是否可用"""
+        try:
+            async with self._engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+            logger.info(f"异步连接池已就绪: {self.config['dbname']} at {self.config['host']}:{self.config['port']}")
+        except Exception as e:
+            logger.error(f"异步数据库连接失败: {str(e)}")
+            raise
+
+    @staticmethod
+    async def _set_statement_timeout(conn):
+        """设置查询超时"""
+        await conn.execute(text(f"SET statement_timeout = {SECURITY_CONFIG['max_query_execution_time'] * 1000}"))
+
+    async def explain(self, sql: str, conn=None) -> Tuple[float, float]:
+        """
+        获取查询的估算总成本和估算行数（EXPLAIN，不执行查询）
+
+        Args:
+            sql: SQL查询语句
+            conn: 可选，已设置查询超时的连接，为None时新建连接
+
+        Returns:
+            Tuple[float, float]: 估算总成本和估算行数
+        """
+        if conn is None:
+            async with self._engine.connect() as new_conn:
+                await self._set_statement_timeout(new_conn)
+                return await self.explain(sql, new_conn)
+        result = await conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+        return parse_plan(result.scalar())
+
+    async def _check_cost(self, safe_sql: str, conn) -> Optional[CostDecision]:
+        """在给定连接上EXPLAIN并做成本准入，未启用准入时返回None"""
+        if self.cost_guard is None:
+            return None
+        with stage_timer("cost_guard"):
+            return await self.cost_guard.acheck(safe_sql, lambda sql: self.explain(sql, conn))
+
+    @asynccontextmanager
+    async def _admitted_connection(self, safe_sql: str):
+        """
+        获取连接，在同一连接上做成本准入后返回连接和实际要执行的SQL（已设置查询超时）
+
+        EXPLAIN和执行共用一次连接获取；进入低优先级队列的查询先归还连接，取得执行名额后
+        再获取连接，排队期间不占用连接池
+        """
+        async with self._engine.connect() as conn:
+            await self._set_statement_timeout(conn)
+            decision = await self._check_cost(safe_sql, conn)
+            if decision is None or decision.action != ACTION_QUEUE:
+                yield conn, decision.sql if decision is not None else safe_sql
+                return
+        async with self.cost_guard.aadmit(decision), self._engine.connect() as conn:
+            await self._set_statement_timeout(conn)
+            yield conn, decision.sql
+
+    async def execute_query(self, sql: str, max_rows: Optional[int] = None,
+                            result_format: str = "rows") -> Tuple[List[Any], List[str]]:
+        """
+        异步执行SQL查询并返回结果，使用服务端游标按批读取
+
+        Args:
+            sql: SQL查询语句
+            max_rows: 最大返回行数，为None时使用配置的硬上限
+            result_format: 结果格式，rows为字典列表，columnar为按列存放的值列表
+
+        Returns:
+            Tuple[List, List[str]]: 查询结果和列名列表（命中结果缓存或与进行中的相同查询合并时为共享对象，不能修改）
+        """
+        if result_format not in RESULT_FORMATS:
+            raise ValueError(f"不支持的结果格式: {result_format}")
+
+        cache_key = generation = None
+        if self.result_cache is not None:
+            with stage_timer("result_cache"):
+                cache_key = self.result_cache.make_key(sql, resolve_max_rows(max_rows), result_format)
+                # 缓存偶尔需要查询数据版本（同步数据库调用），放到线程中避免阻塞事件循环
+                cached = await asyncio.to_thread(self.result_cache.get, cache_key)
+                # get可能因数据版本变化使缓存失效，之后再读取代数，避免结果以失效前的代数被丢弃
+                generation = self.result_cache.generation
+            if cached is not None:
+                record_cache_lookup("result", hits=1)
+                logger.info("查询结果缓存命中")
+                return cached
+            record_cache_lookup("result", misses=1)
+
+        if not QUERY_EXECUTION_CONFIG['coalesce']:
+            return await self._execute(sql, max_rows, result_format, cache_key, generation)
+
+        # 相同SQL正在执行时等待其结果，不重复执行
+        key = cache_key or QueryResultCache.make_key(sql, resolve_max_rows(max_rows), result_format)
+        result, shared = await self._flight.do(
+            key, lambda: self._execute(sql, max_rows, result_format, cache_key, generation)
+        )
+        if shared:
+            logger.info("与进行中的相同查询合并")
+        return result
+
+    async def _execute(self, sql: str, max_rows: Optional[int], result_format: str,
+                       cache_key=None, generation: Optional[int] = None) -> Tuple[List[Any], List[str]]:
+        """执行SQL查询并写入结果缓存（execute_query的实现，不含缓存查询和请求合并）"""
+        max_rows = resolve_max_rows(max_rows)
+
+        # 检查SQL是否安全，并按行数上限改写或添加LIMIT
+        with stage_timer("validation"):
+            safe_sql = self.security_filter.validate_and_sanitize(sql, max_rows=max_rows)
+
+        fetch_size = QUERY_EXECUTION_CONFIG['fetch_size']
+        rows = []
+
+        try:
+            # 执行前在同一连接上按EXPLAIN估算的代价决定拒绝、加LIMIT或进入低优先级队列
+            async with self._admitted_connection(safe_sql) as (conn, safe_sql):
+                with stage_timer("execution"):
+                    start_time = time.time()
+                    result = await conn.stream(text(safe_sql))
+                    column_names = list(result.keys())
+
+                    try:
+                        async for partition in result.partitions(fetch_size):
+                            partition = partition[:max_rows - len(rows)]
+                            rows.extend(partition)
+                            if len(rows) >= max_rows:
+                                logger.info(f"查询结果达到行数上限 {max_rows}，停止读取")
+                                break
+                    finally:
+                        await result.close()
+
+                    logger.info(f"异步查询执行成功，用时 {time.time() - start_time:.3f} 秒，返回 {len(rows)} 条结果")
+
+        except SQLAlchemyError as e:
+            logger.error(f"异步查询执行错误: {str(e)}")
+            raise
+
+        metrics.inc("nl2sql_rows_returned_total", len(rows), help_text="查询返回的结果行数")
+
+        if result_format == "columnar":
+            results = rows_to_columnar(rows, len(column_names))
+        else:
+            results = [dict(zip(column_names, row)) for row in rows]
+
+        if cache_key is not None:
+            self.result_cache.put(cache_key, results, column_names, generation)
+        return results, column_names
+
+    async def close(self):
+        """释放连接池"""
+        await self._engine.dispose()
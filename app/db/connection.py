@@ -4,27 +4,57 @@
 """
 import logging
 import time
-from sqlalchemy import create_engine, text, inspect
+from sqlalchemy import create_engine, text
 from sqlalchemy.exc import SQLAlchemyError
-from contextlib import contextmanager
-from typing import Optional, Tuple, List, Dict, Any
+from contextlib import contextmanager, nullcontext
+from typing import Optional, Tuple, List, Dict, Any, Iterator
 
-from app.config import DATABASE_CONFIG, SECURITY_CONFIG
+from app.config import DATABASE_CONFIG, SECURITY_CONFIG, QUERY_EXECUTION_CONFIG, COST_GUARD_CONFIG
 from app.db.security import SQLSecurityFilter
+from app.db.cost_guard import QueryCostGuard, CostDecision, parse_plan, ACTION_QUEUE
+from app.db.schema_extractor import SchemaExtractor
+from app.utils.helpers import rows_to_columnar
+from app.utils.metrics import metrics, stage_timer, record_duration, record_error, record_cache_lookup
+from app.db.result_cache import QueryResultCache
+from app.utils.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# 支持的结果格式：rows为每行一个字典，columnar为列名只出现一次、每列一个值列表
+RESULT_FORMATS = ("rows", "columnar")
+
+def resolve_max_rows(max_rows: Optional[int]) -> int:
+    """
+    计算实际的行数上限：请求值与配置的硬上限取较小者
+    
+    Args:
+        max_rows: 请求的最大行数，为None时使用硬上限
+        
+    Returns:
+        int: 实际的行数上限
+    """
+    hard_limit = QUERY_EXECUTION_CONFIG['max_rows']
+    if max_rows is None or max_rows <= 0:
+        return hard_limit
+    return min(max_rows, hard_limit)
+
 class DatabaseConnection:
     """数据库连接管理类，提供连接池和执行查询的功能"""
     
-    def __init__(self, config: Dict[str, Any] = None):
+    def __init__(self, config: Dict[str, Any] = None, result_cache: Optional[QueryResultCache] = None):
         """
         初始化数据库连接
         
         Args:
             config: 数据库配置，如果为None则使用默认配置
+            result_cache: 可选，查询结果缓存，execute_query命中时不再访问数据库
         """
         self.config = config or DATABASE_CONFIG
+        self.result_cache = result_cache
+        self._flight = SingleFlight("execution")
+        self.security_filter = SQLSecurityFilter(SECURITY_CONFIG)
+        self.cost_guard = QueryCostGuard(COST_GUARD_CONFIG) if COST_GUARD_CONFIG['enabled'] else None
+        self.pool_size = self.config.get('pool_size', 5)
         self._engine = None
         self.connect()
     
@@ -37,8 +67,8 @@ class DatabaseConnection:
         try:
             self._engine = create_engine(
                 connection_string,
-                pool_size=5,
-                max_overflow=10,
+                pool_size=self.pool_size,
+                max_overflow=self.config.get('max_overflow', 10),
                 pool_timeout=30,
                 pool_recycle=1800,
             )
@@ -65,104 +95,313 @@ class DatabaseConnection:
         finally:
             connection.close()
     
-    def execute_query(self, sql: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+    @staticmethod
+    def _set_statement_timeout(conn):
+        """设置查询超时"""
+        conn.execute(text(f"SET statement_timeout = {SECURITY_CONFIG['max_query_execution_time'] * 1000}"))
+    
+    def explain(self, sql: str, conn=None) -> Tuple[float, float]:
         """
-        执行SQL查询并返回结果
+        获取查询的估算总成本和估算行数（EXPLAIN，不执行查询）
         
         Args:
             sql: SQL查询语句
+            conn: 可选，已设置查询超时的连接，为None时新建连接
             
         Returns:
-            Tuple[List[Dict], List[str]]: 查询结果和列名列表
+            Tuple[float, float]: 估算总成本和估算行数
+        """
+        if conn is None:
+            with self.get_connection() as new_conn:
+                self._set_statement_timeout(new_conn)
+                return self.explain(sql, new_conn)
+        plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+        return parse_plan(plan)
+    
+    def _check_cost(self, safe_sql: str, conn) -> Optional[CostDecision]:
+        """在给定连接上EXPLAIN并做成本准入，未启用准入时返回None"""
+        if self.cost_guard is None:
+            return None
+        with stage_timer("cost_guard"):
+            return self.cost_guard.check(safe_sql, lambda sql: self.explain(sql, conn))
+    
+    @contextmanager
+    def _admitted_connection(self, safe_sql: str) -> Iterator[Tuple[Any, str]]:
+        """
+        获取连接，在同一连接上做成本准入后返回连接和实际要执行的SQL（已设置查询超时）
+        
+        EXPLAIN和执行共用一次连接获取；进入低优先级队列的查询先归还连接，取得执行名额后
+        再获取连接，排队期间不占用连接池
+        """
+        with self.get_connection() as conn:
+            self._set_statement_timeout(conn)
+            decision = self._check_cost(safe_sql, conn)
+            if decision is None or decision.action != ACTION_QUEUE:
+                yield conn, decision.sql if decision is not None else safe_sql
+                return
+        with self.cost_guard.admit(decision), self.get_connection() as conn:
+            self._set_statement_timeout(conn)
+            yield conn, decision.sql
+    
+    def open_cursor(self, sql: str, max_rows: int, fetch_size: Optional[int] = None):
+        """
+        执行SQL查询并返回保持打开的服务端游标，供分页读取
+        
+        连接不归还连接池，调用方读取完毕或放弃时必须关闭结果和连接
+        
+        Args:
+            sql: SQL查询语句
+            max_rows: 总行数上限，注入到SQL的LIMIT中
+            fetch_size: 服务端游标每次读取的行数，为None时使用配置值
+        
+        Returns:
+            Tuple[Connection, CursorResult]: 独占的连接和流式结果
+        
+        Raises:
+            ValueError: SQL未通过安全检查或估算代价过高
+        """
+        with stage_timer("validation"):
+            safe_sql = self.security_filter.validate_and_sanitize(sql, max_rows=max_rows)
+        
+        if not self._engine:
+            self.connect()
+        
+        # EXPLAIN和执行使用同一个连接
+        conn = self._engine.connect()
+        try:
+            self._set_statement_timeout(conn)
+            decision = self._check_cost(safe_sql, conn)
+            if decision is not None:
+                safe_sql = decision.sql
+            with stage_timer("execution"):
+                # 低优先级查询只在执行期间占用队列名额，之后的分页读取不占用
+                with self.cost_guard.admit(decision) if decision is not None else nullcontext():
+                    result = conn.execution_options(
+                        stream_results=True,
+                        max_row_buffer=fetch_size or QUERY_EXECUTION_CONFIG['fetch_size']
+                    ).execute(text(safe_sql))
+        except Exception as e:
+            conn.close()
+            if isinstance(e, SQLAlchemyError):
+                record_error("execution")
+            raise
+        return conn, result
+    
+    def stream_query(self, sql: str, fetch_size: Optional[int] = None,
+                     max_rows: Optional[int] = None,
+                     result_format: str = "rows") -> Iterator[Tuple[List[str], List[Any]]]:
         """
-        # 检查SQL是否安全
-        security_filter = SQLSecurityFilter(SECURITY_CONFIG)
-        safe_sql = security_filter.validate_and_sanitize(sql)
+        以流式方式执行SQL查询，按批次返回结果
+        
+        使用服务端命名游标（stream_results），每次fetchmany取fetch_size行，
+        内存占用只与批次大小有关，与结果集大小无关。达到max_rows后停止读取。
+        即使结果为空也会返回一个空批次，以便调用方获得列名。
+        
+        Args:
+            sql: SQL查询语句
+            fetch_size: 每批行数，为None时使用配置值
+            max_rows: 最大返回行数，为None时使用配置的硬上限
+            result_format: 批次格式，rows为字典列表，columnar为按列存放的值列表
+            
+        Yields:
+            Tuple[List[str], List]: 列名列表和一批查询结果
+        """
+        if result_format not in RESULT_FORMATS:
+            raise ValueError(f"不支持的结果格式: {result_format}")
+        
+        max_rows = resolve_max_rows(max_rows)
         
-        rows = []
-        column_names = []
+        # 检查SQL是否安全，并按行数上限改写或添加LIMIT
+        with stage_timer("validation"):
+            safe_sql = self.security_filter.validate_and_sanitize(sql, max_rows=max_rows)
         
+        fetch_size = fetch_size or QUERY_EXECUTION_CONFIG['fetch_size']
+        
+        # 执行阶段只统计等待数据库的时间（执行和读取每个批次），不包括成本准入和调用方处理批次的时间
+        execution_seconds = 0.0
+        row_count = 0
         try:
-            with self.get_connection() as conn:
-                # 设置查询超时
-                conn.execute(text(f"SET statement_timeout = {SECURITY_CONFIG['max_query_execution_time'] * 1000}"))
+            # 执行前在同一连接上按EXPLAIN估算的代价决定拒绝、加LIMIT或进入低优先级队列
+            with self._admitted_connection(safe_sql) as (conn, safe_sql):
+                wait_start = time.perf_counter()
                 
-                # 执行查询
+                # 执行查询，使用服务端游标
                 start_time = time.time()
-                result = conn.execute(text(safe_sql))
-                end_time = time.time()
+                result = conn.execution_options(
+                    stream_results=True,
+                    max_row_buffer=fetch_size
+                ).execute(text(safe_sql))
+                
+                column_names = list(result.keys())
                 
-                # 处理结果
-                column_names = result.keys()
-                for row in result:
-                    rows.append({column: value for column, value in zip(column_names, row)})
+                try:
+                    partitions = result.partitions(fetch_size)
+                    while True:
+                        partition = next(partitions, None)
+                        execution_seconds += time.perf_counter() - wait_start
+                        if partition is None:
+                            break
+                        
+                        remaining = max_rows - row_count
+                        if len(partition) > remaining:
+                            partition = partition[:remaining]
+                        
+                        row_count += len(partition)
+                        if result_format == "columnar":
+                            yield column_names, rows_to_columnar(partition, len(column_names))
+                        else:
+                            yield column_names, [dict(zip(column_names, row)) for row in partition]
+                        
+                        if row_count >= max_rows:
+                            logger.info(f"查询结果达到行数上限 {max_rows}，停止读取")
+                            break
+                        wait_start = time.perf_counter()
+                    
+                    if row_count == 0:
+                        yield column_names, rows_to_columnar([], len(column_names)) if result_format == "columnar" else []
+                finally:
+                    result.close()
                 
-                logger.info(f"查询执行成功，用时 {end_time - start_time:.3f} 秒，返回 {len(rows)} 条结果")
+                logger.info(f"查询执行成功，用时 {time.time() - start_time:.3f} 秒，返回 {row_count} 条结果")
                 
         except SQLAlchemyError as e:
             logger.error(f"查询执行错误: {str(e)}")
+            record_error("execution")
             raise
+        finally:
+            record_duration("execution", execution_seconds)
+            metrics.inc("nl2sql_rows_returned_total", row_count, help_text="查询返回的结果行数")
+    
+    def execute_query(self, sql: str, max_rows: Optional[int] = None,
+                      result_format: str = "rows") -> Tuple[List[Any], List[str]]:
+        """
+        执行SQL查询并返回结果
+        
+        Args:
+            sql: SQL查询语句
+            max_rows: 最大返回行数，为None时使用配置的硬上限
+            result_format: 结果格式，rows为字典列表，columnar为按列存放的值列表
             
-        return rows, list(column_names)
+        Returns:
+            Tuple[List, List[str]]: 查询结果和列名列表（命中结果缓存或与进行中的相同查询合并时为共享对象，不能修改）
+        """
+        cache_key = generation = None
+        if self.result_cache is not None:
+            with stage_timer("result_cache"):
+                cache_key = self.result_cache.make_key(sql, resolve_max_rows(max_rows), result_format)
+                cached = self.result_cache.get(cache_key)
+                # get可能因数据版本变化使缓存失效，之后再读取代数，避免结果以失效前的代数被丢弃
+                generation = self.result_cache.generation
+            if cached is not None:
+                record_cache_lookup("result", hits=1)
+                logger.info("查询结果缓存命中")
+                return cached
+            record_cache_lookup("result", misses=1)
+        
+        def run():
+            rows = []
+            column_names = []
+            
+            for column_names, batch in self.stream_query(sql, max_rows=max_rows, result_format=result_format):
+                if result_format == "columnar" and rows:
+                    for column_values, batch_values in zip(rows, batch):
+                        column_values.extend(batch_values)
+                else:
+                    rows.extend(batch)
+            
+            if cache_key is not None:
+                self.result_cache.put(cache_key, rows, column_names, generation)
+            return rows, column_names
+        
+        if not QUERY_EXECUTION_CONFIG['coalesce']:
+            return run()
+        
+        # 相同SQL正在执行时等待其结果，不重复执行
+        key = cache_key or QueryResultCache.make_key(sql, resolve_max_rows(max_rows), result_format)
+        result, shared = self._flight.do(key, run)
+        if shared:
+            logger.info("与进行中的相同查询合并")
+        return result
     
-    def get_database_schema(self) -> str:
+    def get_database_schema(self, include_schemas: Optional[List[str]] = None,
+                            exclude_schemas: Optional[List[str]] = None) -> str:
         """
         获取数据库结构DDL
         
+        Args:
+            include_schemas: 只提取这些schema，为None时使用配置值
+            exclude_schemas: 排除的schema，为None时使用配置值（默认排除nl2vec和nl2sql）
+        
         Returns:
             str: 数据库DDL语句
         """
-        schema_ddl = []
-        
         try:
-            inspector = inspect(self._engine)
-            
-            # 获取所有表
-            for schema in inspector.get_schema_names():
-                if schema in ('pg_catalog', 'information_schema'):
-                    continue
-                    
-                for table_name in inspector.get_table_names(schema=schema):
-                    # 构建CREATE TABLE语句
-                    columns = []
-                    primary_keys = inspector.get_pk_constraint(table_name, schema=schema)['constrained_columns']
-                    
-                    for column in inspector.get_columns(table_name, schema=schema):
-                        col_def = f"{column['name']} {column['type']}"
-                        
-                        if not column.get('nullable', True):
-                            col_def += " NOT NULL"
-                            
-                        if column['name'] in primary_keys:
-                            col_def += " PRIMARY KEY"
-                            
-                        columns.append(col_def)
-                    
-                    # 外键关系
-                    foreign_keys = []
-                    for fk in inspector.get_foreign_keys(table_name, schema=schema):
-                        fk_def = (
-                            f"FOREIGN KEY ({', '.join(fk['constrained_columns'])}) "
-                            f"REFERENCES {fk['referred_schema']}.{fk['referred_table']}({', '.join(fk['referred_columns'])})"
-                        )
-                        foreign_keys.append(fk_def)
-                    
-                    # 构建完整的CREATE TABLE语句
-                    create_table = f"CREATE TABLE {schema}.{table_name} (\n"
-                    create_table += ",\n".join(columns)
-                    
-                    if foreign_keys:
-                        create_table += ",\n" + ",\n".join(foreign_keys)
-                        
-                    create_table += "\n);"
-                    schema_ddl.append(create_table)
-            
-            return "\n\n".join(schema_ddl)
-            
+            return SchemaExtractor(self, include_schemas, exclude_schemas).extract_ddl()
         except Exception as e:
             logger.error(f"获取数据库结构失败: {str(e)}")
             raise
 
+    def get_data_version(self, schemas: List[str]) -> int:
+        """
+        获取指定schema的数据版本号
+        
+        基于pg_stat_user_tables中累计的插入/更新/删除行数，开销很小，
+        数据发生变化时版本号单调增加
+        
+        Args:
+            schemas: schema名称列表
+            
+        Returns:
+            int: 数据版本号
+        """
+        with self.get_connection() as conn:
+            result = conn.execute(
+                text(
+                    "SELECT COALESCE(SUM(n_tup_ins + n_tup_upd + n_tup_del), 0) "
+                    "FROM pg_stat_user_tables WHERE schemaname = ANY(:schemas)"
+                ),
+                {"schemas": list(schemas)}
+            )
+            return int(result.scalar())
+    
+    def get_scalar(self, sql: str) -> Any:
+        """
+        执行返回单个值的查询（如数仓最近加载时间），用于数据版本检测
+        
+        Args:
+            sql: SQL查询语句
+            
+        Returns:
+            Any: 第一行第一列的值，无结果时为None
+        """
+        with self.get_connection() as conn:
+            return conn.execute(text(sql)).scalar()
+    
+    def warmup_pool(self, count: int):
+        """
+        预先打开连接池中的连接，避免首批请求承担建连开销
+        
+        Args:
+            count: 预先打开的连接数
+        """
+        connections = []
+        try:
+            for _ in range(count):
+                connections.append(self._engine.connect())
+        finally:
+            for connection in connections:
+                connection.close()
+        logger.info(f"连接池预热完成: {len(connections)} 个连接")
+    
+    def discard_pool(self):
+        """
+        在fork出的子进程中丢弃继承的连接池
+        
+        只丢弃引用而不关闭socket，父进程仍在使用这些连接
+        """
+        if self._engine is not None:
+            self._engine.dispose(close=False)
+    
     def get_connection_info(self) -> Dict[str, Any]:
         """
         获取数据库连接信息
@@ -0,0 +1,209 @@
+"""
+查询成本准入模块
+
+执行前用EXPLAIN (FORMAT JSON)取得优化器估算的总成本和返回行数，与配置的阈值比较：
+未超过时直接执行；超过时按配置拒绝、自动加LIMIT（加LIMIT后仍超过成本阈值则拒绝），
+或进入并发数受限的低优先级队列，避免个别代价极高的查询长时间占用连接池和数据仓库。
+"""
+import json
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, Any, Callable, Awaitable, Tuple
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ACTION_ALLOW = "allow"
+ACTION_REJECT = "reject"
+ACTION_LIMIT = "limit"
+ACTION_QUEUE = "queue"
+
+class QueryCostExceeded(ValueError):
+    """估算成本超过阈值，查询被拒绝"""
+
+@dataclass
+class CostDecision:
+    """准入结果"""
+    action: str
+    sql: str
+    cost: float
+    rows: float
+
+def parse_plan(plan: Any) -> Tuple[float, float]:
+    """
+    从EXPLAIN (FORMAT JSON)的输出中取出估算总成本和返回行数
+
+    Args:
+        plan: EXPLAIN输出（JSON字符串或驱动解析后的列表）
+
+    Returns:
+        Tuple[float, float]: 估算总成本和估算行数
+    """
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]["Plan"]
+    return float(root["Total Cost"]), float(root["Plan Rows"])
+
+def add_limit(sql: str, limit: int) -> str:
+    """
+    将查询包装为子查询并加上LIMIT，原查询中的ORDER BY、LIMIT等保持不变
+
+    Args:
+        sql: SELECT或WITH查询
+        limit: 行数上限
+
+    Returns:
+        str: 加上LIMIT的查询
+    """
+    return f"SELECT * FROM (\n{sql.strip().rstrip(';')}\n) AS limited_query LIMIT {int(limit)}"
+
+class QueryCostGuard:
+    """
+    基于EXPLAIN估算的查询准入控制（线程安全）
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        """
+        初始化准入控制
+
+        Args:
+            config: 准入配置，见COST_GUARD_CONFIG
+        """
+        self.config = config
+        self.max_cost = config['max_cost']
+        self.max_rows = config['max_rows']
+        self.action = config['action']
+        if self.action not in (ACTION_REJECT, ACTION_LIMIT, ACTION_QUEUE):
+            raise ValueError(f"不支持的超限处理方式: {self.action}")
+
+        self._slots = threading.BoundedSemaphore(config['queue_concurrency'])
+        self._async_slots = None
+
+    def _exceeds(self, cost: float, rows: float) -> bool:
+        """是否超过成本或行数阈值（阈值为0表示不限制）"""
+        return (self.max_cost > 0 and cost > self.max_cost) or (self.max_rows > 0 and rows > self.max_rows)
+
+    def _reject(self, sql: str, cost: float, rows: float, reason: str):
+        """记录并拒绝查询"""
+        metrics.inc("nl2sql_cost_guard_total", help_text="成本准入的处理结果", action=ACTION_REJECT)
+        logger.warning(f"查询被成本准入拒绝（{reason}，估算成本 {cost:.0f}，估算行数 {rows:.0f}）: {sql}")
+        raise QueryCostExceeded(
+            f"查询估算代价过高（估算成本 {cost:.0f}，估算行数 {rows:.0f}），已拒绝执行，请缩小查询范围或增加过滤条件。"
+        )
+
+    def _decide(self, sql: str, cost: float, rows: float) -> CostDecision:
+        """按首次估算结果决定处理方式，超过硬上限或处理方式为reject时拒绝"""
+        reject_cost = self.config['reject_cost']
+        if reject_cost > 0 and cost > reject_cost:
+            self._reject(sql, cost, rows, "超过成本硬上限")
+
+        if not self._exceeds(cost, rows):
+            return CostDecision(ACTION_ALLOW, sql, cost, rows)
+
+        if self.action == ACTION_REJECT:
+            self._reject(sql, cost, rows, "超过阈值")
+        return CostDecision(self.action, sql, cost, rows)
+
+    def _record(self, decision: CostDecision) -> CostDecision:
+        """记录准入结果"""
+        metrics.inc("nl2sql_cost_guard_total", help_text="成本准入的处理结果", action=decision.action)
+        if decision.action != ACTION_ALLOW:
+            logger.info(
+                f"查询超过成本阈值，处理方式 {decision.action}"
+                f"（估算成本 {decision.cost:.0f}，估算行数 {decision.rows:.0f}）"
+            )
+        return decision
+
+    def check(self, sql: str, explain: Callable[[str], Tuple[float, float]]) -> CostDecision:
+        """
+        估算查询成本并决定处理方式
+
+        Args:
+            sql: 已通过安全检查的SQL
+            explain: 执行EXPLAIN并返回(估算总成本, 估算行数)的函数
+
+        Returns:
+            CostDecision: 处理方式和实际要执行的SQL
+
+        Raises:
+            QueryCostExceeded: 查询被拒绝
+        """
+        cost, rows = explain(sql)
+        decision = self._decide(sql, cost, rows)
+        if decision.action == ACTION_LIMIT:
+            # 排序、聚合等需要读完全部输入的查询加LIMIT后成本不会下降，需要重新估算
+            limited_sql = add_limit(sql, self.config['limit_rows'])
+            cost, rows = explain(limited_sql)
+            if self.max_cost > 0 and cost > self.max_cost:
+                self._reject(sql, cost, rows, "加LIMIT后仍超过阈值")
+            decision = CostDecision(ACTION_LIMIT, limited_sql, cost, rows)
+        return self._record(decision)
+
+    async def acheck(self, sql: str, explain: Callable[[str], Awaitable[Tuple[float, float]]]) -> CostDecision:
+        """
+        异步估算查询成本并决定处理方式，参数和返回值同check
+
+        Raises:
+            QueryCostExceeded: 查询被拒绝
+        """
+        cost, rows = await explain(sql)
+        decision = self._decide(sql, cost, rows)
+        if decision.action == ACTION_LIMIT:
+            limited_sql = add_limit(sql, self.config['limit_rows'])
+            cost, rows = await explain(limited_sql)
+            if self.max_cost > 0 and cost > self.max_cost:
+                self._reject(sql, cost, rows, "加LIMIT后仍超过阈值")
+            decision = CostDecision(ACTION_LIMIT, limited_sql, cost, rows)
+        return self._record(decision)
+
+    def _queue_timeout(self):
+        """等待队列超时后拒绝"""
+        metrics.inc("nl2sql_cost_guard_total", help_text="成本准入的处理结果", action="queue_timeout")
+        raise QueryCostExceeded("系统繁忙，高代价查询排队超时，请稍后重试或缩小查询范围。")
+
+    @contextmanager
+    def admit(self, decision: CostDecision):
+        """
+        按准入结果执行查询：低优先级查询需先取得队列中的执行名额
+
+        Args:
+            decision: check返回的准入结果
+
+        Raises:
+            QueryCostExceeded: 等待执行名额超时
+        """
+        if decision.action != ACTION_QUEUE:
+            yield
+            return
+        if not self._slots.acquire(timeout=self.config['queue_timeout']):
+            self._queue_timeout()
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    @asynccontextmanager
+    async def aadmit(self, decision: CostDecision):
+        """
+        异步版admit（名额与同步版分别计数）
+
+        Raises:
+            QueryCostExceeded: 等待执行名额超时
+        """
+        if decision.action != ACTION_QUEUE:
+            yield
+            return
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.config['queue_concurrency'])
+        try:
+            await asyncio.wait_for(self._async_slots.acquire(), self.config['queue_timeout'])
+        except asyncio.TimeoutError:
+            self._queue_timeout()
+        try:
+            yield
+        finally:
+            self._async_slots.release()
@@ -0,0 +1,144 @@
+"""
+DDL拆分模块
+
+将包含多张表的DDL脚本拆分为每张表一段DDL：CREATE TABLE语句之后附加该表的
+ALTER TABLE（外键等约束）、COMMENT ON和CREATE INDEX语句，便于按表训练和检索
+"""
+import re
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 表名（可带schema，可带双引号）
+_NAME = r'((?:"[^"]+"|[\w$]+)(?:\s*\.\s*(?:"[^"]+"|[\w$]+))*)'
+
+_CREATE_TABLE = re.compile(
+    r'^CREATE\s+(?:(?:GLOBAL\s+|LOCAL\s+)?(?:TEMP|TEMPORARY)\s+|UNLOGGED\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?' + _NAME,
+    re.IGNORECASE
+)
+_ALTER_TABLE = re.compile(r'^ALTER\s+TABLE\s+(?:IF\s+EXISTS\s+)?(?:ONLY\s+)?' + _NAME, re.IGNORECASE)
+_COMMENT_ON_TABLE = re.compile(r'^COMMENT\s+ON\s+TABLE\s+' + _NAME, re.IGNORECASE)
+_COMMENT_ON_COLUMN = re.compile(r'^COMMENT\s+ON\s+COLUMN\s+' + _NAME, re.IGNORECASE)
+_CREATE_INDEX = re.compile(
+    r'^CREATE\s+(?:UNIQUE\s+)?INDEX\s+.*?\s+ON\s+(?:ONLY\s+)?' + _NAME,
+    re.IGNORECASE | re.DOTALL
+)
+
+def split_statements(sql: str) -> List[str]:
+    """
+    按分号拆分SQL语句，忽略字符串、带引号标识符和注释中的分号
+
+    Args:
+        sql: SQL脚本
+
+    Returns:
+        List[str]: 去除首尾空白和行注释后的语句列表（不含结尾分号）
+    """
+    statements = []
+    current = []
+    i = 0
+    length = len(sql)
+    while i < length:
+        char = sql[i]
+        if char == '-' and sql.startswith('--', i):
+            # 行注释
+            end = sql.find('\n', i)
+            i = length if end == -1 else end
+            continue
+        if char == '/' and sql.startswith('/*', i):
+            end = sql.find('*/', i + 2)
+            i = length if end == -1 else end + 2
+            continue
+        if char in ("'", '"'):
+            # 字符串或带引号的标识符，两个连续引号表示转义
+            end = i + 1
+            while end < length:
+                if sql[end] == char:
+                    if end + 1 < length and sql[end + 1] == char:
+                        end += 2
+                        continue
+                    break
+                end += 1
+            current.append(sql[i:end + 1])
+            i = end + 1
+            continue
+        if char == ';':
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+        else:
+            current.append(char)
+        i += 1
+
+    statement = ''.join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+def _normalize_name(name: str) -> str:
+    """规范化表名：去掉空白和双引号，未加引号的部分转为小写"""
+    parts = []
+    for part in re.split(r'\s*\.\s*', name.strip()):
+        parts.append(part[1:-1] if part.startswith('"') else part.lower())
+    return '.'.join(parts)
+
+def _referenced_table(statement: str) -> Optional[str]:
+    """返回ALTER/COMMENT/CREATE INDEX语句引用的表名，其他语句返回None"""
+    for pattern in (_ALTER_TABLE, _COMMENT_ON_TABLE, _CREATE_INDEX):
+        match = pattern.match(statement)
+        if match:
+            return _normalize_name(match.group(1))
+
+    match = _COMMENT_ON_COLUMN.match(statement)
+    if match:
+        # 最后一段是列名
+        name = _normalize_name(match.group(1))
+        return name.rsplit('.', 1)[0] if '.' in name else None
+    return None
+
+def split_ddl(ddl: str) -> Dict[str, str]:
+    """
+    将DDL脚本拆分为每张表一段DDL
+
+    只保留与表相关的语句（CREATE TABLE、ALTER TABLE、COMMENT ON TABLE/COLUMN、CREATE INDEX），
+    DROP、CREATE DATABASE等语句被忽略。附加语句引用的表名可以带或不带schema。
+
+    Args:
+        ddl: DDL脚本
+
+    Returns:
+        Dict[str, str]: {表名: 该表的DDL}，按CREATE TABLE出现顺序排列
+    """
+    tables: Dict[str, List[str]] = OrderedDict()
+    # 不带schema的表名到完整表名的映射，用于匹配未写schema的附加语句
+    short_names: Dict[str, str] = {}
+    pending = []
+
+    for statement in split_statements(ddl):
+        match = _CREATE_TABLE.match(statement)
+        if match:
+            table_name = _normalize_name(match.group(1))
+            tables.setdefault(table_name, []).append(statement + ';')
+            short_names.setdefault(table_name.rsplit('.', 1)[-1], table_name)
+            continue
+
+        table_name = _referenced_table(statement)
+        if table_name is not None:
+            # 附加语句可能出现在CREATE TABLE之前，全部读完后再归类
+            pending.append((table_name, statement))
+
+    unknown_tables = set()
+    for table_name, statement in pending:
+        target = table_name if table_name in tables else short_names.get(table_name.rsplit('.', 1)[-1])
+        if target is None:
+            unknown_tables.add(table_name)
+            continue
+        tables[target].append(statement + ';')
+
+    if unknown_tables:
+        logger.warning(f"以下表没有对应的CREATE TABLE，相关语句已忽略: {', '.join(sorted(unknown_tables))}")
+
+    return OrderedDict((name, '\n'.join(statements)) for name, statements in tables.items())
@@ -0,0 +1,247 @@
+"""
+查询结果缓存模块
+
+按规范化SQL（去注释、合并空白、引号外转小写、去掉结尾分号）、行数上限和结果格式缓存查询结果，
+条目有TTL，总大小按字节限制并按LRU淘汰；数据版本号（如pg_stat_user_tables的修改计数，
+或数仓加载时间戳）变化时整体失效。
+"""
+import re
+import time
+import pickle
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+logger = logging.getLogger(__name__)
+
+_DOLLAR_QUOTE = re.compile(r'\$[A-Za-z_]*\$')
+
+def normalize_sql(sql: str) -> str:
+    """
+    规范化SQL作为缓存键：去掉注释，合并引号外的连续空白，引号外转小写，去掉结尾分号
+
+    字符串字面量和带双引号的标识符保持原样，因此规范化前后语义相同
+
+    Args:
+        sql: SQL语句
+
+    Returns:
+        str: 规范化后的SQL
+    """
+    parts = []
+    i = 0
+    length = len(sql)
+    pending_space = False
+    while i < length:
+        char = sql[i]
+        if char == '-' and sql.startswith('--', i):
+            end = sql.find('\n', i)
+            i = length if end == -1 else end
+            pending_space = True
+            continue
+        if char == '/' and sql.startswith('/*', i):
+            end = sql.find('*/', i + 2)
+            i = length if end == -1 else end + 2
+            pending_space = True
+            continue
+        if char.isspace():
+            pending_space = True
+            i += 1
+            continue
+
+        if pending_space and parts:
+            parts.append(' ')
+        pending_space = False
+
+        if char == '$':
+            # 美元符号引用的字符串（$$...$$或$tag$...$tag$）保持原样
+            match = _DOLLAR_QUOTE.match(sql, i)
+            if match:
+                end = sql.find(match.group(0), match.end())
+                end = length if end == -1 else end + len(match.group(0))
+                parts.append(sql[i:end])
+                i = end
+                continue
+
+        if char in ("'", '"'):
+            # 字符串或带引号的标识符，两个连续引号表示转义；E'...'字符串中反斜杠也表示转义
+            backslash_escapes = char == "'" and i > 0 and sql[i - 1] in 'eE'
+            end = i + 1
+            while end < length:
+                if backslash_escapes and sql[end] == '\\':
+                    end += 2
+                    continue
+                if sql[end] == char:
+                    if end + 1 < length and sql[end + 1] == char:
+                        end += 2
+                        continue
+                    break
+                end += 1
+            parts.append(sql[i:end + 1])
+            i = end + 1
+            continue
+
+        parts.append(char.lower())
+        i += 1
+
+    return ''.join(parts).rstrip('; ')
+
+class QueryResultCache:
+    """
+    查询结果缓存（线程安全）
+
+    返回的结果对象在多个请求间共享，调用方不能修改
+    """
+
+    def __init__(self, max_bytes: int = 128 * 1024 * 1024, max_entry_bytes: Optional[int] = None,
+                 ttl_seconds: float = 300,
+                 version_provider: Optional[Callable[[], Any]] = None,
+                 version_check_interval: float = 10):
+        """
+        初始化查询结果缓存
+
+        Args:
+            max_bytes: 缓存结果的总大小上限（字节，按序列化大小估算）
+            max_entry_bytes: 单个结果的大小上限，超过时不缓存，为None时为max_bytes的1/8
+            ttl_seconds: 条目有效期（秒）
+            version_provider: 返回数据版本号的函数，版本变化时清空缓存
+            version_check_interval: 检查数据版本的最小间隔（秒）
+        """
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 8
+        self.ttl_seconds = ttl_seconds
+        self.version_provider = version_provider
+        self.version_check_interval = version_check_interval
+
+        self._entries: "OrderedDict[Tuple[str, int, str], Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked_at = 0.0
+        # 每次失效加一；执行查询前记录，写入时不一致说明执行期间数据已变化，结果不缓存
+        self.generation = 0
+
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def make_key(sql: str, max_rows: int, result_format: str) -> Tuple[str, int, str]:
+        """
+        生成缓存键
+
+        Args:
+            sql: SQL语句
+            max_rows: 实际的行数上限
+            result_format: 结果格式
+
+        Returns:
+            Tuple[str, int, str]: 缓存键
+        """
+        return normalize_sql(sql), max_rows, result_format
+
+    def get(self, key: Tuple[str, int, str]) -> Optional[Tuple[List[Any], List[str]]]:
+        """
+        查询缓存
+
+        Args:
+            key: make_key生成的缓存键
+
+        Returns:
+            Optional[Tuple[List, List[str]]]: 命中时返回查询结果和列名，否则返回None
+        """
+        self._check_version()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry["created_at"] > self.ttl_seconds:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry["rows"], entry["columns"]
+
+    def put(self, key: Tuple[str, int, str], rows: List[Any], columns: List[str],
+            generation: Optional[int] = None) -> bool:
+        """
+        写入缓存，超过单条大小上限的结果不缓存
+
+        Args:
+            key: make_key生成的缓存键
+            rows: 查询结果
+            columns: 列名列表
+            generation: 可选，执行查询前读取的generation，缓存已失效过时不写入
+
+        Returns:
+            bool: 是否已缓存
+        """
+        try:
+            size = len(pickle.dumps((rows, columns), protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            return False
+        if size > self.max_entry_bytes:
+            logger.debug(f"查询结果过大（{size} 字节），不缓存")
+            return False
+
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {"rows": rows, "columns": columns, "size": size, "created_at": time.time()}
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+        return True
+
+    def _remove(self, key):
+        """删除条目（调用方持有锁）"""
+        entry = self._entries.pop(key)
+        self._bytes -= entry["size"]
+
+    def invalidate(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.generation += 1
+            self.stats["invalidations"] += 1
+        logger.info("查询结果缓存已失效")
+
+    def _check_version(self):
+        """按间隔检查数据版本，版本变化时清空缓存"""
+        if self.version_provider is None:
+            return
+
+        now = time.time()
+        if now - self._version_checked_at < self.version_check_interval:
+            return
+        self._version_checked_at = now
+
+        try:
+            version = self.version_provider()
+        except Exception as e:
+            logger.warning(f"获取数据版本失败: {str(e)}")
+            return
+
+        if self._version is not None and version != self._version:
+            self.invalidate()
+        self._version = version
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            Dict[str, Any]: 命中、未命中、淘汰、失效次数及当前条目数和字节数
+        """
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "bytes": self._bytes}
@@ -0,0 +1,281 @@
+"""
+查询结果分页模块
+
+分页查询执行一次后保持服务端游标（及其独占的连接）打开，后续每页从游标当前位置继续读取，
+不重新执行查询，也不扫描之前的页。游标读取完毕时立即关闭；空闲超过idle_timeout的游标由
+后台线程关闭并归还连接；同时打开的游标数有上限，超过时关闭最久未使用的游标，避免占满连接池。
+
+游标只存在于打开它的工作进程中，多进程或多实例部署时后续页必须路由到同一进程（粘性路由）：
+query_id以工作进程标识（主机名-进程号）开头，返回结果中的worker字段也是该标识，负载均衡可据此
+路由；请求到达其他进程时抛出WrongWorkerError，而不是当作已过期。
+"""
+import os
+import time
+import uuid
+import socket
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+from app.utils.helpers import rows_to_columnar
+from app.utils.metrics import metrics, stage_timer
+
+logger = logging.getLogger(__name__)
+
+class WrongWorkerError(LookupError):
+    """分页查询由其他工作进程打开，请求需路由到该进程"""
+
+def _worker_id() -> str:
+    """当前工作进程标识（fork后的子进程与父进程不同）"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class _Cursor:
+    """一个打开的分页游标"""
+
+    def __init__(self, query_id: str, conn, result, result_format: str, page_size: int, max_rows: int):
+        self.query_id = query_id
+        self.conn = conn
+        self.result = result
+        self.columns = list(result.keys())
+        self.result_format = result_format
+        self.page_size = page_size
+        self.max_rows = max_rows
+        self.page = 0
+        self.offset = 0
+        # 多读的一行，用于判断是否还有下一页
+        self.pending: List[Any] = []
+        self.last_used = time.time()
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def close(self):
+        """关闭游标并归还连接"""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.result.close()
+        except Exception as e:
+            logger.debug(f"关闭分页游标失败: {str(e)}")
+        finally:
+            self.conn.close()
+
+class QueryPager:
+    """
+    基于保持打开的服务端游标的分页查询（线程安全，游标属于当前工作进程，需粘性路由）
+    """
+
+    def __init__(self, db_connection, idle_timeout: float = 60, max_open: int = 5, max_page_size: int = 1000,
+                 max_rows: int = 1000000):
+        """
+        初始化分页器
+
+        Args:
+            db_connection: 数据库连接实例，提供open_cursor
+            idle_timeout: 游标空闲超过该时间（秒）后关闭
+            max_open: 同时打开的游标数上限（每个游标独占一个连接，应小于连接池大小）
+            max_page_size: 每页行数上限
+            max_rows: 分页查询总行数的硬上限
+        """
+        self.db_connection = db_connection
+        self.idle_timeout = idle_timeout
+        self.max_open = max_open
+        self.max_page_size = max_page_size
+        self.max_rows = max_rows
+
+        self._cursors: "OrderedDict[str, _Cursor]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweeper: Optional[threading.Thread] = None
+
+    def _resolve_page_size(self, page_size: Optional[int], default: int) -> int:
+        """计算实际的每页行数"""
+        if page_size is None or page_size <= 0:
+            page_size = default
+        return min(page_size, self.max_page_size)
+
+    def open(self, sql: str, page_size: Optional[int], max_rows: Optional[int] = None,
+             result_format: str = "rows") -> Dict[str, Any]:
+        """
+        执行查询并返回第一页
+
+        Args:
+            sql: SQL查询语句
+            page_size: 每页行数，为None时使用每页行数上限
+            max_rows: 总行数上限，为None时使用硬上限
+            result_format: 结果格式，rows或columnar
+
+        Returns:
+            Dict[str, Any]: 第一页，见fetch
+        """
+        if result_format not in ("rows", "columnar"):
+            raise ValueError(f"不支持的结果格式: {result_format}")
+        page_size = self._resolve_page_size(page_size, self.max_page_size)
+        max_rows = self.max_rows if max_rows is None or max_rows <= 0 else min(max_rows, self.max_rows)
+        conn, result = self.db_connection.open_cursor(sql, max_rows, fetch_size=page_size + 1)
+        cursor = _Cursor(f"{_worker_id()}-{uuid.uuid4().hex}", conn, result, result_format, page_size, max_rows)
+
+        evicted = []
+        with self._lock:
+            self._cursors[cursor.query_id] = cursor
+            while len(self._cursors) > self.max_open:
+                _, oldest = self._cursors.popitem(last=False)
+                evicted.append(oldest)
+        for oldest in evicted:
+            logger.info(f"打开的分页游标数超过上限 {self.max_open}，关闭最久未使用的游标 {oldest.query_id}")
+            with oldest.lock:
+                oldest.close()
+        metrics.inc("nl2sql_paged_queries_total", help_text="打开的分页查询数")
+        self._start_sweeper()
+
+        with cursor.lock:
+            return self._read_page(cursor, page_size)
+
+    def fetch(self, query_id: str, page_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        从游标当前位置读取下一页
+
+        Args:
+            query_id: open返回的query_id
+            page_size: 每页行数，为None时与第一页相同
+
+        Returns:
+            Dict[str, Any]: query_id、worker（持有游标的工作进程）、columns、format、results、page（从1开始）、
+                offset（本页第一行的序号）、has_more（为False时游标已关闭）
+
+        Raises:
+            WrongWorkerError: 游标由其他工作进程打开
+            KeyError: 游标不存在、已读取完毕或已因空闲超时关闭
+        """
+        worker = query_id.rpartition('-')[0]
+        if worker and worker != _worker_id():
+            raise WrongWorkerError(f"分页查询由工作进程 {worker} 打开，后续页请求需路由到该进程: {query_id}")
+
+        with self._lock:
+            cursor = self._cursors.get(query_id)
+            if cursor is not None:
+                self._cursors.move_to_end(query_id)
+        if cursor is None:
+            raise KeyError(f"分页查询不存在或已过期: {query_id}")
+
+        with cursor.lock:
+            if cursor.closed:
+                raise KeyError(f"分页查询不存在或已过期: {query_id}")
+            return self._read_page(cursor, self._resolve_page_size(page_size, cursor.page_size))
+
+    def _read_page(self, cursor: _Cursor, page_size: int) -> Dict[str, Any]:
+        """读取一页（调用方持有游标锁），读取完毕或出错时关闭游标"""
+        try:
+            page_size = min(page_size, cursor.max_rows - cursor.offset)
+            with stage_timer("execution"):
+                # 多读一行判断是否还有下一页
+                wanted = page_size + 1 - len(cursor.pending)
+                rows = cursor.pending + (list(cursor.result.fetchmany(wanted)) if wanted > 0 else [])
+        except Exception:
+            self._close(cursor)
+            raise
+
+        cursor.pending = rows[page_size:]
+        rows = rows[:page_size]
+        offset = cursor.offset
+        cursor.offset += len(rows)
+        cursor.page += 1
+        cursor.last_used = time.time()
+        has_more = bool(cursor.pending) and cursor.offset < cursor.max_rows
+        if not has_more:
+            self._close(cursor)
+
+        metrics.inc("nl2sql_rows_returned_total", len(rows), help_text="查询返回的结果行数")
+        if cursor.result_format == "columnar":
+            results = rows_to_columnar(rows, len(cursor.columns))
+        else:
+            results = [dict(zip(cursor.columns, row)) for row in rows]
+        return {
+            "query_id": cursor.query_id,
+            "worker": cursor.query_id.rpartition('-')[0],
+            "columns": cursor.columns,
+            "format": cursor.result_format,
+            "results": results,
+            "page": cursor.page,
+            "offset": offset,
+            "has_more": has_more,
+        }
+
+    def close(self, query_id: str) -> bool:
+        """
+        关闭分页查询
+
+        Args:
+            query_id: open返回的query_id
+
+        Returns:
+            bool: 是否存在该分页查询
+        """
+        with self._lock:
+            cursor = self._cursors.get(query_id)
+        if cursor is None:
+            return False
+        with cursor.lock:
+            self._close(cursor)
+        return True
+
+    def _close(self, cursor: _Cursor):
+        """移除并关闭游标（调用方持有游标锁）"""
+        with self._lock:
+            if self._cursors.get(cursor.query_id) is cursor:
+                del self._cursors[cursor.query_id]
+        cursor.close()
+
+    def close_idle(self) -> int:
+        """
+        关闭空闲超时的游标（正在读取的游标跳过）
+
+        Returns:
+            int: 关闭的游标数
+        """
+        deadline = time.time() - self.idle_timeout
+        with self._lock:
+            idle = [cursor for cursor in self._cursors.values() if cursor.last_used < deadline]
+        closed = 0
+        for cursor in idle:
+            if not cursor.lock.acquire(blocking=False):
+                continue
+            try:
+                if cursor.last_used < deadline:
+                    self._close(cursor)
+                    closed += 1
+            finally:
+                cursor.lock.release()
+        if closed:
+            logger.info(f"关闭 {closed} 个空闲超时的分页游标")
+        return closed
+
+    def _start_sweeper(self):
+        """启动后台线程定期关闭空闲游标"""
+        if self._sweeper is not None:
+            return
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            interval = max(1.0, min(self.idle_timeout / 2, 10.0))
+
+            def run():
+                while True:
+                    time.sleep(interval)
+                    try:
+                        self.close_idle()
+                    except Exception as e:
+                        logger.warning(f"关闭空闲分页游标失败: {str(e)}")
+
+            self._sweeper = threading.Thread(target=run, name="query-pager-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        获取统计信息
+
+        Returns:
+            Dict[str, int]: 当前打开的游标数
+        """
+        with self._lock:
+            return {"open": len(self._cursors)}
@@ -0,0 +1,240 @@
+"""
+数据库结构提取模块
+
+通过少量基于集合的pg_catalog查询一次性获取所有表的列、类型、可空性、主键、外键、索引和注释，
+查询次数与表数量无关
+"""
+import time
+import logging
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import text
+
+from app.config import SCHEMA_EXTRACTION_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 始终排除的系统schema
+SYSTEM_SCHEMAS = ('pg_catalog', 'information_schema')
+
+# 所有查询共用的schema过滤条件（n为pg_namespace别名）
+_SCHEMA_FILTER = """
+    n.nspname <> ALL(CAST(:system_schemas AS text[]))
+    AND n.nspname NOT LIKE 'pg\\_toast%'
+    AND n.nspname NOT LIKE 'pg\\_temp\\_%'
+    AND n.nspname <> ALL(CAST(:exclude_schemas AS text[]))
+    AND (cardinality(CAST(:include_schemas AS text[])) = 0 OR n.nspname = ANY(CAST(:include_schemas AS text[])))
+"""
+
+_TABLES_SQL = f"""
+SELECT c.oid, n.nspname AS schema_name, c.relname AS table_name,
+       obj_description(c.oid, 'pg_class') AS comment
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE c.relkind IN ('r', 'p') AND NOT c.relispartition AND {_SCHEMA_FILTER}
+ORDER BY n.nspname, c.relname
+"""
+
+_COLUMNS_SQL = f"""
+SELECT a.attrelid AS oid, a.attname AS column_name,
+       format_type(a.atttypid, a.atttypmod) AS data_type,
+       a.attnotnull AS not_null,
+       col_description(a.attrelid, a.attnum) AS comment
+FROM pg_attribute a
+JOIN pg_class c ON c.oid = a.attrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE c.relkind IN ('r', 'p') AND NOT c.relispartition
+  AND a.attnum > 0 AND NOT a.attisdropped AND {_SCHEMA_FILTER}
+ORDER BY a.attrelid, a.attnum
+"""
+
+_CONSTRAINTS_SQL = f"""
+SELECT con.conrelid AS oid, con.conname AS name, con.contype AS type,
+       ARRAY(SELECT a.attname FROM unnest(con.conkey) WITH ORDINALITY AS k(attnum, ord)
+             JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+             ORDER BY k.ord) AS columns,
+       rn.nspname AS ref_schema, rc.relname AS ref_table,
+       ARRAY(SELECT a.attname FROM unnest(con.confkey) WITH ORDINALITY AS k(attnum, ord)
+             JOIN pg_attribute a ON a.attrelid = con.confrelid AND a.attnum = k.attnum
+             ORDER BY k.ord) AS ref_columns
+FROM pg_constraint con
+JOIN pg_class c ON c.oid = con.conrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_class rc ON rc.oid = con.confrelid
+LEFT JOIN pg_namespace rn ON rn.oid = rc.relnamespace
+WHERE con.contype IN ('p', 'f') AND {_SCHEMA_FILTER}
+ORDER BY con.conrelid, con.conname
+"""
+
+_INDEXES_SQL = f"""
+SELECT i.indrelid AS oid, ic.relname AS name, i.indisunique AS is_unique,
+       pg_get_indexdef(i.indexrelid) AS definition
+FROM pg_index i
+JOIN pg_class ic ON ic.oid = i.indexrelid
+JOIN pg_class c ON c.oid = i.indrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE NOT i.indisprimary AND {_SCHEMA_FILTER}
+ORDER BY i.indrelid, ic.relname
+"""
+
+def _quote_literal(value: str) -> str:
+    """转义为SQL字符串字面量"""
+    return "'" + value.replace("'", "''") + "'"
+
+class SchemaExtractor:
+    """
+    基于pg_catalog的数据库结构提取器
+    """
+
+    def __init__(self, db_connection, include_schemas: Optional[List[str]] = None,
+                 exclude_schemas: Optional[List[str]] = None):
+        """
+        初始化结构提取器
+
+        Args:
+            db_connection: 数据库连接实例
+            include_schemas: 只提取这些schema，为None时使用配置值（为空表示全部）
+            exclude_schemas: 排除的schema，为None时使用配置值
+        """
+        self.db_connection = db_connection
+        self.include_schemas = list(
+            SCHEMA_EXTRACTION_CONFIG['include_schemas'] if include_schemas is None else include_schemas
+        )
+        self.exclude_schemas = list(
+            SCHEMA_EXTRACTION_CONFIG['exclude_schemas'] if exclude_schemas is None else exclude_schemas
+        )
+
+    def covers_schema(self, schema: str) -> bool:
+        """
+        schema是否在提取范围内（与extract_tables的过滤条件一致）
+
+        Args:
+            schema: schema名
+
+        Returns:
+            bool: 是否提取该schema中的表
+        """
+        if schema in SYSTEM_SCHEMAS or schema.startswith(('pg_toast', 'pg_temp_')) or schema in self.exclude_schemas:
+            return False
+        return not self.include_schemas or schema in self.include_schemas
+
+    def extract_tables(self) -> Dict[str, Dict[str, Any]]:
+        """
+        提取所有表的结构信息
+
+        Returns:
+            Dict[str, Dict]: {schema.table: 表结构}，表结构包含schema、name、comment、
+                columns（name/type/nullable/comment）、primary_key、foreign_keys和indexes
+        """
+        params = {
+            'system_schemas': list(SYSTEM_SCHEMAS),
+            'include_schemas': self.include_schemas,
+            'exclude_schemas': self.exclude_schemas,
+        }
+        start_time = time.time()
+
+        with self.db_connection.get_connection() as conn:
+            tables_by_oid = {}
+            for row in conn.execute(text(_TABLES_SQL), params).mappings():
+                tables_by_oid[row['oid']] = {
+                    'schema': row['schema_name'],
+                    'name': row['table_name'],
+                    'comment': row['comment'],
+                    'columns': [],
+                    'primary_key': [],
+                    'foreign_keys': [],
+                    'indexes': [],
+                }
+
+            for row in conn.execute(text(_COLUMNS_SQL), params).mappings():
+                table = tables_by_oid.get(row['oid'])
+                if table is not None:
+                    table['columns'].append({
+                        'name': row['column_name'],
+                        'type': row['data_type'],
+                        'nullable': not row['not_null'],
+                        'comment': row['comment'],
+                    })
+
+            for row in conn.execute(text(_CONSTRAINTS_SQL), params).mappings():
+                table = tables_by_oid.get(row['oid'])
+                if table is None:
+                    continue
+                if row['type'] == 'p':
+                    table['primary_key'] = list(row['columns'])
+                else:
+                    table['foreign_keys'].append({
+                        'name': row['name'],
+                        'columns': list(row['columns']),
+                        'ref_schema': row['ref_schema'],
+                        'ref_table': row['ref_table'],
+                        'ref_columns': list(row['ref_columns']),
+                    })
+
+            for row in conn.execute(text(_INDEXES_SQL), params).mappings():
+                table = tables_by_oid.get(row['oid'])
+                if table is not None:
+                    table['indexes'].append({
+                        'name': row['name'],
+                        'unique': row['is_unique'],
+                        'definition': row['definition'],
+                    })
+
+        tables = {f"{table['schema']}.{table['name']}": table for table in tables_by_oid.values()}
+        logger.info(f"提取数据库结构完成，用时 {time.time() - start_time:.3f} 秒，共 {len(tables)} 张表")
+        return tables
+
+    @staticmethod
+    def table_to_ddl(table: Dict[str, Any]) -> str:
+        """
+        将表结构转换为DDL（CREATE TABLE、COMMENT和CREATE INDEX语句）
+
+        Args:
+            table: extract_tables返回的表结构
+
+        Returns:
+            str: DDL语句
+        """
+        qualified_name = f"{table['schema']}.{table['name']}"
+        primary_key = table['primary_key']
+
+        definitions = []
+        for column in table['columns']:
+            col_def = f"{column['name']} {column['type']}"
+            if not column['nullable']:
+                col_def += " NOT NULL"
+            if len(primary_key) == 1 and column['name'] == primary_key[0]:
+                col_def += " PRIMARY KEY"
+            definitions.append(col_def)
+
+        if len(primary_key) > 1:
+            definitions.append(f"PRIMARY KEY ({', '.join(primary_key)})")
+
+        for fk in table['foreign_keys']:
+            definitions.append(
+                f"FOREIGN KEY ({', '.join(fk['columns'])}) "
+                f"REFERENCES {fk['ref_schema']}.{fk['ref_table']}({', '.join(fk['ref_columns'])})"
+            )
+
+        statements = [f"CREATE TABLE {qualified_name} (\n" + ",\n".join(definitions) + "\n);"]
+
+        if table['comment']:
+            statements.append(f"COMMENT ON TABLE {qualified_name} IS {_quote_literal(table['comment'])};")
+        for column in table['columns']:
+            if column['comment']:
+                statements.append(
+                    f"COMMENT ON COLUMN {qualified_name}.{column['name']} IS {_quote_literal(column['comment'])};"
+                )
+        for index in table['indexes']:
+            statements.append(f"{index['definition']};")
+
+        return "\n".join(statements)
+
+    def extract_ddl(self) -> str:
+        """
+        提取所有表的DDL
+
+        Returns:
+            str: 数据库DDL语句，表之间以空行分隔
+        """
+        return "\n\n".join(self.table_to_ddl(table) for table in self.extract_tables().values())
@@ -1,44 +1,231 @@
 # app/db/security.py
 """
-SQL安全过滤器模块 - 简化版
+SQL安全过滤器模块
+
+使用sqlglot将SQL解析为语法树后检查：只允许单条语句、语句类型在allowed_operations中、
+不包含嵌套的数据修改（如WITH中的DELETE）、SELECT INTO和行锁、引用的schema和表在允许范围内、
+不调用禁止的函数（按函数名或函数族前缀）；并按行数上限改写或添加LIMIT。解析和检查结果按SQL哈希缓存（LRU），
+重复的SQL只解析一次。
 """
+import hashlib
 import logging
-from typing import Dict, Any
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+from sqlglot.optimizer.scope import traverse_scope
 
 logger = logging.getLogger(__name__)
 
+# 语法树中表示数据修改或DDL的节点
+_WRITE_NODES = (
+    exp.Insert, exp.Update, exp.Delete, exp.Merge, exp.Create, exp.Drop, exp.Alter,
+    exp.TruncateTable, exp.Command,
+)
+
+# 每条SQL缓存的不同行数上限改写结果数
+_MAX_LIMIT_VARIANTS = 16
+
+class UnsafeSQLError(ValueError):
+    """SQL未通过安全检查"""
+
+class _ParsedSQL:
+    """缓存的解析和检查结果"""
+
+    __slots__ = ("sql", "statement", "error", "limited")
+
+    def __init__(self, sql: str, statement: Optional[exp.Expression], error: Optional[str]):
+        self.sql = sql
+        self.statement = statement
+        self.error = error
+        self.limited: Dict[int, str] = {}
+
+def _operation(statement: exp.Expression) -> str:
+    """语句类型：查询（含UNION等集合操作）为SELECT，其他为语法树节点类型名"""
+    if isinstance(statement, exp.Query):
+        return "SELECT"
+    if isinstance(statement, exp.Command):
+        return str(statement.this).upper()
+    return statement.key.upper()
+
+def _literal_limit(statement: exp.Expression) -> Optional[int]:
+    """查询最外层的LIMIT/FETCH FIRST行数，不是整数常量时返回None"""
+    limit = statement.args.get("limit")
+    if isinstance(limit, exp.Limit):
+        count = limit.expression
+    elif isinstance(limit, exp.Fetch):
+        options = limit.args.get("limit_options")
+        if options is not None and options.args.get("percent"):
+            return None
+        count = limit.args.get("count")
+    else:
+        return None
+    if isinstance(count, exp.Literal) and not count.is_string and count.this.isdigit():
+        return int(count.this)
+    return None
+
 class SQLSecurityFilter:
     """
-    SQL安全过滤器，用于验证和净化SQL查询 (简化版)
+    SQL安全过滤器，用于验证和净化SQL查询（线程安全，应在连接对象中复用同一个实例以共享缓存）
     """
-    
+
     def __init__(self, config: Dict[str, Any]):
         """
         初始化SQL安全过滤器
-        
+
         Args:
             config: 安全配置
         """
         self.config = config
-    
-    def validate_and_sanitize(self, sql: str) -> str:
+        self.allowed_operations = {operation.upper() for operation in config['allowed_operations']}
+        self.allowed_schemas = set(config.get('allowed_schemas') or [])
+        self.blocked_schemas = set(config.get('blocked_schemas') or [])
+        self.allowed_tables = set(config.get('allowed_tables') or [])
+        self.blocked_functions = set(config.get('blocked_functions') or [])
+        self.blocked_function_prefixes = tuple(config.get('blocked_function_prefixes') or ())
+        self.cache_size = config.get('ast_cache_size', 2048)
+
+        self._cache: "OrderedDict[bytes, _ParsedSQL]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _parse(self, sql: str) -> _ParsedSQL:
+        """解析并检查SQL，结果按SQL哈希缓存"""
+        key = hashlib.blake2b(sql.encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            parsed = self._cache.get(key)
+            if parsed is not None:
+                self._cache.move_to_end(key)
+                return parsed
+
+        statement = None
+        try:
+            statements = [s for s in sqlglot.parse(sql, read="postgres") if s is not None]
+            if not statements:
+                raise UnsafeSQLError("SQL为空")
+            if len(statements) > 1:
+                raise UnsafeSQLError("不允许一次执行多条SQL语句")
+            statement = statements[0]
+            self._check(statement)
+            error = None
+        except UnsafeSQLError as e:
+            error = str(e)
+        except SqlglotError as e:
+            error = f"无法解析SQL: {str(e).splitlines()[0]}"
+
+        parsed = _ParsedSQL(sql.strip().rstrip(";").strip(), statement, error)
+        with self._lock:
+            self._cache[key] = parsed
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return parsed
+
+    def _check(self, statement: exp.Expression):
         """
-        验证并净化SQL查询 (简化版 - 仅做基本验证)
-        
+        检查语法树
+
+        Raises:
+            UnsafeSQLError: 语句不安全
+        """
+        operation = _operation(statement)
+        if operation not in self.allowed_operations:
+            raise UnsafeSQLError(f"不允许的SQL操作: {operation}")
+
+        for node in statement.find_all(*_WRITE_NODES):
+            if node is not statement and _operation(node) not in self.allowed_operations:
+                raise UnsafeSQLError(f"不允许的SQL操作: {_operation(node)}")
+
+        for select in statement.find_all(exp.Select):
+            if select.args.get("into"):
+                raise UnsafeSQLError("不允许SELECT INTO")
+            if select.args.get("locks"):
+                raise UnsafeSQLError("不允许加行锁的查询")
+
+        cte_references = self._cte_references(statement)
+        for table in statement.find_all(exp.Table):
+            name = table.name.lower()
+            schema = table.db.lower()
+            if not schema:
+                if id(table) in cte_references or not name:
+                    continue
+                # 未指定schema时pg_开头的表解析为系统表
+                schema = "pg_catalog" if name.startswith("pg_") else "public"
+            if schema in self.blocked_schemas or (self.allowed_schemas and schema not in self.allowed_schemas):
+                raise UnsafeSQLError(f"不允许访问schema: {schema}")
+            if self.allowed_tables and f"{schema}.{name}" not in self.allowed_tables:
+                raise UnsafeSQLError(f"不允许访问表: {schema}.{name}")
+
+        if self.blocked_functions or self.blocked_function_prefixes:
+            for function in statement.find_all(exp.Func):
+                name = (function.name if isinstance(function, exp.Anonymous) else function.sql_name()).lower()
+                if name in self.blocked_functions or name.startswith(self.blocked_function_prefixes):
+                    raise UnsafeSQLError(f"不允许调用函数: {name}")
+
+    @staticmethod
+    def _cte_references(statement: exp.Expression) -> set:
+        """
+        按作用域解析出引用CTE的表节点（返回节点id集合）
+
+        只有在所在作用域中可见的同名CTE才算CTE引用，其他位置的同名表（如子查询内定义的CTE
+        与外层的pg_user同名）仍按真实表检查；作用域无法解析时不跳过任何表
+        """
+        references = set()
+        try:
+            scopes = traverse_scope(statement)
+        except Exception:
+            return references
+        for scope in scopes:
+            cte_names = {name.lower() for name in scope.cte_sources}
+            for table in scope.tables:
+                if not table.db and table.name.lower() in cte_names:
+                    references.add(id(table))
+        return references
+
+    def validate_and_sanitize(self, sql: str, max_rows: Optional[int] = None) -> str:
+        """
+        验证并净化SQL查询
+
         Args:
             sql: 原始SQL查询
-            
+            max_rows: 可选，行数上限；查询没有LIMIT或LIMIT超过上限时改写为上限
+
         Returns:
             str: 净化后的SQL查询
-            
+
         Raises:
-            ValueError: 如果SQL查询不安全
+            UnsafeSQLError: 如果SQL查询不安全（ValueError的子类）
         """
-        # 当前阶段仅做极简验证，允许所有SQL查询通过
-        # 注意：这只是开发阶段的临时措施，生产环境中应使用完整的安全过滤器
-        
         # 记录正在执行的SQL查询
         logger.info(f"执行SQL查询: {sql}")
-        
-        # 在开发阶段，直接返回原始SQL
-        return sql.strip()
\ No newline at end of file
+
+        parsed = self._parse(sql)
+        if parsed.error is not None:
+            logger.warning(f"SQL未通过安全检查（{parsed.error}）: {sql}")
+            raise UnsafeSQLError(parsed.error)
+
+        if max_rows is None or not isinstance(parsed.statement, exp.Query):
+            return parsed.sql
+
+        limited = parsed.limited.get(max_rows)
+        if limited is None:
+            current = _literal_limit(parsed.statement)
+            if current is not None and current <= max_rows:
+                limited = parsed.sql
+            else:
+                limited = parsed.statement.limit(max_rows, copy=True).sql(dialect="postgres")
+            if len(parsed.limited) >= _MAX_LIMIT_VARIANTS:
+                parsed.limited.clear()
+            parsed.limited[max_rows] = limited
+        return limited
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            Dict[str, int]: 缓存的SQL数
+        """
+        with self._lock:
+            return {"entries": len(self._cache)}
@@ -3,7 +3,7 @@
 自定义LangChain链
 """
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Iterator
 
 from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate, SystemMessagePromptTemplate
 from langchain_core.output_parsers import StrOutputParser
@@ -52,6 +52,8 @@ class SQL2NaturalLanguageChain:
         chat_prompt = ChatPromptTemplate.from_messages([system_message, human_message])
         
         self.chain = LLMChain(llm=self.llm, prompt=chat_prompt)
+        # 用于逐token输出的LCEL链
+        self.stream_chain = chat_prompt | self.llm | StrOutputParser()
     
     def explain_sql(self, sql: str) -> str:
         """
@@ -69,6 +71,24 @@ class SQL2NaturalLanguageChain:
         except Exception as e:
             logger.error(f"解释SQL错误: {str(e)}")
             return f"无法解释SQL查询: {str(e)}"
+    
+    def stream_explain(self, sql: str) -> Iterator[str]:
+        """
+        流式解释SQL查询，逐个返回LLM输出的token
+        
+        Args:
+            sql: SQL查询语句
+            
+        Yields:
+            str: 解释文本片段
+        """
+        try:
+            for chunk in self.stream_chain.stream({"sql": sql}):
+                if chunk:
+                    yield chunk
+        except Exception as e:
+            logger.error(f"流式解释SQL错误: {str(e)}")
+            yield f"无法解释SQL查询: {str(e)}"
 
 class NaturalLanguageRefinementChain:
     """
@@ -0,0 +1,309 @@
+"""
+Embedding缓存模块，按(模型, 文本sha256)缓存向量
+
+两级缓存：进程内LRU + 本地SQLite持久化文件，向量以float32打包存储
+"""
+import os
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from app.utils.metrics import stage_timer, record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingCache:
+    """
+    Embedding向量缓存，内存LRU层 + SQLite持久层，两层均有容量上限
+    """
+
+    def __init__(self, memory_size: int = 10000, db_path: Optional[str] = None,
+                 max_disk_entries: int = 500000):
+        """
+        初始化Embedding缓存
+
+        Args:
+            memory_size: 内存LRU层最大条目数
+            db_path: SQLite文件路径，为None时仅使用内存层
+            max_disk_entries: 持久层最大条目数，超出后按最近访问时间淘汰
+        """
+        self.memory_size = memory_size
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._disk_writes = 0
+
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+        }
+
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path: str):
+        """打开（必要时创建）SQLite持久层"""
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embedding_cache ("
+            " model TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_access REAL NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS ix_embedding_cache_last_access "
+            "ON embedding_cache (last_access)"
+        )
+        self._db.commit()
+        logger.info(f"Embedding持久缓存: {db_path}")
+
+    @staticmethod
+    def make_key(model: str, text: str) -> Tuple[str, str]:
+        """
+        生成缓存键
+
+        Args:
+            model: 模型名称
+            text: 文本
+
+        Returns:
+            Tuple[str, str]: (模型名称, 文本sha256)
+        """
+        return model, hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, key: Tuple[str, str]) -> Optional[List[float]]:
+        """
+        查询缓存，依次查找内存层和持久层
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            Optional[List[float]]: 命中时返回向量，否则返回None
+        """
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return vector
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT vector FROM embedding_cache WHERE model = ? AND text_hash = ?",
+                        key
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    # 持久层不可用时按未命中处理，不影响查询
+                    logger.warning(f"读取Embedding持久缓存失败: {str(e)}")
+                    row = None
+                if row is not None:
+                    vector = array("f", row[0]).tolist()
+                    self._touch(key)
+                    self._remember(key, vector)
+                    self.stats["disk_hits"] += 1
+                    return vector
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: Tuple[str, str], vector: List[float]):
+        """
+        写入缓存（同时写入内存层和持久层）
+
+        Args:
+            key: 缓存键
+            vector: 向量
+        """
+        with self._lock:
+            self._remember(key, vector)
+
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO embedding_cache (model, text_hash, vector, last_access) "
+                        "VALUES (?, ?, ?, ?)",
+                        (*key, array("f", vector).tobytes(), time.time())
+                    )
+                    self._db.commit()
+                    self._disk_writes += 1
+                    # 每写入一定数量后检查一次容量，避免每次写入都做COUNT
+                    if self._disk_writes % 1000 == 0:
+                        self._evict_disk()
+                except sqlite3.Error as e:
+                    # 持久层写入失败时只保留内存层，向量已经计算完成，不影响调用方
+                    self._rollback()
+                    logger.warning(f"写入Embedding持久缓存失败: {str(e)}")
+
+    def _touch(self, key: Tuple[str, str]):
+        """更新持久层条目的最近访问时间（调用方需持有锁），失败时忽略"""
+        try:
+            self._db.execute(
+                "UPDATE embedding_cache SET last_access = ? WHERE model = ? AND text_hash = ?",
+                (time.time(), *key)
+            )
+            # 立即提交，否则隐式事务会一直持有写锁，共用文件的其他进程写入时报database is locked
+            self._db.commit()
+        except sqlite3.Error as e:
+            self._rollback()
+            logger.debug(f"更新Embedding持久缓存访问时间失败: {str(e)}")
+
+    def _rollback(self):
+        """回滚未完成的持久层事务，释放写锁（调用方需持有锁）"""
+        try:
+            self._db.rollback()
+        except sqlite3.Error:
+            pass
+
+    def _remember(self, key: Tuple[str, str], vector: List[float]):
+        """写入内存LRU层并淘汰最久未使用的条目（调用方需持有锁）"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _evict_disk(self):
+        """按最近访问时间淘汰超出容量的持久层条目（调用方需持有锁）"""
+        count = self._db.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+        overflow = count - self.max_disk_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM embedding_cache WHERE rowid IN ("
+                " SELECT rowid FROM embedding_cache ORDER BY last_access LIMIT ?)",
+                (overflow,)
+            )
+            self._db.commit()
+            self.stats["evictions"] += overflow
+            logger.info(f"Embedding持久缓存淘汰 {overflow} 条")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            Dict[str, Any]: 命中、未命中、淘汰次数及当前内存条目数
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+        return stats
+
+    def close(self):
+        """关闭持久层"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+class CachedEmbedding(Embeddings):
+    """
+    带缓存的Embedding包装器，命中缓存时不调用远程API
+    """
+
+    def __init__(self, embedding_model: Embeddings, cache: EmbeddingCache, model_name: str = ""):
+        """
+        初始化带缓存的Embedding
+
+        Args:
+            embedding_model: 实际的Embedding模型
+            cache: Embedding缓存
+            model_name: 模型名称，作为缓存键的一部分
+        """
+        self.embedding_model = embedding_model
+        self.cache = cache
+        self.model_name = model_name or getattr(embedding_model, "model", "") or type(embedding_model).__name__
+
+    def _lookup(self, texts: List[str]):
+        """
+        批量查询缓存，收集未命中的文本（同一次调用中的重复文本只请求一次）
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            Tuple: 向量列表（未命中位置为None）和 {缓存键: 位置列表} 形式的未命中表
+        """
+        keys = [self.cache.make_key(self.model_name, text) for text in texts]
+        embeddings: List[Optional[List[float]]] = [self.cache.get(key) for key in keys]
+
+        missing: Dict[Tuple[str, str], List[int]] = OrderedDict()
+        for i, vector in enumerate(embeddings):
+            if vector is None:
+                missing.setdefault(keys[i], []).append(i)
+        record_cache_lookup("embedding", hits=len(texts) - len(missing), misses=len(missing))
+        return embeddings, missing
+
+    def _fill(self, embeddings: List[Optional[List[float]]],
+              missing: Dict[Tuple[str, str], List[int]], vectors: List[List[float]]):
+        """将远程API返回的向量写入缓存并填回结果列表"""
+        for (key, positions), vector in zip(missing.items(), vectors):
+            self.cache.put(key, vector)
+            for i in positions:
+                embeddings[i] = vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed多个文档，只对未命中的文本调用远程API"""
+        embeddings, missing = self._lookup(texts)
+        if missing:
+            missing_texts = [texts[positions[0]] for positions in missing.values()]
+            with stage_timer("embedding"):
+                vectors = self.embedding_model.embed_documents(missing_texts)
+            self._fill(embeddings, missing, vectors)
+        return embeddings
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed单个查询，命中缓存时直接返回"""
+        key = self.cache.make_key(self.model_name, text)
+        vector = self.cache.get(key)
+        record_cache_lookup("embedding", hits=int(vector is not None), misses=int(vector is None))
+        if vector is None:
+            with stage_timer("embedding"):
+                vector = self.embedding_model.embed_query(text)
+            self.cache.put(key, vector)
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        异步Embed多个文档，只对未命中的文本调用远程API
+
+        缓存读写涉及SQLite文件I/O和与线程池共用的锁，在线程中执行，不阻塞事件循环
+        """
+        embeddings, missing = await asyncio.to_thread(self._lookup, texts)
+        if missing:
+            missing_texts = [texts[positions[0]] for positions in missing.values()]
+            with stage_timer("embedding"):
+                vectors = await self.embedding_model.aembed_documents(missing_texts)
+            await asyncio.to_thread(self._fill, embeddings, missing, vectors)
+        return embeddings
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """异步Embed单个查询，命中缓存时直接返回（缓存读写在线程中执行）"""
+        key = self.cache.make_key(self.model_name, text)
+        vector = await asyncio.to_thread(self.cache.get, key)
+        record_cache_lookup("embedding", hits=int(vector is not None), misses=int(vector is None))
+        if vector is None:
+            with stage_timer("embedding"):
+                vector = await self.embedding_model.aembed_query(text)
+            await asyncio.to_thread(self.cache.put, key, vector)
+        return vector
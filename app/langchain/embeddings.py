@@ -0,0 +1,240 @@
+"""
+Embedding客户端模块，提供带连接池、批量请求和重试的阿里云Embedding实现
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# 需要重试的HTTP状态码：限流和服务端错误
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+class AliyunEmbedding(Embeddings):
+    """
+    阿里云Embedding客户端
+
+    复用同一个requests.Session（连接池），将多个文本合并为一次请求，
+    并以有限并发发送多个批次，遇到429/5xx时按指数退避重试。
+    异步接口（aembed_*）使用httpx.AsyncClient，行为与同步接口一致。
+    """
+
+    def __init__(self, api_uri: str, api_key: str, model: str,
+                 batch_size: int = 10, max_concurrency: int = 4,
+                 max_retries: int = 3, backoff_factor: float = 0.5,
+                 timeout: float = 30):
+        """
+        初始化阿里云Embedding客户端
+
+        Args:
+            api_uri: Embedding API地址
+            api_key: API密钥
+            model: 模型名称
+            batch_size: 单次请求包含的最大文本数（服务商批量上限）
+            max_concurrency: 同时发送的最大批次数
+            max_retries: 429/5xx时的最大重试次数
+            backoff_factor: 指数退避系数（秒）
+            timeout: 单次请求超时时间（秒）
+        """
+        self.api_uri = api_uri
+        self.api_key = api_key
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+
+        self._session = self._create_session(max_retries, backoff_factor)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._async_client = None
+        self._async_semaphore = None
+
+    def _create_session(self, max_retries: int, backoff_factor: float) -> requests.Session:
+        """
+        创建带连接池和重试策略的HTTP会话
+
+        Args:
+            max_retries: 最大重试次数
+            backoff_factor: 指数退避系数
+
+        Returns:
+            requests.Session: HTTP会话
+        """
+        retry = Retry(
+            total=max_retries,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset(["POST"]),  # 默认不重试POST，Embedding请求是幂等的
+            backoff_factor=backoff_factor,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.max_concurrency,
+            max_retries=retry,
+        )
+
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update({
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        })
+        return session
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """获取（按需创建）发送批次的线程池"""
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_concurrency,
+                        thread_name_prefix="embedding"
+                    )
+        return self._executor
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        发送一个批次的Embedding请求
+
+        Args:
+            texts: 文本列表，长度不超过batch_size
+
+        Returns:
+            List[List[float]]: 与输入顺序一致的向量列表
+        """
+        payload = {
+            "model": self.model,
+            "input": texts
+        }
+
+        response = self._session.post(self.api_uri, json=payload, timeout=self.timeout)
+        return self._parse_response(response, texts)
+
+    def _parse_response(self, response, texts: List[str]) -> List[List[float]]:
+        """
+        解析Embedding API响应
+
+        Args:
+            response: requests或httpx的响应对象
+            texts: 请求中的文本列表
+
+        Returns:
+            List[List[float]]: 与输入顺序一致的向量列表
+        """
+        if response.status_code != 200:
+            raise ValueError(f"Embedding API返回错误: {response.text}")
+
+        data = response.json().get("data", [])
+        if len(data) != len(texts):
+            raise ValueError(f"Embedding API返回数量不匹配: 期望 {len(texts)}，实际 {len(data)}")
+
+        # 服务端不保证顺序，按index还原
+        data.sort(key=lambda item: item.get("index", 0))
+        return [item.get("embedding", []) for item in data]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed多个文档，按batch_size分批并发请求"""
+        if not texts:
+            return []
+
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+        if len(batches) == 1:
+            return self._embed_batch(batches[0])
+
+        embeddings = []
+        for batch_embeddings in self._get_executor().map(self._embed_batch, batches):
+            embeddings.extend(batch_embeddings)
+
+        logger.debug(f"批量Embedding完成: {len(texts)} 条文本, {len(batches)} 个批次")
+        return embeddings
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed单个查询"""
+        return self._embed_batch([text])[0]
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """获取（按需创建）异步HTTP客户端，需在事件循环中调用"""
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                headers=dict(self._session.headers),
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                )
+            )
+            self._async_semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._async_client
+
+    async def _aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        异步发送一个批次的Embedding请求，429/5xx时按指数退避重试
+
+        Args:
+            texts: 文本列表，长度不超过batch_size
+
+        Returns:
+            List[List[float]]: 与输入顺序一致的向量列表
+        """
+        client = self._get_async_client()
+        payload = {
+            "model": self.model,
+            "input": texts
+        }
+
+        async with self._async_semaphore:
+            for attempt in range(self.max_retries + 1):
+                response = await client.post(self.api_uri, json=payload)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                    break
+
+                retry_after = response.headers.get("Retry-After")
+                delay = float(retry_after) if retry_after and retry_after.isdigit() \
+                    else self.backoff_factor * (2 ** attempt)
+                logger.warning(f"Embedding API返回 {response.status_code}，{delay:.2f} 秒后重试")
+                await asyncio.sleep(delay)
+
+        return self._parse_response(response, texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """异步Embed多个文档，按batch_size分批并发请求"""
+        if not texts:
+            return []
+
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(self._aembed_batch(batch) for batch in batches))
+
+        embeddings = []
+        for batch_embeddings in results:
+            embeddings.extend(batch_embeddings)
+        return embeddings
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """异步Embed单个查询"""
+        return (await self._aembed_batch([text]))[0]
+
+    def close(self):
+        """关闭线程池和HTTP连接池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._session.close()
+
+    async def aclose(self):
+        """关闭异步HTTP客户端"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
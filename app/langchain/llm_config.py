@@ -11,6 +11,7 @@ from langchain_core.embeddings import Embeddings
 from langchain_openai import ChatOpenAI
 
 from app.config import LLM_CONFIG, EMBEDDING_CONFIG
+from app.langchain.embeddings import AliyunEmbedding
 
 logger = logging.getLogger(__name__)
 
@@ -129,54 +130,13 @@ class EmbeddingFactory:
         Returns:
             Embeddings: 阿里云Embedding实例
         """
-        from langchain_core.embeddings import Embeddings
-        import requests
-        
-        # 创建自定义阿里云Embedding适配器
-        class AliyunEmbedding(Embeddings):
-            def __init__(self, api_uri: str, api_key: str, model: str):
-                self.api_uri = api_uri
-                self.api_key = api_key
-                self.model = model
-                
-            def embed_documents(self, texts: List[str]) -> List[List[float]]:
-                """Embed多个文档"""
-                embeddings = []
-                
-                for text in texts:
-                    embedding = self.embed_query(text)
-                    embeddings.append(embedding)
-                    
-                return embeddings
-                
-            def embed_query(self, text: str) -> List[float]:
-                """Embed单个查询"""
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {self.api_key}"
-                }
-                
-                payload = {
-                    "model": self.model,
-                    "input": text
-                }
-                
-                response = requests.post(
-                    self.api_uri,
-                    headers=headers,
-                    json=payload
-                )
-                
-                if response.status_code != 200:
-                    raise ValueError(f"Embedding API返回错误: {response.text}")
-                    
-                data = response.json()
-                embedding = data.get("data", [{}])[0].get("embedding", [])
-                
-                return embedding
-        
         return AliyunEmbedding(
             api_uri=config.get('api_uri', ''),
             api_key=config.get('api_key', ''),
-            model=config.get('model', '')
+            model=config.get('model', ''),
+            batch_size=config.get('batch_size', 10),
+            max_concurrency=config.get('max_concurrency', 4),
+            max_retries=config.get('max_retries', 3),
+            backoff_factor=config.get('backoff_factor', 0.5),
+            timeout=config.get('timeout', 30)
         )
\ No newline at end of file
@@ -2,14 +2,18 @@
 """
 请求数据结构定义
 """
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Literal
 from pydantic import BaseModel, Field
 
 class NLQueryRequest(BaseModel):
     """自然语言查询请求"""
     question: str = Field(..., description="自然语言问题")
     context: Optional[Dict[str, Any]] = Field(None, description="查询上下文信息")
-    max_results: Optional[int] = Field(100, description="最大返回结果数")
+    max_results: Optional[int] = Field(100, description="最大返回结果数（分页时为总行数上限），注入到生成SQL的LIMIT中")
+    page_size: Optional[int] = Field(None, description="每页行数，提供时只返回第一页和query_id，后续页通过/api/query/<query_id>/page获取（需路由到返回的worker所在进程）")
+    format: Literal["rows", "columnar"] = Field("rows", description="结果格式: rows为每行一个对象，columnar为每列一个数组")
+    explain: bool = Field(False, description="流式接口是否在结果之后输出SQL解释")
+    include_timings: bool = Field(False, description="是否在响应中附加各阶段耗时(timings，不含响应序列化)")
 
 class FeedbackRequest(BaseModel):
     """用户反馈请求"""
@@ -23,4 +27,9 @@ class TrainingRequest(BaseModel):
     question: Optional[str] = Field(None, description="自然语言问题")
     sql: Optional[str] = Field(None, description="SQL查询")
     ddl: Optional[str] = Field(None, description="数据定义语言语句")
-    documentation: Optional[str] = Field(None, description="文档说明")
\ No newline at end of file
+    documentation: Optional[str] = Field(None, description="文档说明")
+
+class TrainingJobRequest(BaseModel):
+    """训练任务请求"""
+    files: List[str] = Field(..., description="训练数据文件或通配符（JSON/JSONL），相对于训练数据目录")
+    batch_size: Optional[int] = Field(None, description="每批计算向量并写入的条数")
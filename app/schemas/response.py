@@ -2,7 +2,7 @@
 """
 响应数据结构定义
 """
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Union
 from pydantic import BaseModel, Field
 
 class SQLGenerationResponse(BaseModel):
@@ -16,9 +16,15 @@ class QueryResponse(BaseModel):
     success: bool = Field(..., description="查询是否成功")
     question: str = Field(..., description="原始自然语言问题")
     sql: Optional[str] = Field(None, description="生成的SQL查询")
-    results: Optional[List[Dict[str, Any]]] = Field(None, description="查询结果")
+    format: Optional[str] = Field(None, description="结果格式: rows或columnar")
+    results: Optional[Union[List[Dict[str, Any]], List[List[Any]]]] = Field(
+        None, description="查询结果，rows格式为对象列表，columnar格式为与columns顺序一致的列数组"
+    )
     columns: Optional[List[str]] = Field(None, description="结果列名")
     error: Optional[str] = Field(None, description="错误信息(如果有)")
+    sql_source: Optional[str] = Field(None, description="SQL来源: llm、exact_cache或semantic_cache")
+    usage: Optional[Dict[str, int]] = Field(None, description="本次请求的用量，如prompt_tokens（估算）和LLM返回的token数")
+    timings: Optional[Dict[str, float]] = Field(None, description="各阶段耗时(毫秒)，请求include_timings为true时返回；不含响应序列化(serialization只在/metrics中统计)")
     
 class TrainingResponse(BaseModel):
     """训练响应"""
@@ -0,0 +1,281 @@
+"""
+应用组件容器模块
+
+按需（首次使用时）创建数据库连接、LLM、Embedding、Vanna、查询处理器和训练器，
+线程安全，并按进程隔离：在预加载(pre-fork)模式下，子进程不会复用父进程创建的连接。
+"""
+import os
+import time
+import logging
+import threading
+from typing import Dict, Any, Callable
+
+from app.config import (
+    QUERY_CACHE_CONFIG, RESULT_CACHE_CONFIG, VECTOR_STORAGE_CONFIG, VECTOR_MIRROR_CONFIG, WARMUP_CONFIG,
+    PAGINATION_CONFIG
+)
+from app.db.connection import DatabaseConnection
+from app.db.result_cache import QueryResultCache
+from app.db.result_pager import QueryPager
+from app.langchain.llm_config import LLMFactory, EmbeddingFactory
+from app.langchain.chains import SQL2NaturalLanguageChain
+from app.vanna.setup import VannaSetup
+from app.vanna.query_cache import QuestionSQLCache
+from app.vanna.query_processor import QueryProcessor
+from app.vanna.sql_generator import SQLGenerator
+from app.vanna.prompt_assembler import PromptAssembler
+from app.vanna.trainer import VannaTrainer
+from app.vanna.training_store import TrainingDataStore
+from app.vanna.training_jobs import TrainingJobManager
+from app.vanna.vector_mirror import VectorMirror
+
+logger = logging.getLogger(__name__)
+
+class ServiceContainer:
+    """
+    应用组件容器，所有组件在首次访问时创建，每个进程一份
+    """
+
+    def __init__(self):
+        """初始化组件容器（不创建任何组件，不访问网络）"""
+        self._lock = threading.RLock()
+        self._pid = os.getpid()
+        self._components: Dict[str, Any] = {}
+
+    def _check_process(self):
+        """
+        检测是否处于fork出的子进程中
+
+        子进程丢弃从父进程继承的组件（不关闭，以免影响父进程的连接），之后重新创建
+        """
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    inherited = self._components.get('db_connection')
+                    if inherited is not None:
+                        inherited.discard_pool()
+                    self._components = {}
+                    self._pid = os.getpid()
+                    logger.info(f"检测到新进程 {self._pid}，组件将重新初始化")
+
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        """
+        获取组件，不存在时在锁内创建
+
+        Args:
+            name: 组件名称
+            factory: 创建组件的函数
+
+        Returns:
+            Any: 组件实例
+        """
+        self._check_process()
+        component = self._components.get(name)
+        if component is None:
+            with self._lock:
+                component = self._components.get(name)
+                if component is None:
+                    start_time = time.time()
+                    component = factory()
+                    self._components[name] = component
+                    logger.info(f"组件 {name} 初始化完成，用时 {time.time() - start_time:.3f} 秒")
+        return component
+
+    @property
+    def db_connection(self):
+        """数据库连接"""
+        return self._get('db_connection', lambda: DatabaseConnection(result_cache=self.result_cache))
+
+    @property
+    def result_cache(self):
+        """查询结果缓存，未启用时为None"""
+        if not RESULT_CACHE_CONFIG['enabled']:
+            return None
+        return self._get('result_cache', self._create_result_cache)
+
+    def _create_result_cache(self):
+        """创建查询结果缓存（数据版本在首次查询时才读取，不在此处访问数据库）"""
+        return QueryResultCache(
+            max_bytes=RESULT_CACHE_CONFIG['max_bytes'],
+            max_entry_bytes=RESULT_CACHE_CONFIG['max_entry_bytes'],
+            ttl_seconds=RESULT_CACHE_CONFIG['ttl_seconds'],
+            version_provider=self._result_data_version,
+            version_check_interval=RESULT_CACHE_CONFIG['version_check_interval']
+        )
+
+    def _result_data_version(self):
+        """业务数据版本：配置的版本SQL的结果，或业务schema的表修改计数"""
+        if RESULT_CACHE_CONFIG['version_sql']:
+            return self.db_connection.get_scalar(RESULT_CACHE_CONFIG['version_sql'])
+        return self.db_connection.get_data_version(RESULT_CACHE_CONFIG['version_schemas'])
+
+    @property
+    def query_pager(self):
+        """分页查询的游标管理器"""
+        return self._get(
+            'query_pager',
+            lambda: QueryPager(
+                self.db_connection,
+                idle_timeout=PAGINATION_CONFIG['idle_timeout'],
+                # 分页游标独占连接，至少留一个连接给普通查询
+                max_open=max(1, min(PAGINATION_CONFIG['max_open'], self.db_connection.pool_size - 1)),
+                max_page_size=PAGINATION_CONFIG['max_page_size'],
+                max_rows=PAGINATION_CONFIG['max_rows']
+            )
+        )
+
+    @property
+    def llm_model(self):
+        """LLM模型"""
+        return self._get('llm_model', LLMFactory.create_llm)
+
+    @property
+    def vanna_setup(self):
+        """Vanna设置（包含带缓存的Embedding模型）"""
+        return self._get(
+            'vanna_setup',
+            lambda: VannaSetup(self.llm_model, EmbeddingFactory.create_embedding())
+        )
+
+    @property
+    def embedding_model(self):
+        """带缓存的Embedding模型"""
+        return self.vanna_setup.embedding_model
+
+    @property
+    def vanna_instance(self):
+        """Vanna实例"""
+        return self._get(
+            'vanna_instance',
+            lambda: self.vanna_setup.initialize_vanna(db_connection=self.db_connection)
+        )
+
+    @property
+    def query_cache(self):
+        """问题-SQL缓存，未启用时为None"""
+        if not QUERY_CACHE_CONFIG['enabled']:
+            return None
+        return self._get('query_cache', self._create_query_cache)
+
+    def _create_query_cache(self):
+        """创建问题-SQL缓存"""
+        db_connection = self.db_connection
+        return QuestionSQLCache(
+            embedding_model=self.embedding_model if QUERY_CACHE_CONFIG['semantic_enabled'] else None,
+            max_entries=QUERY_CACHE_CONFIG['max_entries'],
+            ttl_seconds=QUERY_CACHE_CONFIG['ttl_seconds'],
+            similarity_threshold=QUERY_CACHE_CONFIG['similarity_threshold'],
+            # 训练脚本在其他进程中修改向量表时，通过数据版本号使缓存失效
+            version_provider=lambda: db_connection.get_data_version([VECTOR_STORAGE_CONFIG['schema']]),
+            version_check_interval=QUERY_CACHE_CONFIG['version_check_interval']
+        )
+
+    @property
+    def vector_mirror(self):
+        """进程内向量镜像，未启用或加载失败时为None"""
+        if not VECTOR_MIRROR_CONFIG['enabled']:
+            return None
+        return self._get('vector_mirror', self._create_vector_mirror)
+
+    def _create_vector_mirror(self):
+        """创建并加载向量镜像，加载失败时退回pgvector检索"""
+        db_connection = self.db_connection
+        vector_mirror = VectorMirror(
+            db_connection,
+            version_provider=lambda: db_connection.get_data_version([VECTOR_STORAGE_CONFIG['schema']]),
+            refresh_interval=VECTOR_MIRROR_CONFIG['refresh_interval']
+        )
+        try:
+            vector_mirror.load()
+        except Exception as e:
+            logger.warning(f"加载向量镜像失败，检索将使用pgvector: {str(e)}")
+        return vector_mirror
+
+    @property
+    def query_processor(self):
+        """查询处理器"""
+        return self._get('query_processor', self._create_query_processor)
+
+    def _create_query_processor(self):
+        """创建查询处理器"""
+        return QueryProcessor(
+            self.vanna_instance,
+            self.db_connection,
+            query_cache=self.query_cache,
+            sql_generator=SQLGenerator(
+                self.vanna_instance,
+                self.llm_model,
+                prompt_assembler=PromptAssembler(
+                    self.vanna_instance,
+                    vector_mirror=self.vector_mirror,
+                    embedding_model=self.embedding_model
+                )
+            ),
+            explain_chain=SQL2NaturalLanguageChain(self.llm_model),
+            training_store=self.training_store,
+            query_pager=self.query_pager
+        )
+
+    @property
+    def training_store(self):
+        """训练数据写入器（按内容哈希去重）"""
+        return self._get(
+            'training_store',
+            lambda: TrainingDataStore(self.db_connection, self.embedding_model, vector_mirror=self.vector_mirror)
+        )
+
+    @property
+    def trainer(self):
+        """训练器"""
+        return self._get(
+            'trainer',
+            lambda: VannaTrainer(
+                self.vanna_instance,
+                query_cache=self.query_cache,
+                training_store=self.training_store,
+                vector_mirror=self.vector_mirror
+            )
+        )
+
+    @property
+    def training_jobs(self):
+        """训练任务管理器"""
+        return self._get(
+            'training_jobs',
+            lambda: TrainingJobManager(self.training_store, query_cache=self.query_cache)
+        )
+
+    def warmup(self) -> Dict[str, float]:
+        """
+        预热：创建全部组件、预先打开连接池中的连接并预热缓存
+
+        Returns:
+            Dict[str, float]: 各预热步骤耗时（秒）
+        """
+        timings = {}
+
+        start_time = time.time()
+        self.query_processor
+        self.trainer
+        timings['components'] = time.time() - start_time
+
+        start_time = time.time()
+        self.db_connection.warmup_pool(WARMUP_CONFIG['pool_connections'])
+        timings['db_pool'] = time.time() - start_time
+
+        # 预先计算常见问题的向量，写入Embedding缓存
+        questions = WARMUP_CONFIG['questions']
+        if questions:
+            start_time = time.time()
+            try:
+                self.embedding_model.embed_documents(questions)
+            except Exception as e:
+                logger.warning(f"预热Embedding缓存失败: {str(e)}")
+            timings['embedding_cache'] = time.time() - start_time
+
+        logger.info(f"进程 {os.getpid()} 预热完成: " +
+                    ", ".join(f"{name} {seconds:.3f}s" for name, seconds in timings.items()))
+        return timings
+
+# 进程内共享的组件容器
+services = ServiceContainer()
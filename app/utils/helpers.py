@@ -4,7 +4,7 @@
 """
 import json
 import os
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Sequence
 import datetime
 
 def load_json_file(file_path: str) -> Any:
@@ -89,4 +89,19 @@ def format_results_for_display(results: List[Dict[str, Any]], columns: List[str]
     
     # 组合表格
     table = f"{header}\n{separator}\n" + "\n".join(rows)
-    return table 
\ No newline at end of file
+    return table
+
+def rows_to_columnar(rows: Sequence[Sequence[Any]], column_count: int) -> List[List[Any]]:
+    """
+    将按行存放的结果转换为按列存放
+    
+    Args:
+        rows: 行元组列表
+        column_count: 列数
+        
+    Returns:
+        List[List[Any]]: 每列一个值列表，顺序与列名一致
+    """
+    if not rows:
+        return [[] for _ in range(column_count)]
+    return [list(values) for values in zip(*rows)]
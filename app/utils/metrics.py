@@ -0,0 +1,220 @@
+"""
+指标统计模块
+
+记录查询流水线各阶段的耗时（滑动窗口分位数p50/p95/p99）和计数器，
+以Prometheus文本格式导出；同时收集单个请求内各阶段耗时，可附加到响应中
+（响应序列化发生在响应内容确定之后，serialization阶段只计入导出的指标）
+"""
+import time
+import threading
+import contextvars
+from collections import deque, defaultdict
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+# 导出的分位数
+QUANTILES = (0.5, 0.95, 0.99)
+
+# 当前请求的统计信息：timings为阶段耗时（秒），usage为token等用量，未开启时为None
+_request_stats: contextvars.ContextVar = contextvars.ContextVar("request_stats", default=None)
+
+class MetricsRegistry:
+    """
+    进程内指标注册表，线程安全
+    """
+
+    def __init__(self, window_size: int = 2048):
+        """
+        初始化指标注册表
+
+        Args:
+            window_size: 每个阶段用于计算分位数的最近样本数
+        """
+        self.window_size = window_size
+        self._lock = threading.Lock()
+        self._durations: Dict[str, deque] = {}
+        self._duration_sums: Dict[str, float] = defaultdict(float)
+        self._duration_counts: Dict[str, int] = defaultdict(int)
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = defaultdict(float)
+        self._help: Dict[str, str] = {}
+
+    def observe(self, stage: str, seconds: float):
+        """
+        记录一次阶段耗时
+
+        Args:
+            stage: 阶段名称
+            seconds: 耗时（秒）
+        """
+        with self._lock:
+            window = self._durations.get(stage)
+            if window is None:
+                window = self._durations[stage] = deque(maxlen=self.window_size)
+            window.append(seconds)
+            self._duration_sums[stage] += seconds
+            self._duration_counts[stage] += 1
+
+    def inc(self, name: str, value: float = 1, help_text: str = "", **labels):
+        """
+        增加计数器
+
+        Args:
+            name: 指标名称
+            value: 增加的值
+            help_text: 指标说明
+            **labels: 标签
+        """
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] += value
+            if help_text and name not in self._help:
+                self._help[name] = help_text
+
+    def get_quantiles(self, stage: str) -> Dict[float, float]:
+        """
+        计算阶段耗时的分位数
+
+        Args:
+            stage: 阶段名称
+
+        Returns:
+            Dict[float, float]: {分位数: 耗时（秒）}
+        """
+        with self._lock:
+            samples = sorted(self._durations.get(stage, ()))
+        if not samples:
+            return {}
+        return {
+            q: samples[min(len(samples) - 1, int(q * len(samples)))]
+            for q in QUANTILES
+        }
+
+    def render_prometheus(self) -> str:
+        """
+        以Prometheus文本格式导出全部指标
+
+        Returns:
+            str: Prometheus exposition格式文本
+        """
+        lines = [
+            "# HELP nl2sql_stage_duration_seconds 查询流水线各阶段耗时",
+            "# TYPE nl2sql_stage_duration_seconds summary",
+        ]
+        with self._lock:
+            stages = sorted(self._durations)
+            sums = dict(self._duration_sums)
+            counts = dict(self._duration_counts)
+            counters = sorted(self._counters.items())
+            help_texts = dict(self._help)
+
+        for stage in stages:
+            for q, value in self.get_quantiles(stage).items():
+                lines.append(f'nl2sql_stage_duration_seconds{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+            lines.append(f'nl2sql_stage_duration_seconds_sum{{stage="{stage}"}} {sums[stage]:.6f}')
+            lines.append(f'nl2sql_stage_duration_seconds_count{{stage="{stage}"}} {counts[stage]}')
+
+        declared = set()
+        for (name, labels), value in counters:
+            if name not in declared:
+                if name in help_texts:
+                    lines.append(f"# HELP {name} {help_texts[name]}")
+                lines.append(f"# TYPE {name} counter")
+                declared.add(name)
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"{name}{{{label_text}}} {value:g}" if label_text else f"{name} {value:g}")
+
+        return "\n".join(lines) + "\n"
+
+# 进程内共享的指标注册表
+metrics = MetricsRegistry()
+
+def record_duration(stage: str, seconds: float):
+    """
+    记录阶段耗时到全局指标，并累加到当前请求的耗时统计
+
+    Args:
+        stage: 阶段名称
+        seconds: 耗时（秒）
+    """
+    metrics.observe(stage, seconds)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats['timings'][stage] = stats['timings'].get(stage, 0.0) + seconds
+
+def record_usage(name: str, value: int):
+    """
+    累加当前请求的用量（如prompt_tokens），不写入全局指标
+
+    Args:
+        name: 用量名称
+        value: 增加的值
+    """
+    stats = _request_stats.get()
+    if stats is not None:
+        stats['usage'][name] = stats['usage'].get(name, 0) + value
+
+def record_error(stage: str):
+    """
+    按阶段记录一次错误
+
+    Args:
+        stage: 阶段名称
+    """
+    metrics.inc("nl2sql_stage_errors_total", help_text="各阶段错误次数", stage=stage)
+
+def record_cache_lookup(cache: str, hits: int = 0, misses: int = 0):
+    """
+    记录缓存命中/未命中次数
+
+    Args:
+        cache: 缓存名称（embedding、question_sql等）
+        hits: 命中次数
+        misses: 未命中次数
+    """
+    if hits:
+        metrics.inc("nl2sql_cache_lookups_total", hits, help_text="缓存查询次数", cache=cache, result="hit")
+    if misses:
+        metrics.inc("nl2sql_cache_lookups_total", misses, help_text="缓存查询次数", cache=cache, result="miss")
+
+@contextmanager
+def stage_timer(stage: str):
+    """
+    统计代码块耗时的上下文管理器，出现异常时按阶段计数错误
+
+    Args:
+        stage: 阶段名称
+    """
+    start_time = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        record_error(stage)
+        raise
+    finally:
+        record_duration(stage, time.perf_counter() - start_time)
+
+def start_request_stats() -> contextvars.Token:
+    """
+    开始收集当前请求的阶段耗时和用量
+
+    Returns:
+        contextvars.Token: 用于end_request_stats恢复上下文
+    """
+    return _request_stats.set({'timings': {}, 'usage': {}})
+
+def end_request_stats(token: contextvars.Token) -> Dict[str, Dict]:
+    """
+    结束收集当前请求的阶段耗时和用量
+
+    Args:
+        token: start_request_stats返回的令牌
+
+    Returns:
+        Dict[str, Dict]: timings为{阶段名称: 耗时（毫秒）}，usage为{用量名称: 值}
+    """
+    stats = _request_stats.get() or {'timings': {}, 'usage': {}}
+    _request_stats.reset(token)
+    return {
+        'timings': {stage: round(seconds * 1000, 3) for stage, seconds in stats['timings'].items()},
+        'usage': dict(stats['usage']),
+    }
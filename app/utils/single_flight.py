@@ -0,0 +1,118 @@
+"""
+请求合并（single-flight）模块
+
+相同键的并发调用只执行一次，其余调用等待并共享同一个结果（或异常）。
+调用完成后立即移除，不缓存结果，因此不会返回过期数据。
+"""
+import asyncio
+import logging
+import threading
+from typing import Dict, Any, Callable, Awaitable, Hashable, Tuple
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class _Call:
+    """一次进行中的调用"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+class SingleFlight:
+    """
+    线程版请求合并
+    """
+
+    def __init__(self, name: str):
+        """
+        初始化请求合并器
+
+        Args:
+            name: 名称，用作指标标签
+        """
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        执行fn，相同key已有调用在进行时等待其结果
+
+        Args:
+            key: 调用键
+            fn: 无参数函数
+
+        Returns:
+            Tuple[Any, bool]: 结果和是否共享了其他调用的结果
+
+        Raises:
+            Exception: fn抛出的异常（等待者收到同一个异常）
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            metrics.inc("nl2sql_coalesced_requests_total", help_text="与进行中的相同请求合并的次数",
+                        stage=self.name)
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+        return call.result, False
+
+class AsyncSingleFlight:
+    """
+    asyncio版请求合并
+
+    调用在独立的任务中执行，发起调用的请求被取消（如客户端断开）时，其他等待者仍能得到结果
+    """
+
+    def __init__(self, name: str):
+        """
+        初始化请求合并器
+
+        Args:
+            name: 名称，用作指标标签
+        """
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        执行fn，相同key已有调用在进行时等待其结果
+
+        Args:
+            key: 调用键
+            fn: 返回协程的无参数函数
+
+        Returns:
+            Tuple[Any, bool]: 结果和是否共享了其他调用的结果
+        """
+        task = self._calls.get(key)
+        if task is not None:
+            metrics.inc("nl2sql_coalesced_requests_total", help_text="与进行中的相同请求合并的次数",
+                        stage=self.name)
+            return await asyncio.shield(task), True
+
+        # 任务复制当前上下文，执行期间记录的阶段耗时计入发起调用的请求
+        task = asyncio.ensure_future(fn())
+        self._calls[key] = task
+        task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task), False
@@ -0,0 +1,179 @@
+"""
+异步查询处理模块，供ASGI服务模式使用
+"""
+import asyncio
+import logging
+from typing import Dict, Any, Optional
+
+from app.config import QUERY_EXECUTION_CONFIG
+from app.db.async_connection import AsyncDatabaseConnection
+from app.vanna.query_cache import normalize_question
+from app.vanna.query_processor import QueryProcessor
+from app.utils.metrics import metrics, start_request_stats, end_request_stats
+from app.utils.single_flight import AsyncSingleFlight
+
+logger = logging.getLogger(__name__)
+
+class AsyncQueryProcessor:
+    """
+    异步查询处理器
+
+    复用同步QueryProcessor的Vanna实例、问题-SQL缓存和SQL生成器，
+    将等待I/O的步骤替换为异步实现：问题向量用异步HTTP客户端计算，
+    LLM使用ainvoke，SQL通过异步连接池执行。
+    """
+
+    def __init__(self, query_processor: QueryProcessor, db_connection: AsyncDatabaseConnection,
+                 embedding_model=None):
+        """
+        初始化异步查询处理器
+
+        Args:
+            query_processor: 同步查询处理器，提供缓存、SQL生成器和训练接口
+            db_connection: 异步数据库连接
+            embedding_model: 可选，带缓存的Embedding模型，用于预先异步计算问题向量
+        """
+        self.query_processor = query_processor
+        self.db_connection = db_connection
+        self.embedding_model = embedding_model
+        self._flight = AsyncSingleFlight("sql_generation")
+
+    async def _generate_sql(self, question: str):
+        """
+        异步生成SQL，优先使用问题-SQL缓存；规范化后相同的问题正在生成SQL时等待其结果，不重复调用LLM
+
+        Args:
+            question: 自然语言问题
+
+        Returns:
+            Tuple[Optional[str], str]: 生成的SQL和SQL来源
+        """
+        # 先异步计算问题向量写入Embedding缓存，之后语义缓存和向量检索都直接命中缓存
+        if self.embedding_model is not None:
+            await self.embedding_model.aembed_query(question)
+
+        # 缓存偶尔需要查询数据版本（同步数据库调用），放到线程中避免阻塞事件循环
+        cached = await asyncio.to_thread(self.query_processor.get_cached_sql, question)
+        if cached is not None:
+            return cached
+
+        if not QUERY_EXECUTION_CONFIG['coalesce']:
+            return await self._call_llm(question), "llm"
+
+        sql, shared = await self._flight.do(normalize_question(question), lambda: self._call_llm(question))
+        if shared:
+            logger.info(f"与进行中的相同问题合并: {question}")
+        return sql, "llm"
+
+    async def _call_llm(self, question: str):
+        """调用LLM生成SQL"""
+        sql_generator = self.query_processor.sql_generator
+        if sql_generator is not None:
+            return await sql_generator.agenerate_sql(question)
+        return await asyncio.to_thread(self.query_processor.vanna.generate_sql, question=question)
+
+    async def process_query(self, question: str, max_results: Optional[int] = None,
+                            result_format: str = "rows", include_timings: bool = False,
+                            page_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        异步处理自然语言查询，返回结构与QueryProcessor.process_query一致
+
+        Args:
+            question: 自然语言问题
+            max_results: 最大返回结果数（分页时为总行数上限），为None时使用配置的硬上限
+            result_format: 结果格式，rows为字典列表，columnar为按列存放的值列表
+            include_timings: 是否在结果中附加各阶段耗时（毫秒）
+            page_size: 可选，每页行数，提供时只返回第一页（分页游标为同步实现，在线程中执行）
+
+        Returns:
+            Dict: 包含SQL查询、结果和元数据的字典
+        """
+        # asyncio.to_thread会复制当前上下文，线程中记录的阶段耗时同样计入本次请求
+        token = start_request_stats()
+        try:
+            result = await self._process_query(question, max_results, result_format, page_size)
+        finally:
+            stats = end_request_stats(token)
+
+        metrics.inc("nl2sql_queries_total", help_text="处理的查询数",
+                    status="success" if result["success"] else "error")
+        if stats["usage"]:
+            result["usage"] = stats["usage"]
+        if include_timings:
+            result["timings"] = stats["timings"]
+        return result
+
+    async def _process_query(self, question: str, max_results: Optional[int],
+                             result_format: str, page_size: Optional[int] = None) -> Dict[str, Any]:
+        """异步处理自然语言查询（process_query的实现，不含耗时统计）"""
+        logger.info(f"异步处理查询: {question}")
+
+        try:
+            sql, sql_source = await self._generate_sql(question)
+
+            if not sql:
+                logger.warning(f"未能为问题生成SQL: {question}")
+                return {
+                    "success": False,
+                    "error": "无法根据您的问题生成SQL查询，请尝试重新表述您的问题。",
+                    "question": question,
+                    "sql": None,
+                    "results": None,
+                    "columns": None
+                }
+
+            logger.info(f"生成的SQL: {sql}")
+
+            query_cache = self.query_processor.query_cache
+            if page_size is not None:
+                page = await asyncio.to_thread(
+                    self.query_processor.open_page, sql, page_size, max_results, result_format
+                )
+                if query_cache is not None and sql_source == "llm":
+                    await asyncio.to_thread(query_cache.put, question, sql)
+                return {"success": True, "question": question, "sql": sql, "sql_source": sql_source, **page}
+
+            results, columns = await self.db_connection.execute_query(
+                sql,
+                max_rows=max_results,
+                result_format=result_format
+            )
+
+            if query_cache is not None and sql_source == "llm":
+                # 写入缓存需要计算问题向量（Embedding缓存读写或远程请求），在线程中执行
+                await asyncio.to_thread(query_cache.put, question, sql)
+
+            return {
+                "success": True,
+                "question": question,
+                "sql": sql,
+                "sql_source": sql_source,
+                "format": result_format,
+                "results": results,
+                "columns": columns
+            }
+
+        except Exception as e:
+            logger.error(f"异步查询处理错误: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "question": question,
+                "sql": None,
+                "results": None,
+                "columns": None
+            }
+
+    async def train_from_feedback(self, question: str, sql: str, is_correct: bool = True) -> bool:
+        """
+        根据用户反馈训练Vanna（写入向量库的同步操作在线程中执行）
+
+        Args:
+            question: 自然语言问题
+            sql: SQL查询
+            is_correct: 指示SQL是否正确
+
+        Returns:
+            bool: 训练是否成功
+        """
+        return await asyncio.to_thread(self.query_processor.train_from_feedback, question, sql, is_correct)
@@ -0,0 +1,246 @@
+"""
+提示词组装模块
+
+按相似度对检索到的DDL、文档和问题-SQL示例排序，去除近似重复的条目，
+再在token预算内贪心放入提示词，控制提示词大小
+"""
+import re
+import ast
+import json
+import math
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.config import PROMPT_CONFIG
+from app.utils.metrics import metrics, stage_timer, record_usage
+
+logger = logging.getLogger(__name__)
+
+# 中日韩字符，每个字约计1个token
+_CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]')
+_WORD_PATTERN = re.compile(r'\w+')
+
+# 每条上下文在提示词中的格式开销（换行、消息角色等）
+_ITEM_OVERHEAD_TOKENS = 4
+
+# 检索类型与Vanna接口的对应关系
+_CONTEXT_TYPES = {
+    'sql': ('sql_collection', 'get_similar_question_sql'),
+    'ddl': ('ddl_collection', 'get_related_ddl'),
+    'documentation': ('documentation_collection', 'get_related_documentation'),
+}
+
+def estimate_tokens(text: str) -> int:
+    """
+    本地估算文本的token数，无需加载分词器
+
+    中日韩字符按每字1个token计算，其余字符按约4个字符1个token计算
+
+    Args:
+        text: 文本
+
+    Returns:
+        int: 估算的token数
+    """
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    return cjk_count + math.ceil((len(text) - cjk_count) / 4)
+
+def _word_set(text: str) -> frozenset:
+    """提取用于判断近似重复的词集合（中日韩字符按单字计）"""
+    text = text.lower()
+    return frozenset(_WORD_PATTERN.findall(_CJK_PATTERN.sub(' ', text))) | frozenset(_CJK_PATTERN.findall(text))
+
+def _parse_question_sql(content: Any) -> Optional[Dict[str, str]]:
+    """解析sql集合中的文档（JSON或Python字面量格式的{"question", "sql"}）"""
+    if isinstance(content, dict):
+        return content
+    for parser in (json.loads, ast.literal_eval):
+        try:
+            value = parser(content)
+            if isinstance(value, dict) and 'sql' in value:
+                return value
+        except (ValueError, SyntaxError):
+            continue
+    return None
+
+class PromptAssembler:
+    """
+    在token预算内组装SQL生成提示词
+    """
+
+    def __init__(self, vanna_instance, token_budget: Optional[int] = None,
+                 candidates_per_type: Optional[int] = None, min_score: Optional[float] = None,
+                 dedup_threshold: Optional[float] = None, vector_mirror=None, embedding_model=None):
+        """
+        初始化提示词组装器
+
+        Args:
+            vanna_instance: Vanna实例，用于检索上下文和生成提示词
+            token_budget: 提示词token预算，为None时使用配置值
+            candidates_per_type: 每类上下文检索的候选数，为None时使用配置值
+            min_score: 最低相似度，为None时使用配置值
+            dedup_threshold: 近似重复判定阈值，为None时使用配置值
+            vector_mirror: 可选，进程内向量镜像，已加载时在内存中检索，不访问pgvector
+            embedding_model: 可选，计算问题向量的Embedding模型，提供时问题向量只计算一次，
+                三类检索共用（使用向量镜像时必须提供）
+        """
+        self.vanna = vanna_instance
+        self.vector_mirror = vector_mirror
+        self.embedding_model = embedding_model
+        # 三类上下文的pgvector检索并发执行，线程池由所有请求共用
+        self._executor = ThreadPoolExecutor(
+            max_workers=PROMPT_CONFIG['retrieval_workers'], thread_name_prefix="retrieval"
+        )
+        self.token_budget = token_budget or PROMPT_CONFIG['token_budget']
+        self.candidates_per_type = candidates_per_type or PROMPT_CONFIG['candidates_per_type']
+        self.min_score = PROMPT_CONFIG['min_score'] if min_score is None else min_score
+        self.dedup_threshold = PROMPT_CONFIG['dedup_threshold'] if dedup_threshold is None else dedup_threshold
+
+    def _retrieve(self, context_type: str, question: str,
+                  embedding: Optional[List[float]] = None) -> List[Tuple[float, Any]]:
+        """
+        检索一类上下文并返回相似度
+
+        向量镜像已加载时在内存中检索；向量集合支持similarity_search_with_score时
+        使用余弦距离换算的相似度（有问题向量时按向量检索，不再重复计算）；
+        否则退回Vanna的检索接口，按返回顺序给出递减的分数
+
+        Args:
+            context_type: sql、ddl或documentation
+            question: 自然语言问题
+            embedding: 可选，已计算的问题向量
+
+        Returns:
+            List[Tuple[float, Any]]: (相似度, 内容)列表，sql类型的内容为{"question", "sql"}字典
+        """
+        collection_name, method_name = _CONTEXT_TYPES[context_type]
+        collection = getattr(self.vanna, collection_name, None)
+
+        if embedding is not None and self._use_mirror():
+            results = self.vector_mirror.search(context_type, embedding, self.candidates_per_type)
+        elif collection is not None and hasattr(collection, 'similarity_search_with_score'):
+            if embedding is not None and hasattr(collection, 'similarity_search_with_score_by_vector'):
+                documents = collection.similarity_search_with_score_by_vector(embedding, k=self.candidates_per_type)
+            else:
+                documents = collection.similarity_search_with_score(question, k=self.candidates_per_type)
+            results = [(1.0 - distance, document.page_content) for document, distance in documents]
+        else:
+            items = getattr(self.vanna, method_name)(question) or []
+            results = [(1.0 / (rank + 1), item) for rank, item in enumerate(items[:self.candidates_per_type])]
+
+        if context_type == 'sql':
+            results = [(score, _parse_question_sql(item)) for score, item in results]
+            results = [(score, item) for score, item in results if item is not None]
+        return results
+
+    def _use_mirror(self) -> bool:
+        """是否使用进程内向量镜像检索"""
+        return self.vector_mirror is not None and self.vector_mirror.loaded
+
+    def _is_duplicate(self, words: frozenset, selected_words: List[frozenset]) -> bool:
+        """判断词集合是否与已选条目近似重复"""
+        for other in selected_words:
+            union = len(words | other)
+            if union and len(words & other) / union >= self.dedup_threshold:
+                return True
+        return False
+
+    def assemble(self, question: str, initial_prompt: Optional[str] = None) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+        """
+        检索上下文并在token预算内组装提示词
+
+        Args:
+            question: 自然语言问题
+            initial_prompt: 可选，系统提示词开头
+
+        Returns:
+            Tuple[List[Dict[str, str]], Dict[str, int]]: 提示词消息列表和统计信息
+                （prompt_tokens、candidate_tokens、context_items、dropped_items）
+        """
+        # 检索耗时为三类检索并发执行的总耗时（含计算问题向量）
+        with stage_timer("retrieval"):
+            embedding = self.embedding_model.embed_query(question) if self.embedding_model is not None else None
+
+            if embedding is not None and self._use_mirror():
+                retrieved = {
+                    context_type: self._retrieve(context_type, question, embedding) for context_type in _CONTEXT_TYPES
+                }
+            else:
+                # 复制上下文，检索线程中记录的用量计入当前请求
+                futures = {
+                    context_type: self._executor.submit(
+                        contextvars.copy_context().run, self._retrieve, context_type, question, embedding
+                    )
+                    for context_type in _CONTEXT_TYPES
+                }
+                retrieved = {context_type: future.result() for context_type, future in futures.items()}
+
+            candidates = []
+            for context_type, results in retrieved.items():
+                for score, item in results:
+                    candidates.append((score, context_type, item))
+
+        with stage_timer("prompt"):
+            # 问题本身和Vanna的固定说明文字也占用预算
+            base_prompt = self.vanna.get_sql_prompt(
+                initial_prompt=initial_prompt,
+                question=question,
+                question_sql_list=[],
+                ddl_list=[],
+                doc_list=[]
+            )
+            used_tokens = sum(estimate_tokens(message.get('content', '')) for message in base_prompt)
+
+            selected = {context_type: [] for context_type in _CONTEXT_TYPES}
+            selected_words: List[frozenset] = []
+            candidate_tokens = used_tokens
+            dropped = 0
+
+            # 按相似度从高到低贪心放入，放不下的条目跳过，继续尝试更短的条目
+            for score, context_type, item in sorted(candidates, key=lambda c: c[0], reverse=True):
+                content = f"{item.get('question', '')}\n{item['sql']}" if context_type == 'sql' else str(item)
+                tokens = estimate_tokens(content) + _ITEM_OVERHEAD_TOKENS
+                candidate_tokens += tokens
+
+                words = _word_set(content)
+                if self._is_duplicate(words, selected_words):
+                    dropped += 1
+                    continue
+
+                if score < self.min_score or used_tokens + tokens > self.token_budget:
+                    dropped += 1
+                    continue
+
+                selected[context_type].append(item)
+                selected_words.append(words)
+                used_tokens += tokens
+
+            prompt = self.vanna.get_sql_prompt(
+                initial_prompt=initial_prompt,
+                question=question,
+                question_sql_list=selected['sql'],
+                ddl_list=selected['ddl'],
+                doc_list=selected['documentation']
+            )
+
+        prompt_tokens = sum(estimate_tokens(message.get('content', '')) for message in prompt)
+        stats = {
+            'prompt_tokens': prompt_tokens,
+            'candidate_tokens': candidate_tokens,
+            'context_items': sum(len(items) for items in selected.values()),
+            'dropped_items': dropped,
+        }
+        record_usage('prompt_tokens', prompt_tokens)
+        record_usage('prompt_candidate_tokens', candidate_tokens)
+        metrics.inc("nl2sql_prompt_tokens_total", prompt_tokens, help_text="组装后的提示词估算token数")
+        metrics.inc("nl2sql_prompt_tokens_saved_total", max(0, candidate_tokens - prompt_tokens),
+                    help_text="token预算和去重节省的估算token数")
+        logger.info(
+            f"提示词组装完成: {stats['context_items']} 条上下文，约 {prompt_tokens} tokens"
+            f"（候选共约 {candidate_tokens} tokens，丢弃 {dropped} 条）"
+        )
+        return prompt, stats
@@ -0,0 +1,272 @@
+"""
+问题-SQL缓存模块
+
+两级缓存：按规范化问题文本的精确缓存，以及按问题向量余弦相似度的语义缓存
+
+问题向量保存在预留容量的连续矩阵中（写入和淘汰时增删行，删除时用最后一行填补空位），
+语义查询直接对矩阵做一次矩阵-向量乘法，不再每次重新拼接矩阵
+"""
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Callable
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# 问题末尾无意义的标点
+_TRAILING_PUNCTUATION = "?？。.!！;；,，"
+
+def normalize_question(question: str) -> str:
+    """
+    规范化问题文本：去首尾空白、合并空白、转小写、去掉末尾标点
+
+    Args:
+        question: 原始问题
+
+    Returns:
+        str: 规范化后的问题
+    """
+    normalized = re.sub(r"\s+", " ", question.strip()).lower()
+    return normalized.rstrip(_TRAILING_PUNCTUATION).strip()
+
+class QuestionSQLCache:
+    """
+    问题-SQL缓存
+
+    训练数据或schema变化时整体失效：进程内通过invalidate()，
+    跨进程（例如训练脚本）通过version_provider返回的数据版本号检测。
+    """
+
+    def __init__(self, embedding_model: Optional[Embeddings] = None,
+                 max_entries: int = 2000, ttl_seconds: int = 86400,
+                 similarity_threshold: float = 0.95,
+                 version_provider: Optional[Callable[[], Any]] = None,
+                 version_check_interval: float = 30):
+        """
+        初始化问题-SQL缓存
+
+        Args:
+            embedding_model: 用于语义缓存的Embedding模型，为None时只使用精确缓存
+            max_entries: 最大缓存条目数
+            ttl_seconds: 条目有效期（秒）
+            similarity_threshold: 语义缓存命中所需的最小余弦相似度
+            version_provider: 返回训练数据版本号的函数，版本变化时清空缓存
+            version_check_interval: 检查数据版本的最小间隔（秒）
+        """
+        self.embedding_model = embedding_model
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.version_provider = version_provider
+        self.version_check_interval = version_check_interval
+
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 语义缓存的向量矩阵：第i行为_row_keys[i]的问题向量，_row_created[i]为其写入时间
+        self._matrix: Optional[np.ndarray] = None
+        self._row_created: Optional[np.ndarray] = None
+        self._row_keys: List[str] = []
+        self._row_positions: Dict[str, int] = {}
+        self._version = None
+        self._version_checked_at = 0.0
+
+        self.stats = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "invalidations": 0,
+        }
+
+    def get(self, question: str) -> Optional[Dict[str, Any]]:
+        """
+        查询缓存，先精确匹配，再语义匹配
+
+        Args:
+            question: 自然语言问题
+
+        Returns:
+            Optional[Dict[str, Any]]: 命中时返回 {"sql": ..., "cache_type": "exact"|"semantic", ...}，否则返回None
+        """
+        self._check_version()
+        key = normalize_question(question)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry["created_at"] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.stats["exact_hits"] += 1
+                return {"sql": entry["sql"], "cache_type": "exact", "matched_question": entry["question"]}
+
+        if self.embedding_model is not None:
+            match = self._semantic_lookup(question, now)
+            if match is not None:
+                return match
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def _semantic_lookup(self, question: str, now: float) -> Optional[Dict[str, Any]]:
+        """
+        按余弦相似度查找最接近的已缓存问题
+
+        Args:
+            question: 自然语言问题
+            now: 当前时间戳
+
+        Returns:
+            Optional[Dict[str, Any]]: 命中结果或None
+        """
+        with self._lock:
+            if not self._row_keys:
+                return None
+
+        # 对原始问题计算向量，与后续SQL生成共用Embedding缓存
+        vector = self._embed(question)
+        if vector is None:
+            return None
+
+        with self._lock:
+            size = len(self._row_keys)
+            if size == 0 or vector.shape[0] != self._matrix.shape[1]:
+                return None
+            similarities = self._matrix[:size] @ vector
+            # 过期的条目不参与比较
+            similarities[self._row_created[:size] < now - self.ttl_seconds] = -np.inf
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.similarity_threshold:
+                return None
+            cached_key = self._row_keys[best]
+            entry = self._entries[cached_key]
+            self._entries.move_to_end(cached_key)
+            self.stats["semantic_hits"] += 1
+        logger.info(f"语义缓存命中: '{question}' ~ '{entry['question']}' (相似度 {similarity:.4f})")
+        return {
+            "sql": entry["sql"],
+            "cache_type": "semantic",
+            "matched_question": entry["question"],
+            "similarity": similarity,
+        }
+
+    def _set_row(self, key: str, vector: Optional[np.ndarray], created_at: float):
+        """写入或替换条目的向量行，vector为None时删除该行（调用方持有锁）"""
+        if vector is None or (self._matrix is not None and vector.shape[0] != self._matrix.shape[1]):
+            if vector is not None:
+                logger.warning(f"语义缓存向量维度不一致: {vector.shape[0]} != {self._matrix.shape[1]}，不参与语义匹配")
+            self._remove_row(key)
+            return
+
+        position = self._row_positions.get(key)
+        if position is None:
+            position = len(self._row_keys)
+            if self._matrix is None:
+                capacity = min(max(self.max_entries, 1) + 1, 1024)
+                self._matrix = np.empty((capacity, vector.shape[0]), dtype=np.float32)
+                self._row_created = np.empty(capacity, dtype=np.float64)
+            elif position == self._matrix.shape[0]:
+                # 容量翻倍，保持矩阵连续
+                grown = np.empty((position * 2, self._matrix.shape[1]), dtype=np.float32)
+                grown[:position] = self._matrix[:position]
+                self._matrix = grown
+                grown_created = np.empty(position * 2, dtype=np.float64)
+                grown_created[:position] = self._row_created[:position]
+                self._row_created = grown_created
+            self._row_keys.append(key)
+            self._row_positions[key] = position
+        self._matrix[position] = vector
+        self._row_created[position] = created_at
+
+    def _remove_row(self, key: str):
+        """删除条目的向量行，用最后一行填补空位（调用方持有锁）"""
+        position = self._row_positions.pop(key, None)
+        if position is None:
+            return
+        last = len(self._row_keys) - 1
+        if position != last:
+            self._matrix[position] = self._matrix[last]
+            self._row_created[position] = self._row_created[last]
+            self._row_keys[position] = self._row_keys[last]
+            self._row_positions[self._row_keys[position]] = position
+        self._row_keys.pop()
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        """计算归一化的问题向量，失败时返回None（语义缓存不可用不影响主流程）"""
+        try:
+            vector = np.asarray(self.embedding_model.embed_query(text), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"语义缓存计算问题向量失败: {str(e)}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def put(self, question: str, sql: str):
+        """
+        写入缓存
+
+        Args:
+            question: 自然语言问题
+            sql: 生成的SQL
+        """
+        key = normalize_question(question)
+        vector = self._embed(question) if self.embedding_model is not None else None
+
+        created_at = time.time()
+        with self._lock:
+            self._entries[key] = {
+                "question": question,
+                "sql": sql,
+                "created_at": created_at,
+            }
+            self._entries.move_to_end(key)
+            self._set_row(key, vector, created_at)
+            while len(self._entries) > self.max_entries:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self._remove_row(evicted_key)
+
+    def invalidate(self):
+        """清空缓存（训练数据或schema变化时调用）"""
+        with self._lock:
+            self._entries.clear()
+            self._row_keys.clear()
+            self._row_positions.clear()
+            self.stats["invalidations"] += 1
+        logger.info("问题-SQL缓存已失效")
+
+    def _check_version(self):
+        """按间隔检查训练数据版本，版本变化时清空缓存"""
+        if self.version_provider is None:
+            return
+
+        now = time.time()
+        if now - self._version_checked_at < self.version_check_interval:
+            return
+        self._version_checked_at = now
+
+        try:
+            version = self.version_provider()
+        except Exception as e:
+            logger.warning(f"获取训练数据版本失败: {str(e)}")
+            return
+
+        if self._version is not None and version != self._version:
+            self.invalidate()
+        self._version = version
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            Dict[str, Any]: 命中、未命中、失效次数及当前条目数
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        return stats
@@ -3,9 +3,17 @@
 查询处理模块，用于处理自然语言查询并生成SQL
 """
 import logging
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple, Iterator
 
 from app.db.connection import DatabaseConnection
+from app.db.result_pager import QueryPager
+from app.config import QUERY_EXECUTION_CONFIG
+from app.vanna.query_cache import QuestionSQLCache, normalize_question
+from app.vanna.sql_generator import SQLGenerator
+from app.vanna.training_store import TrainingDataStore, to_document
+from app.schemas.request import TrainingRequest
+from app.utils.metrics import metrics, stage_timer, record_cache_lookup, start_request_stats, end_request_stats
+from app.utils.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -14,32 +22,122 @@ class QueryProcessor:
     查询处理器，负责处理自然语言查询，生成SQL并执行
     """
     
-    def __init__(self, vanna_instance, db_connection: DatabaseConnection):
+    def __init__(self, vanna_instance, db_connection: DatabaseConnection,
+                 query_cache: Optional[QuestionSQLCache] = None,
+                 sql_generator: Optional[SQLGenerator] = None,
+                 explain_chain=None,
+                 training_store: Optional[TrainingDataStore] = None,
+                 query_pager: Optional[QueryPager] = None):
         """
         初始化查询处理器
         
         Args:
             vanna_instance: Vanna实例
             db_connection: 数据库连接实例
+            query_cache: 可选，问题-SQL缓存，命中时跳过SQL生成
+            sql_generator: 可选，SQL生成器，提供时支持逐token流式生成SQL
+            explain_chain: 可选，SQL2NaturalLanguageChain，用于流式输出SQL解释
+            training_store: 可选，训练数据写入器，提供时反馈按内容哈希写入，重复反馈不产生重复数据
+            query_pager: 可选，分页器，提供时支持分页查询
         """
         self.vanna = vanna_instance
         self.db_connection = db_connection
+        self.query_cache = query_cache
+        self.sql_generator = sql_generator
+        self.explain_chain = explain_chain
+        self.training_store = training_store
+        self.query_pager = query_pager
+        self._flight = SingleFlight("sql_generation")
     
-    def process_query(self, question: str) -> Dict[str, Any]:
+    def get_cached_sql(self, question: str) -> Optional[Tuple[str, str]]:
+        """
+        从问题-SQL缓存获取SQL
+        
+        Args:
+            question: 自然语言问题
+            
+        Returns:
+            Optional[Tuple[str, str]]: 命中时返回SQL和SQL来源（exact_cache或semantic_cache）
+        """
+        if self.query_cache is None:
+            return None
+        
+        with stage_timer("cache_lookup"):
+            cached = self.query_cache.get(question)
+        if cached is None:
+            record_cache_lookup("question_sql", misses=1)
+            return None
+        
+        record_cache_lookup("question_sql", hits=1)
+        logger.info(f"问题-SQL缓存命中({cached['cache_type']}): {question}")
+        return cached['sql'], f"{cached['cache_type']}_cache"
+    
+    def _generate_sql(self, question: str) -> Tuple[Optional[str], str]:
+        """
+        生成SQL，优先使用问题-SQL缓存；规范化后相同的问题正在生成SQL时等待其结果，不重复调用LLM
+        
+        Args:
+            question: 自然语言问题
+            
+        Returns:
+            Tuple[Optional[str], str]: 生成的SQL和SQL来源（llm、exact_cache或semantic_cache）
+        """
+        cached = self.get_cached_sql(question)
+        if cached is not None:
+            return cached
+        
+        if not QUERY_EXECUTION_CONFIG['coalesce']:
+            return self._call_llm(question), "llm"
+        
+        sql, shared = self._flight.do(normalize_question(question), lambda: self._call_llm(question))
+        if shared:
+            logger.info(f"与进行中的相同问题合并: {question}")
+        return sql, "llm"
+    
+    def _call_llm(self, question: str) -> Optional[str]:
+        """调用LLM生成SQL"""
+        if self.sql_generator is not None:
+            return self.sql_generator.generate_sql(question)
+        return self.vanna.generate_sql(question=question)
+    
+    def process_query(self, question: str, max_results: Optional[int] = None,
+                      result_format: str = "rows", include_timings: bool = False,
+                      page_size: Optional[int] = None) -> Dict[str, Any]:
         """
         处理自然语言查询
         
         Args:
             question: 自然语言问题
+            max_results: 最大返回结果数（分页时为总行数上限），为None时使用配置的硬上限
+            result_format: 结果格式，rows为字典列表，columnar为按列存放的值列表
+            include_timings: 是否在结果中附加各阶段耗时（毫秒）
+            page_size: 可选，每页行数，提供时只返回第一页，并附加query_id、page、offset和has_more
             
         Returns:
             Dict: 包含SQL查询、结果和元数据的字典
         """
+        token = start_request_stats()
+        try:
+            result = self._process_query(question, max_results, result_format, page_size)
+        finally:
+            stats = end_request_stats(token)
+        
+        metrics.inc("nl2sql_queries_total", help_text="处理的查询数",
+                    status="success" if result["success"] else "error")
+        if stats["usage"]:
+            result["usage"] = stats["usage"]
+        if include_timings:
+            result["timings"] = stats["timings"]
+        return result
+    
+    def _process_query(self, question: str, max_results: Optional[int],
+                       result_format: str, page_size: Optional[int] = None) -> Dict[str, Any]:
+        """处理自然语言查询（process_query的实现，不含耗时统计）"""
         logger.info(f"处理查询: {question}")
         
         try:
-            # 使用Vanna生成SQL
-            sql = self.vanna.generate_sql(question=question)
+            # 使用Vanna生成SQL（或从缓存获取）
+            sql, sql_source = self._generate_sql(question)
             
             if not sql:
                 logger.warning(f"未能为问题生成SQL: {question}")
@@ -54,13 +152,29 @@ class QueryProcessor:
             
             logger.info(f"生成的SQL: {sql}")
             
+            if page_size is not None:
+                page = self.open_page(sql, page_size, max_results, result_format)
+                if self.query_cache is not None and sql_source == "llm":
+                    self.query_cache.put(question, sql)
+                return {"success": True, "question": question, "sql": sql, "sql_source": sql_source, **page}
+            
             # 执行SQL查询
-            results, columns = self.db_connection.execute_query(sql)
+            results, columns = self.db_connection.execute_query(
+                sql,
+                max_rows=max_results,
+                result_format=result_format
+            )
+            
+            # 只缓存执行成功的SQL
+            if self.query_cache is not None and sql_source == "llm":
+                self.query_cache.put(question, sql)
             
             return {
                 "success": True,
                 "question": question,
                 "sql": sql,
+                "sql_source": sql_source,
+                "format": result_format,
                 "results": results,
                 "columns": columns
             }
@@ -76,6 +190,106 @@ class QueryProcessor:
                 "columns": None
             }
     
+    def open_page(self, sql: str, page_size: int, max_results: Optional[int],
+                  result_format: str) -> Dict[str, Any]:
+        """
+        执行SQL并返回第一页，后续页通过query_pager.fetch按query_id读取
+        
+        Args:
+            sql: SQL查询语句
+            page_size: 每页行数
+            max_results: 总行数上限
+            result_format: 结果格式
+            
+        Returns:
+            Dict[str, Any]: 第一页，见QueryPager.fetch
+            
+        Raises:
+            ValueError: 未配置分页器
+        """
+        if self.query_pager is None:
+            raise ValueError("未启用分页查询")
+        return self.query_pager.open(sql, page_size, max_rows=max_results, result_format=result_format)
+    
+    def stream_query(self, question: str, max_results: Optional[int] = None,
+                     result_format: str = "rows", explain: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        以事件流的方式处理自然语言查询
+        
+        SQL由LLM逐token生成时先返回sql_token事件，随后返回完整SQL，
+        再随着服务端游标读取逐批返回结果行，最后可选地逐token返回SQL解释。
+        
+        事件类型:
+            sql_token: {"type": "sql_token", "text": ...}
+            sql: {"type": "sql", "sql": ..., "sql_source": ...}
+            columns: {"type": "columns", "columns": [...], "format": ...}
+            rows: {"type": "rows", "rows": [...]}
+            explanation_token: {"type": "explanation_token", "text": ...}
+            done: {"type": "done", "row_count": ...}
+            error: {"type": "error", "error": ...}
+        
+        Args:
+            question: 自然语言问题
+            max_results: 最大返回结果数，为None时使用配置的硬上限
+            result_format: 每批结果的格式，rows或columnar
+            explain: 是否在结果之后流式输出SQL解释
+            
+        Yields:
+            Dict[str, Any]: 查询事件
+        """
+        logger.info(f"流式处理查询: {question}")
+        
+        try:
+            cached = self.get_cached_sql(question)
+            if cached is not None:
+                sql, sql_source = cached
+            elif self.sql_generator is not None:
+                # 逐token转发LLM输出，拼接完成后再提取SQL
+                chunks = []
+                for token in self.sql_generator.stream_sql(question):
+                    chunks.append(token)
+                    yield {"type": "sql_token", "text": token}
+                sql, sql_source = self.sql_generator.extract_sql("".join(chunks)), "llm"
+            else:
+                sql, sql_source = self.vanna.generate_sql(question=question), "llm"
+            
+            if not sql:
+                logger.warning(f"未能为问题生成SQL: {question}")
+                yield {"type": "error", "error": "无法根据您的问题生成SQL查询，请尝试重新表述您的问题。"}
+                return
+            
+            logger.info(f"生成的SQL: {sql}")
+            yield {"type": "sql", "sql": sql, "sql_source": sql_source}
+            
+            row_count = 0
+            columns_sent = False
+            for columns, batch in self.db_connection.stream_query(
+                sql,
+                max_rows=max_results,
+                result_format=result_format
+            ):
+                if not columns_sent:
+                    yield {"type": "columns", "columns": columns, "format": result_format}
+                    columns_sent = True
+                
+                batch_size = len(batch[0]) if result_format == "columnar" and batch else len(batch)
+                if batch_size:
+                    row_count += batch_size
+                    yield {"type": "rows", "rows": batch}
+            
+            if self.query_cache is not None and sql_source == "llm":
+                self.query_cache.put(question, sql)
+            
+            if explain and self.explain_chain is not None:
+                for token in self.explain_chain.stream_explain(sql):
+                    yield {"type": "explanation_token", "text": token}
+            
+            yield {"type": "done", "row_count": row_count}
+            
+        except Exception as e:
+            logger.error(f"流式查询处理错误: {str(e)}")
+            yield {"type": "error", "error": str(e)}
+    
     def train_from_feedback(self, question: str, sql: str, is_correct: bool = True) -> bool:
         """
         根据用户反馈训练Vanna
@@ -94,8 +308,18 @@ class QueryProcessor:
             
         try:
             # 训练问题-SQL对
-            self.vanna.add_sql(question=question, sql=sql)
+            if self.training_store is not None:
+                _, created = self.training_store.add_item(*to_document(TrainingRequest(question=question, sql=sql)))
+                if not created:
+                    logger.info(f"问题-SQL对已存在，跳过训练: {question}")
+                    return True
+            else:
+                self.vanna.add_sql(question=question, sql=sql)
             logger.info(f"成功训练问题-SQL对: {question} -> {sql}")
+            
+            # 训练数据变化，缓存的SQL可能已过时
+            if self.query_cache is not None:
+                self.query_cache.invalidate()
             return True
         except Exception as e:
             logger.error(f"训练错误: {str(e)}")
@@ -0,0 +1,330 @@
+"""
+数据库结构增量同步模块
+
+每张表对应一条DDL训练数据（向量元数据中记录table_name），并为每张表计算结构指纹
+（规范化表定义的哈希）与训练ID一起保存，同步时只删除/重新训练新增、删除或发生变化的表
+"""
+import re
+import json
+import hashlib
+import logging
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+from sqlalchemy import text
+
+from app.config import VECTOR_STORAGE_CONFIG
+from app.db.ddl_splitter import split_ddl
+from app.db.schema_extractor import SchemaExtractor
+
+logger = logging.getLogger(__name__)
+
+# 结构指纹表
+FINGERPRINT_TABLE = f"{VECTOR_STORAGE_CONFIG['schema']}.{VECTOR_STORAGE_CONFIG['table_prefix']}schema_fingerprints"
+
+# PGVector向量表
+EMBEDDING_TABLE = f"{VECTOR_STORAGE_CONFIG['schema']}.{VECTOR_STORAGE_CONFIG['embedding_table']}"
+
+def fingerprint_table(table: Dict[str, Any]) -> str:
+    """
+    计算表结构指纹
+
+    对表定义做规范化（去除注释首尾空白、外键和索引按名称排序）后序列化为JSON再取sha256，
+    与提取顺序和空白差异无关
+
+    Args:
+        table: SchemaExtractor.extract_tables返回的表结构
+
+    Returns:
+        str: 十六进制指纹
+    """
+    normalized = {
+        'schema': table['schema'],
+        'name': table['name'],
+        'comment': (table.get('comment') or '').strip(),
+        'columns': [
+            [column['name'], column['type'], column['nullable'], (column.get('comment') or '').strip()]
+            for column in table['columns']
+        ],
+        'primary_key': table['primary_key'],
+        'foreign_keys': sorted(
+            [fk['columns'], fk['ref_schema'], fk['ref_table'], fk['ref_columns']]
+            for fk in table['foreign_keys']
+        ),
+        'indexes': sorted(index['definition'] for index in table['indexes']),
+    }
+    payload = json.dumps(normalized, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def fingerprint_ddl(ddl: str) -> str:
+    """
+    计算DDL文本指纹（空白规范化后取sha256）
+
+    Args:
+        ddl: 单张表的DDL
+
+    Returns:
+        str: 十六进制指纹
+    """
+    return hashlib.sha256(re.sub(r'\s+', ' ', ddl).strip().encode('utf-8')).hexdigest()
+
+class SchemaSynchronizer:
+    """
+    数据库结构增量同步器，每张表对应一条DDL训练数据
+
+    指纹按来源（source）分别记录：从数据库提取的结构为database，从DDL文件加载的为文件路径，
+    不同来源的同步互不影响
+    """
+
+    def __init__(self, vanna_instance, db_connection, extractor: Optional[SchemaExtractor] = None):
+        """
+        初始化同步器
+
+        Args:
+            vanna_instance: Vanna实例
+            db_connection: 数据库连接实例
+            extractor: 可选，结构提取器，默认按配置的schema过滤条件创建
+        """
+        self.vanna = vanna_instance
+        self.db_connection = db_connection
+        self.extractor = extractor or SchemaExtractor(db_connection)
+
+    def _ensure_table(self):
+        """创建结构指纹表（不存在时），并将旧版按表名为主键的表迁移为按(来源, 表名)为主键"""
+        with self.db_connection.get_connection() as conn:
+            conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {VECTOR_STORAGE_CONFIG['schema']}"))
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {FINGERPRINT_TABLE} ("
+                "source TEXT NOT NULL DEFAULT 'database', "
+                "table_name TEXT NOT NULL, "
+                "fingerprint TEXT NOT NULL, "
+                "training_id TEXT, "
+                "updated_at TIMESTAMPTZ NOT NULL DEFAULT now(), "
+                "PRIMARY KEY (source, table_name))"
+            ))
+            conn.execute(text(
+                f"ALTER TABLE {FINGERPRINT_TABLE} ADD COLUMN IF NOT EXISTS source TEXT NOT NULL DEFAULT 'database'"
+            ))
+            if self._primary_key(conn) != ['source', 'table_name']:
+                # 加锁后再检查一次，多个进程同时启动时只迁移一次
+                conn.execute(text(f"LOCK TABLE {FINGERPRINT_TABLE} IN ACCESS EXCLUSIVE MODE"))
+                if self._primary_key(conn) != ['source', 'table_name']:
+                    constraint = conn.execute(
+                        text(
+                            "SELECT conname FROM pg_constraint "
+                            "WHERE conrelid = CAST(:table AS regclass) AND contype = 'p'"
+                        ),
+                        {'table': FINGERPRINT_TABLE}
+                    ).scalar()
+                    if constraint:
+                        conn.execute(text(f'ALTER TABLE {FINGERPRINT_TABLE} DROP CONSTRAINT "{constraint}"'))
+                    conn.execute(text(f"ALTER TABLE {FINGERPRINT_TABLE} ADD PRIMARY KEY (source, table_name)"))
+                    logger.info(f"结构指纹表 {FINGERPRINT_TABLE} 的主键已迁移为 (source, table_name)")
+            conn.commit()
+
+    @staticmethod
+    def _primary_key(conn) -> List[str]:
+        """指纹表主键的列名（按列名排序）"""
+        columns = conn.execute(
+            text(
+                "SELECT array_agg(a.attname::text ORDER BY a.attname::text) FROM pg_index i "
+                "JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey) "
+                "WHERE i.indrelid = CAST(:table AS regclass) AND i.indisprimary"
+            ),
+            {'table': FINGERPRINT_TABLE}
+        ).scalar()
+        return list(columns or [])
+
+    def load_fingerprints(self, source: str = 'database',
+                          create: bool = True) -> Dict[str, Tuple[str, Optional[str]]]:
+        """
+        读取已保存的表结构指纹
+
+        Args:
+            source: 来源
+            create: 是否创建或迁移指纹表；为False时（预览）不执行DDL，指纹表不存在时返回空
+
+        Returns:
+            Dict[str, Tuple[str, Optional[str]]]: {表名: (指纹, 训练ID)}
+        """
+        if create:
+            self._ensure_table()
+        sql = f"SELECT table_name, fingerprint, training_id FROM {FINGERPRINT_TABLE} WHERE source = :source"
+        with self.db_connection.get_connection() as conn:
+            if not create:
+                has_source = conn.execute(
+                    text(
+                        "SELECT bool_or(attname = 'source') FROM pg_attribute "
+                        "WHERE attrelid = to_regclass(:table) AND attnum > 0 AND NOT attisdropped"
+                    ),
+                    {'table': FINGERPRINT_TABLE}
+                ).scalar()
+                if has_source is None:
+                    return {}
+                if not has_source:
+                    # 旧版指纹表没有source列，其中的指纹都来自数据库
+                    if source != 'database':
+                        return {}
+                    sql = f"SELECT table_name, fingerprint, training_id FROM {FINGERPRINT_TABLE}"
+            rows = conn.execute(text(sql), {'source': source})
+            return {row[0]: (row[1], row[2]) for row in rows}
+
+    def diff(self, fingerprints: Dict[str, str],
+             stored: Dict[str, Tuple[str, Optional[str]]]) -> Dict[str, List[str]]:
+        """
+        比较当前表结构指纹与已保存的指纹
+
+        Args:
+            fingerprints: 当前的 {表名: 指纹}
+            stored: 已保存的指纹
+
+        Returns:
+            Dict[str, List[str]]: added、changed、dropped和unchanged四类表名
+        """
+        result = {'added': [], 'changed': [], 'dropped': [], 'unchanged': []}
+        for table_name, fingerprint in fingerprints.items():
+            if table_name not in stored:
+                result['added'].append(table_name)
+            elif stored[table_name][0] != fingerprint:
+                result['changed'].append(table_name)
+            else:
+                result['unchanged'].append(table_name)
+        result['dropped'] = sorted(set(stored) - set(fingerprints))
+        return result
+
+    def _remove_training_data(self, table_name: str, training_id: Optional[str]):
+        """删除表对应的旧训练数据，失败时只记录警告"""
+        if not training_id:
+            return
+        try:
+            self.vanna.remove_training_data(id=training_id)
+        except Exception as e:
+            logger.warning(f"删除表 {table_name} 的旧训练数据 {training_id} 失败: {str(e)}")
+
+    def add_table_ddl(self, table_name: str, ddl: str) -> str:
+        """
+        添加单张表的DDL训练数据，并在向量元数据中记录表名
+
+        Args:
+            table_name: 表名
+            ddl: 该表的DDL
+
+        Returns:
+            str: 训练ID
+        """
+        training_id = self.vanna.add_ddl(ddl)
+        with self.db_connection.get_connection() as conn:
+            conn.execute(
+                text(
+                    f"UPDATE {EMBEDDING_TABLE} "
+                    "SET cmetadata = COALESCE(cmetadata, '{}'::jsonb) || jsonb_build_object('table_name', CAST(:table_name AS text)) "
+                    "WHERE id = :training_id"
+                ),
+                {'table_name': table_name, 'training_id': training_id}
+            )
+            conn.commit()
+        return training_id
+
+    def sync(self, force: bool = False, dry_run: bool = False) -> Dict[str, List[str]]:
+        """
+        将从数据库提取的结构同步到Vanna
+
+        Args:
+            force: 是否忽略指纹，重新训练全部表
+            dry_run: 只计算差异，不修改训练数据
+
+        Returns:
+            Dict[str, List[str]]: added、changed、dropped和unchanged四类表名
+        """
+        tables = self.extractor.extract_tables()
+        documents = {
+            table_name: (fingerprint_table(table), SchemaExtractor.table_to_ddl(table))
+            for table_name, table in tables.items()
+        }
+        # 只比较提取范围内的schema，按schema过滤的同步不会把其他schema的表当作已删除
+        return self.sync_documents(
+            documents, source='database', force=force, dry_run=dry_run,
+            in_scope=lambda table_name: self.extractor.covers_schema(table_name.split('.', 1)[0])
+        )
+
+    def sync_ddl(self, ddl: str, source: str, force: bool = False,
+                 dry_run: bool = False) -> Dict[str, List[str]]:
+        """
+        将DDL脚本按表拆分后同步到Vanna
+
+        Args:
+            ddl: 包含多张表的DDL脚本
+            source: 来源（如DDL文件路径），用于区分不同脚本的指纹
+            force: 是否忽略指纹，重新训练全部表
+            dry_run: 只计算差异，不修改训练数据
+
+        Returns:
+            Dict[str, List[str]]: added、changed、dropped和unchanged四类表名
+        """
+        documents = {
+            table_name: (fingerprint_ddl(table_ddl), table_ddl)
+            for table_name, table_ddl in split_ddl(ddl).items()
+        }
+        return self.sync_documents(documents, source=source, force=force, dry_run=dry_run)
+
+    def sync_documents(self, documents: Dict[str, Tuple[str, str]], source: str,
+                       force: bool = False, dry_run: bool = False,
+                       in_scope: Optional[Callable[[str], bool]] = None) -> Dict[str, List[str]]:
+        """
+        按指纹差异同步每张表的DDL训练数据
+
+        Args:
+            documents: {表名: (指纹, DDL)}
+            source: 来源
+            force: 是否忽略指纹，重新训练全部表
+            dry_run: 只计算差异，不修改训练数据（也不创建指纹表）
+            in_scope: 可选，判断已保存的表是否在本次同步范围内，范围外的表不参与比较（不会被删除）
+
+        Returns:
+            Dict[str, List[str]]: added、changed、dropped和unchanged四类表名
+        """
+        stored = self.load_fingerprints(source, create=not dry_run)
+        if in_scope is not None:
+            stored = {name: value for name, value in stored.items() if in_scope(name)}
+        if force:
+            # 强制模式下所有已记录的表都视为已变化
+            stored = {name: ('', training_id) for name, (_, training_id) in stored.items()}
+        changes = self.diff({name: fingerprint for name, (fingerprint, _) in documents.items()}, stored)
+
+        logger.info(
+            f"结构差异({source}): 新增 {len(changes['added'])}, 变化 {len(changes['changed'])}, "
+            f"删除 {len(changes['dropped'])}, 未变化 {len(changes['unchanged'])}"
+        )
+        if dry_run:
+            return changes
+
+        for table_name in changes['dropped']:
+            self._remove_training_data(table_name, stored[table_name][1])
+            with self.db_connection.get_connection() as conn:
+                conn.execute(
+                    text(f"DELETE FROM {FINGERPRINT_TABLE} WHERE table_name = :table_name AND source = :source"),
+                    {'table_name': table_name, 'source': source}
+                )
+                conn.commit()
+
+        for table_name in changes['changed'] + changes['added']:
+            if table_name in stored:
+                self._remove_training_data(table_name, stored[table_name][1])
+
+            fingerprint, ddl = documents[table_name]
+            training_id = self.add_table_ddl(table_name, ddl)
+            # 每张表训练完立即记录指纹，中途失败时下次同步只处理剩余的表
+            with self.db_connection.get_connection() as conn:
+                conn.execute(
+                    text(
+                        f"INSERT INTO {FINGERPRINT_TABLE} (table_name, fingerprint, training_id, source, updated_at) "
+                        "VALUES (:table_name, :fingerprint, :training_id, :source, now()) "
+                        "ON CONFLICT (source, table_name) DO UPDATE SET fingerprint = EXCLUDED.fingerprint, "
+                        "training_id = EXCLUDED.training_id, updated_at = EXCLUDED.updated_at"
+                    ),
+                    {'table_name': table_name, 'fingerprint': fingerprint,
+                     'training_id': training_id, 'source': source}
+                )
+                conn.commit()
+
+        logger.info(f"数据库结构同步完成({source})")
+        return changes
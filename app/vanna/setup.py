@@ -19,7 +19,9 @@ from vanna.pgvector import PGVector
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
-from app.config import VANNA_CONFIG, LLM_CONFIG, EMBEDDING_CONFIG
+from app.config import VANNA_CONFIG, LLM_CONFIG, EMBEDDING_CONFIG, EMBEDDING_CACHE_CONFIG, VECTOR_INDEX_CONFIG
+from app.langchain.embedding_cache import EmbeddingCache, CachedEmbedding
+from app.vanna.vector_index import VectorIndexManager
 
 logger = logging.getLogger(__name__)
 
@@ -46,6 +48,31 @@ class VannaSetup:
         
         # 确保持久化目录存在
         os.makedirs(self.config['persist_directory'], exist_ok=True)
+        
+        # 为Embedding模型加上缓存，重复文本不再请求远程API
+        if self.embedding_model is not None and EMBEDDING_CACHE_CONFIG['enabled']:
+            self.embedding_model = self._create_cached_embedding(self.embedding_model)
+    
+    def _create_cached_embedding(self, embedding_model: Embeddings) -> CachedEmbedding:
+        """
+        创建带缓存的Embedding模型
+        
+        Args:
+            embedding_model: 原始Embedding模型
+            
+        Returns:
+            CachedEmbedding: 带缓存的Embedding模型
+        """
+        db_path = None
+        if EMBEDDING_CACHE_CONFIG['persist']:
+            db_path = os.path.join(self.config['persist_directory'], EMBEDDING_CACHE_CONFIG['file_name'])
+        
+        cache = EmbeddingCache(
+            memory_size=EMBEDDING_CACHE_CONFIG['memory_size'],
+            db_path=db_path,
+            max_disk_entries=EMBEDDING_CACHE_CONFIG['max_disk_entries']
+        )
+        return CachedEmbedding(embedding_model, cache, model_name=EMBEDDING_CONFIG.get('model', ''))
     
     def initialize_vanna(self, db_connection=None):
         """
@@ -137,4 +164,15 @@ class VannaSetup:
         logger.info(f"使用本地Vanna + 混合模式 (自定义LLM + PGVector) 初始化成功")
         self.vanna_instance = vanna_instance
         
+        # 设置向量检索参数并检查索引状态（创建和重建由scripts/manage_vector_index.py执行），
+        # 失败时退回pgvector默认参数或顺序扫描，不影响使用
+        if db_connection and VECTOR_INDEX_CONFIG['enabled']:
+            try:
+                index_manager = VectorIndexManager(db_connection)
+                if vector_store is not None:
+                    index_manager.configure_vector_store(vector_store)
+                index_manager.check_indexes()
+            except Exception as e:
+                logger.warning(f"维护向量索引失败: {str(e)}")
+        
         return self.vanna_instance
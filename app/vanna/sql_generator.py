@@ -0,0 +1,159 @@
+"""
+SQL生成模块，负责检索上下文、构建提示词并调用LLM生成SQL（支持逐token流式输出）
+"""
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional, Iterator
+
+from app.utils.metrics import metrics, stage_timer, record_duration, record_error, record_usage
+from app.vanna.prompt_assembler import PromptAssembler
+
+logger = logging.getLogger(__name__)
+
+class SQLGenerator:
+    """
+    SQL生成器
+
+    与vanna.generate_sql使用相同的检索和提示词构建方式，
+    但直接调用LangChain LLM，从而可以通过ChatOpenAI.stream逐token返回结果
+    """
+
+    def __init__(self, vanna_instance, llm_model, prompt_assembler: Optional[PromptAssembler] = None):
+        """
+        初始化SQL生成器
+
+        Args:
+            vanna_instance: Vanna实例，用于检索上下文、构建提示词和提取SQL
+            llm_model: LangChain聊天模型
+            prompt_assembler: 可选，提示词组装器，提供时按相似度排序、去重并限制token预算
+        """
+        self.vanna = vanna_instance
+        self.llm_model = llm_model
+        self.prompt_assembler = prompt_assembler
+
+    def build_prompt(self, question: str) -> List[Dict[str, str]]:
+        """
+        检索相关的问题-SQL示例、DDL和文档，构建提示词
+
+        Args:
+            question: 自然语言问题
+
+        Returns:
+            List[Dict[str, str]]: 提示词消息列表（role/content格式）
+        """
+        config = getattr(self.vanna, "config", None) or {}
+        if self.prompt_assembler is not None:
+            prompt, _ = self.prompt_assembler.assemble(question, initial_prompt=config.get("initial_prompt"))
+            return prompt
+
+        # 检索耗时包含计算问题向量的时间（embedding阶段单独统计）
+        with stage_timer("retrieval"):
+            question_sql_list = self.vanna.get_similar_question_sql(question)
+            ddl_list = self.vanna.get_related_ddl(question)
+            doc_list = self.vanna.get_related_documentation(question)
+
+        with stage_timer("prompt"):
+            return self.vanna.get_sql_prompt(
+                initial_prompt=config.get("initial_prompt"),
+                question=question,
+                question_sql_list=question_sql_list,
+                ddl_list=ddl_list,
+                doc_list=doc_list
+            )
+
+    @staticmethod
+    def _record_token_usage(message):
+        """
+        记录LLM输入/输出token数（模型返回usage_metadata时）
+
+        Args:
+            message: LLM返回的消息或最后一个流式片段
+        """
+        usage = getattr(message, "usage_metadata", None)
+        if not usage:
+            return
+        record_usage("llm_input_tokens", usage.get("input_tokens", 0))
+        record_usage("llm_output_tokens", usage.get("output_tokens", 0))
+        metrics.inc("nl2sql_llm_tokens_total", usage.get("input_tokens", 0),
+                    help_text="LLM消耗的token数", direction="in")
+        metrics.inc("nl2sql_llm_tokens_total", usage.get("output_tokens", 0),
+                    help_text="LLM消耗的token数", direction="out")
+
+    def generate_sql(self, question: str) -> Optional[str]:
+        """
+        生成SQL（阻塞直到LLM返回完整结果）
+
+        Args:
+            question: 自然语言问题
+
+        Returns:
+            Optional[str]: 生成的SQL
+        """
+        prompt = self.build_prompt(question)
+        with stage_timer("llm"):
+            response = self.llm_model.invoke(prompt)
+        self._record_token_usage(response)
+        return self.extract_sql(response.content)
+
+    async def agenerate_sql(self, question: str) -> Optional[str]:
+        """
+        异步生成SQL
+
+        向量检索在线程中执行（Vanna的检索接口是同步的），LLM调用使用ainvoke，
+        等待LLM期间不占用线程
+
+        Args:
+            question: 自然语言问题
+
+        Returns:
+            Optional[str]: 生成的SQL
+        """
+        prompt = await asyncio.to_thread(self.build_prompt, question)
+        with stage_timer("llm"):
+            response = await self.llm_model.ainvoke(prompt)
+        self._record_token_usage(response)
+        return self.extract_sql(response.content)
+
+    def stream_sql(self, question: str) -> Iterator[str]:
+        """
+        流式生成SQL，逐个返回LLM输出的token
+
+        调用方拼接全部token后，使用extract_sql得到最终SQL
+
+        Args:
+            question: 自然语言问题
+
+        Yields:
+            str: LLM输出的文本片段
+        """
+        prompt = self.build_prompt(question)
+        # 只统计等待LLM返回片段的时间，不包括调用方处理token的时间
+        llm_seconds = 0.0
+        start_time = time.perf_counter()
+        try:
+            for chunk in self.llm_model.stream(prompt):
+                llm_seconds += time.perf_counter() - start_time
+                self._record_token_usage(chunk)
+                if chunk.content:
+                    yield chunk.content
+                start_time = time.perf_counter()
+        except Exception:
+            record_error("llm")
+            raise
+        finally:
+            record_duration("llm", llm_seconds)
+
+    def extract_sql(self, llm_response: str) -> Optional[str]:
+        """
+        从LLM输出中提取SQL
+
+        Args:
+            llm_response: LLM的完整输出
+
+        Returns:
+            Optional[str]: 提取出的SQL
+        """
+        if not llm_response:
+            return None
+        return self.vanna.extract_sql(llm_response)
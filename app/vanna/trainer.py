@@ -10,6 +10,7 @@ from typing import Dict, Any, List, Optional
 from app.utils.helpers import load_json_file, save_json_file
 from app.schemas.request import TrainingRequest
 from app.schemas.response import TrainingResponse
+from app.vanna.training_store import TrainingDataStore, iter_training_items, to_document
 
 logger = logging.getLogger(__name__)
 
@@ -18,16 +19,23 @@ class VannaTrainer:
     Vanna训练器，负责训练Vanna模型
     """
     
-    def __init__(self, vanna_instance, training_data_dir: str = "data/training"):
+    def __init__(self, vanna_instance, training_data_dir: str = "data/training", query_cache=None,
+                 training_store: Optional[TrainingDataStore] = None, vector_mirror=None):
         """
         初始化训练器
         
         Args:
             vanna_instance: Vanna实例
             training_data_dir: 训练数据目录
+            query_cache: 可选，问题-SQL缓存，训练数据变化时使其失效
+            training_store: 可选，批量写入器，提供时文件训练按批计算向量并批量写入
+            vector_mirror: 可选，进程内向量镜像，删除训练数据后同步
         """
         self.vanna = vanna_instance
         self.training_data_dir = training_data_dir
+        self.query_cache = query_cache
+        self.training_store = training_store
+        self.vector_mirror = vector_mirror
         
         # 确保训练数据目录存在
         os.makedirs(self.training_data_dir, exist_ok=True)
@@ -46,6 +54,9 @@ class VannaTrainer:
             os.path.join(self.training_data_dir, "complex_queries.json")
         ]
         
+        if self.training_store is not None:
+            return self.train_bulk([path for path in training_files if os.path.exists(path)])
+        
         success_count = 0
         error_count = 0
         
@@ -72,12 +83,64 @@ class VannaTrainer:
                 logger.error(f"从文件训练失败: {str(e)}")
                 error_count += 1
         
+        if success_count > 0:
+            self._invalidate_query_cache()
+        
         return TrainingResponse(
             success=(error_count == 0),
             message=f"训练完成: {success_count} 成功, {error_count} 失败",
             training_data_id=None
         )
     
+    def train_bulk(self, patterns: List[str]) -> TrainingResponse:
+        """
+        批量训练：读取任意JSON/JSONL文件（支持通配符），按批计算向量并批量写入向量表
+        
+        Args:
+            patterns: 文件路径或通配符列表
+            
+        Returns:
+            TrainingResponse: 训练响应，message中包含吞吐量
+        """
+        if self.training_store is None:
+            raise ValueError("未配置批量写入器，无法批量训练")
+        
+        error_count = 0
+        
+        def documents():
+            nonlocal error_count
+            for source, item in iter_training_items(patterns):
+                try:
+                    yield to_document(TrainingRequest(**item))
+                except Exception as e:
+                    logger.error(f"训练数据无效({source}): {str(e)}")
+                    error_count += 1
+        
+        try:
+            stats = self.training_store.add_documents(documents())
+        except Exception as e:
+            logger.error(f"批量训练失败: {str(e)}")
+            return TrainingResponse(
+                success=False,
+                message=f"批量训练失败: {str(e)}",
+                training_data_id=None
+            )
+        
+        if stats['written'] > 0:
+            self._invalidate_query_cache()
+        
+        message = (
+            f"批量训练完成: {stats['written']} 新增, {stats['skipped']} 已存在, {error_count} 失败, "
+            f"{stats['batches']} 批, 用时 {stats['seconds']:.1f} 秒, "
+            f"{stats['items_per_second']:.1f} 条/秒"
+        )
+        logger.info(message)
+        return TrainingResponse(
+            success=(error_count == 0),
+            message=message,
+            training_data_id=None
+        )
+    
     def train_single_item(self, request: TrainingRequest) -> TrainingResponse:
         """
         训练单个项目
@@ -90,6 +153,7 @@ class VannaTrainer:
         """
         try:
             training_id = self._train_single_item(request)
+            self._invalidate_query_cache()
             return TrainingResponse(
                 success=True,
                 message="训练成功",
@@ -107,12 +171,18 @@ class VannaTrainer:
         """
         训练单个项目的实现
         
+        配置了批量写入器时按内容哈希写入，相同内容重复训练时返回已有ID，不会产生重复数据
+        
         Args:
             request: 训练请求
             
         Returns:
             str: 训练数据ID
         """
+        if self.training_store is not None:
+            training_id, _ = self.training_store.add_item(*to_document(request))
+            return training_id
+        
         if request.question and request.sql:
             # 训练问题-SQL对
             return self.vanna.add_sql(question=request.question, sql=request.sql)
@@ -125,6 +195,11 @@ class VannaTrainer:
         else:
             raise ValueError("训练请求必须包含问题和SQL、DDL或文档")
     
+    def _invalidate_query_cache(self):
+        """训练数据变化后使问题-SQL缓存失效"""
+        if self.query_cache is not None:
+            self.query_cache.invalidate()
+    
     def remove_training_data(self, training_data_id: str) -> bool:
         """
         移除训练数据
@@ -137,6 +212,9 @@ class VannaTrainer:
         """
         try:
             self.vanna.remove_training_data(id=training_data_id)
+            if self.vector_mirror is not None:
+                self.vector_mirror.remove(training_data_id)
+            self._invalidate_query_cache()
             return True
         except Exception as e:
             logger.error(f"移除训练数据失败: {str(e)}")
@@ -0,0 +1,455 @@
+"""
+可断点续训的训练任务模块
+
+训练任务在后台线程中按批写入训练数据，每批提交后把每个文件已提交的偏移量写入检查点文件
+（JSON，原子替换）。任务失败或进程退出后可从检查点继续，已提交的条目不会重新读取和计算向量；
+提交前中断的批次重新处理时，已写入的内容按内容哈希跳过。
+
+检查点目录是任务状态的唯一来源，多个工作进程（及命令行脚本）共享同一目录：查询任务时读取检查点
+文件；运行任务前对<任务ID>.json.lock加独占的文件锁（fcntl.flock），运行期间一直持有，同一任务
+不会被两个进程同时运行。检查点为运行中但没有进程持有锁的任务（运行它的进程已退出）视为失败，可以续训。
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import deque
+from typing import Dict, Any, List, Iterator, Optional, Callable, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows没有fcntl，只能防止同一进程内重复运行
+    fcntl = None
+
+from app.config import TRAINING_CONFIG
+from app.schemas.request import TrainingRequest
+from app.vanna.training_store import (
+    TrainingDataStore, count_file_items, expand_patterns, iter_file_items, to_document
+)
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+STATUS_PENDING = 'pending'
+STATUS_RUNNING = 'running'
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+
+class TrainingJob:
+    """
+    训练任务及其检查点
+    """
+
+    def __init__(self, job_id: str, files: List[Dict[str, Any]], batch_size: Optional[int] = None):
+        """
+        初始化训练任务
+
+        Args:
+            job_id: 任务ID
+            files: 文件列表，每项包含path、total（条目数）和offset（已提交的条目数）
+            batch_size: 每批条数，为None时使用写入器的配置
+        """
+        self.job_id = job_id
+        self.files = files
+        self.batch_size = batch_size
+        self.status = STATUS_PENDING
+        self.written = 0
+        self.skipped = 0
+        self.failed = 0
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.progress: Dict[str, Any] = {}
+
+    @property
+    def total(self) -> int:
+        """全部条目数"""
+        return sum(item['total'] for item in self.files)
+
+    @property
+    def committed(self) -> int:
+        """已提交的条目数"""
+        return sum(item['offset'] for item in self.files)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可序列化的字典（检查点内容和接口返回值）"""
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'files': self.files,
+            'batch_size': self.batch_size,
+            'total': self.total,
+            'committed': self.committed,
+            'written': self.written,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'progress': self.progress,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TrainingJob':
+        """从检查点内容恢复任务"""
+        job = cls(data['job_id'], data['files'], data.get('batch_size'))
+        job.status = data.get('status', STATUS_PENDING)
+        job.written = data.get('written', 0)
+        job.skipped = data.get('skipped', 0)
+        job.failed = data.get('failed', 0)
+        job.error = data.get('error')
+        job.created_at = data.get('created_at', job.created_at)
+        job.started_at = data.get('started_at')
+        job.finished_at = data.get('finished_at')
+        job.progress = data.get('progress', {})
+        return job
+
+class TrainingJobManager:
+    """
+    训练任务管理器：创建、运行、续训和查询训练任务
+    """
+
+    def __init__(self, training_store: TrainingDataStore, job_dir: Optional[str] = None,
+                 query_cache=None):
+        """
+        初始化任务管理器
+
+        Args:
+            training_store: 训练数据写入器
+            job_dir: 检查点目录，为None时使用配置值
+            query_cache: 可选，问题-SQL缓存，任务写入新数据后使其失效
+        """
+        self.training_store = training_store
+        self.job_dir = job_dir or TRAINING_CONFIG['job_dir']
+        self.query_cache = query_cache
+        self._lock = threading.Lock()
+        # 当前进程正在运行的任务及其持有的锁文件
+        self._jobs: Dict[str, TrainingJob] = {}
+        self._claims: Dict[str, Any] = {}
+
+        os.makedirs(self.job_dir, exist_ok=True)
+
+    def _checkpoint_path(self, job_id: str) -> str:
+        """任务检查点文件路径"""
+        return os.path.join(self.job_dir, f"{job_id}.json")
+
+    def _acquire_claim(self, job_id: str):
+        """
+        以非阻塞方式获取任务的独占锁
+
+        Returns:
+            锁文件对象，其他进程（或当前进程）正在运行该任务时返回None
+        """
+        if job_id in self._claims:
+            return None
+        lock_file = open(f"{self._checkpoint_path(job_id)}.lock", 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return None
+        return lock_file
+
+    @staticmethod
+    def _release_claim(lock_file):
+        """释放任务的独占锁（锁文件保留，删除会与其他进程的加锁竞争）"""
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        finally:
+            lock_file.close()
+
+    def _is_claimed(self, job_id: str) -> bool:
+        """是否有进程正在运行该任务（持有独占锁）"""
+        with self._lock:
+            lock_file = self._acquire_claim(job_id)
+        if lock_file is None:
+            return True
+        self._release_claim(lock_file)
+        return False
+
+    def _read(self, job_id: str) -> Optional[TrainingJob]:
+        """
+        从检查点文件读取任务
+
+        检查点为运行中、但没有进程持有锁的任务标记为失败（只修改返回的对象，检查点在续训时更新）
+        """
+        try:
+            with open(self._checkpoint_path(job_id), 'r', encoding='utf-8') as f:
+                job = TrainingJob.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"读取训练任务 {job_id} 的检查点失败: {str(e)}")
+            return None
+        if job.status == STATUS_RUNNING and not self._is_claimed(job_id):
+            job.status = STATUS_FAILED
+            job.error = "运行任务的进程已退出，任务未完成"
+        return job
+
+    def _save(self, job: TrainingJob):
+        """写入检查点（先写临时文件再替换，避免中途退出留下损坏的文件）"""
+        path = self._checkpoint_path(job.job_id)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(job.to_dict(), f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+
+    def resolve_patterns(self, patterns: List[str], base_dir: Optional[str] = None) -> List[str]:
+        """
+        将接口传入的文件通配符限制在训练数据目录内
+
+        Args:
+            patterns: 相对于训练数据目录的文件路径或通配符
+            base_dir: 训练数据目录，为None时使用配置值
+
+        Returns:
+            List[str]: 训练数据目录下的通配符
+
+        Raises:
+            ValueError: 路径为绝对路径或超出训练数据目录
+        """
+        base_dir = os.path.abspath(base_dir or TRAINING_CONFIG['data_dir'])
+        resolved = []
+        for pattern in patterns:
+            path = os.path.abspath(os.path.join(base_dir, pattern))
+            if os.path.isabs(pattern) or os.path.commonpath([base_dir, path]) != base_dir:
+                raise ValueError(f"训练文件必须位于训练数据目录内: {pattern}")
+            resolved.append(path)
+        return resolved
+
+    def create(self, patterns: List[str], batch_size: Optional[int] = None) -> TrainingJob:
+        """
+        创建训练任务（展开通配符并统计每个文件的条目数），不启动
+
+        Args:
+            patterns: 文件路径或通配符列表
+            batch_size: 每批条数，为None时使用写入器的配置
+
+        Returns:
+            TrainingJob: 训练任务
+
+        Raises:
+            ValueError: 没有匹配的训练文件
+        """
+        paths = expand_patterns(patterns)
+        if not paths:
+            raise ValueError("没有匹配的训练文件")
+
+        files = [{'path': path, 'total': count_file_items(path), 'offset': 0} for path in paths]
+        job = TrainingJob(uuid.uuid4().hex, files, batch_size)
+        self._save(job)
+        logger.info(f"创建训练任务 {job.job_id}: {len(files)} 个文件，共 {job.total} 条")
+        return job
+
+    def get(self, job_id: str) -> Optional[TrainingJob]:
+        """
+        获取训练任务（读取检查点，可查询其他进程运行的任务）
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            Optional[TrainingJob]: 训练任务，不存在时返回None
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        if os.path.basename(job_id) != job_id or job_id.startswith('.'):
+            return None
+        return self._read(job_id)
+
+    def list_jobs(self) -> List[TrainingJob]:
+        """
+        列出检查点目录中的所有训练任务（按创建时间倒序）
+
+        Returns:
+            List[TrainingJob]: 训练任务列表
+        """
+        jobs = []
+        for name in os.listdir(self.job_dir):
+            if not name.endswith('.json'):
+                continue
+            job = self.get(name[:-len('.json')])
+            if job is not None:
+                jobs.append(job)
+        return sorted(jobs, key=lambda job: job.created_at, reverse=True)
+
+    def start(self, job_id: str) -> TrainingJob:
+        """
+        在后台线程中运行或续训任务，立即返回
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            TrainingJob: 训练任务
+
+        Raises:
+            KeyError: 任务不存在
+            ValueError: 任务正在运行（包括在其他进程中运行）或已完成
+        """
+        job = self._claim(job_id)
+        threading.Thread(
+            target=self._run_job, args=(job,), name=f"training-job-{job_id[:8]}", daemon=True
+        ).start()
+        return job
+
+    def run(self, job_id: str, on_progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> TrainingJob:
+        """
+        在当前线程中运行或续训任务（命令行使用）
+
+        Args:
+            job_id: 任务ID
+            on_progress: 可选，每批提交后回调，参数为进度信息
+
+        Returns:
+            TrainingJob: 运行结束后的训练任务
+
+        Raises:
+            KeyError: 任务不存在
+            ValueError: 任务正在运行（包括在其他进程中运行）或已完成
+        """
+        job = self._claim(job_id)
+        self._run_job(job, on_progress)
+        return job
+
+    def _claim(self, job_id: str) -> TrainingJob:
+        """
+        获取任务的独占锁，从检查点重新读取任务并将其标记为运行中
+
+        锁一直持有到_run_job结束；持有锁后读取的检查点即使为运行中，也是已退出进程留下的
+        """
+        if self.get(job_id) is None:
+            raise KeyError(f"训练任务不存在: {job_id}")
+        with self._lock:
+            lock_file = self._acquire_claim(job_id)
+            if lock_file is None:
+                raise ValueError(f"训练任务正在运行: {job_id}")
+            self._claims[job_id] = lock_file
+        try:
+            job = self._read(job_id)
+            if job is None:
+                raise KeyError(f"训练任务不存在: {job_id}")
+            if job.status == STATUS_COMPLETED:
+                raise ValueError(f"训练任务已完成: {job_id}")
+        except Exception:
+            self._release(job_id)
+            raise
+        job.status = STATUS_RUNNING
+        job.error = None
+        with self._lock:
+            self._jobs[job_id] = job
+        return job
+
+    def _release(self, job_id: str):
+        """任务运行结束，释放独占锁"""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            lock_file = self._claims.pop(job_id, None)
+        if lock_file is not None:
+            self._release_claim(lock_file)
+
+    def _iter_documents(self, job: TrainingJob, positions: deque,
+                        invalid: List[int]) -> Iterator[Tuple[str, str]]:
+        """
+        从检查点偏移量开始读取文档
+
+        每产出一个文档，在positions中记录(文件序号, 该条目之后的偏移量, 之前的无效条目数)，
+        提交后据此推进检查点；invalid[0]为尚未计入检查点的无效条目数
+        """
+        for file_index, item in enumerate(job.files):
+            if item['offset'] >= item['total']:
+                continue
+            for index, source, raw in iter_file_items(item['path'], item['offset']):
+                try:
+                    document = to_document(TrainingRequest(**raw))
+                except Exception as e:
+                    logger.error(f"训练数据无效({source}): {str(e)}")
+                    invalid[0] += 1
+                    continue
+                positions.append((file_index, index + 1, invalid[0]))
+                invalid[0] = 0
+                yield document
+
+    def _run_job(self, job: TrainingJob, on_progress: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """运行任务直到完成或失败，每批提交后更新检查点，结束后释放独占锁"""
+        try:
+            self._run_claimed(job, on_progress)
+        finally:
+            self._release(job.job_id)
+
+    def _run_claimed(self, job: TrainingJob, on_progress: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """运行已获取独占锁的任务"""
+        run_start = time.time()
+        run_committed_start = job.committed
+        job.started_at = job.started_at or run_start
+        self._save(job)
+        logger.info(f"训练任务 {job.job_id} 开始，从第 {job.committed}/{job.total} 条继续")
+
+        positions: deque = deque()
+        invalid = [0]
+        last = {'committed': 0, 'written': 0, 'skipped': 0}
+
+        def on_commit(stats: Dict[str, int]):
+            # 推进已提交条目所在文件的偏移量
+            for _ in range(stats['committed'] - last['committed']):
+                file_index, offset, invalid_before = positions.popleft()
+                job.files[file_index]['offset'] = offset
+                job.failed += invalid_before
+            job.written += stats['written'] - last['written']
+            job.skipped += stats['skipped'] - last['skipped']
+            last.update(stats)
+
+            elapsed = time.time() - run_start
+            rate = (job.committed - run_committed_start) / elapsed if elapsed > 0 else 0.0
+            remaining = job.total - job.committed
+            job.progress = {
+                'committed': job.committed,
+                'total': job.total,
+                'percent': round(100.0 * job.committed / job.total, 1) if job.total else 100.0,
+                'items_per_second': round(rate, 1),
+                'eta_seconds': round(remaining / rate, 1) if rate > 0 else None,
+                'elapsed_seconds': round(elapsed, 1),
+            }
+            self._save(job)
+            logger.info(
+                f"训练任务 {job.job_id}: {job.committed}/{job.total} ({job.progress['percent']}%), "
+                f"{job.progress['items_per_second']} 条/秒, 预计剩余 {job.progress['eta_seconds']} 秒"
+            )
+            if on_progress is not None:
+                on_progress(job.progress)
+
+        store = self.training_store
+        if job.batch_size and job.batch_size != store.batch_size:
+            store = TrainingDataStore(store.db_connection, store.embedding_model, batch_size=job.batch_size,
+                                      vector_mirror=store.vector_mirror)
+
+        try:
+            store.add_documents(self._iter_documents(job, positions, invalid), on_commit=on_commit)
+            # 所有文档已提交，文件末尾的无效条目也计入检查点
+            for item in job.files:
+                item['offset'] = item['total']
+            job.failed += invalid[0]
+            job.progress.update({'committed': job.total, 'percent': 100.0, 'eta_seconds': 0})
+            job.status = STATUS_COMPLETED
+        except Exception as e:
+            logger.error(f"训练任务 {job.job_id} 失败，可从第 {job.committed} 条续训: {str(e)}")
+            job.status = STATUS_FAILED
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            self._save(job)
+
+        if job.written > 0 and self.query_cache is not None:
+            self.query_cache.invalidate()
+        logger.info(
+            f"训练任务 {job.job_id} {job.status}: {job.written} 新增, {job.skipped} 已存在, "
+            f"{job.failed} 无效, 用时 {job.finished_at - run_start:.1f} 秒"
+        )
@@ -0,0 +1,488 @@
+"""
+批量训练数据写入模块
+
+训练数据按批计算向量（一次embed_documents调用），每批用多行INSERT在一个事务中直接写入
+PGVector向量表，并在写入当前批次的同时计算下一批的向量。文档内容、集合和ID格式（uuid加
+-sql/-ddl/-doc后缀）与Vanna的add_sql/add_ddl/add_documentation一致，写入的数据可被Vanna正常检索，
+也可按ID用remove_training_data删除。
+
+每条训练数据以规范化内容的哈希（content_hash，记录在cmetadata中）为键，ID由哈希确定，
+重复训练相同内容时不会再次计算向量，也不会写入重复的行。Vanna的PGVector存储为每条数据
+生成随机ID（uuid4），因此经vanna.add_*写入的行（如SchemaSynchronizer.add_table_ddl）与这里
+写入的相同内容ID不同，两者之间按content_hash去重（deduplicate为没有哈希的行补充哈希）。
+"""
+import re
+import glob
+import json
+import time
+import uuid
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Iterator, Optional, Tuple, Callable
+
+from psycopg2.extras import execute_values
+from sqlalchemy import text
+
+from app.config import VECTOR_STORAGE_CONFIG, TRAINING_CONFIG
+from app.schemas.request import TrainingRequest
+
+logger = logging.getLogger(__name__)
+
+# 训练数据类型对应的ID后缀，与Vanna保持一致
+_ID_SUFFIXES = {'sql': 'sql', 'ddl': 'ddl', 'documentation': 'doc'}
+
+# 由内容哈希生成训练ID时使用的命名空间
+_ID_NAMESPACE = uuid.UUID('6f1c2a3e-5b7d-4e8f-9a0b-1c2d3e4f5a6b')
+
+def _normalize_text(value: str) -> str:
+    """合并连续空白并去掉首尾空白"""
+    return re.sub(r'\s+', ' ', value or '').strip()
+
+def content_hash(training_type: str, content: str) -> str:
+    """
+    计算训练数据的规范化内容哈希
+
+    问题-SQL对的问题忽略大小写，SQL忽略结尾分号；所有内容都忽略空白差异
+
+    Args:
+        training_type: sql、ddl或documentation
+        content: 文档内容（sql类型为{"question", "sql"}的JSON）
+
+    Returns:
+        str: 十六进制sha256
+    """
+    if training_type == 'sql':
+        try:
+            item = json.loads(content)
+            normalized = (
+                _normalize_text(item.get('question', '')).casefold() + '\n' +
+                _normalize_text(item.get('sql', '')).rstrip(';').rstrip()
+            )
+        except (ValueError, AttributeError):
+            normalized = _normalize_text(content)
+    else:
+        normalized = _normalize_text(content)
+    return hashlib.sha256(f"{training_type}:{normalized}".encode('utf-8')).hexdigest()
+
+def training_id_for(training_type: str, digest: str) -> str:
+    """
+    由内容哈希生成确定的训练ID
+
+    格式与Vanna一致（uuid加类型后缀），但取值不同：Vanna的PGVector存储使用随机的uuid4，
+    这里使用私有命名空间下的uuid5，相同内容始终得到相同的ID
+
+    Args:
+        training_type: sql、ddl或documentation
+        digest: content_hash返回的哈希
+
+    Returns:
+        str: 训练ID
+    """
+    return f"{uuid.uuid5(_ID_NAMESPACE, digest)}-{_ID_SUFFIXES[training_type]}"
+
+def iter_file_items(path: str, start: int = 0) -> Iterator[Tuple[int, str, Any]]:
+    """
+    读取单个训练数据文件（JSON数组或JSONL），可从指定序号继续
+
+    Args:
+        path: 文件路径
+        start: 跳过前start个条目（断点续训时为已提交的偏移量）
+
+    Yields:
+        Tuple[int, str, Any]: 条目序号（从0开始）、数据来源（文件名:行号或序号）和原始条目
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            index = 0
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                if index >= start:
+                    yield index, f"{path}:{line_number}", json.loads(line)
+                index += 1
+        else:
+            data = json.load(f)
+            items = data if isinstance(data, list) else [data]
+            for index in range(start, len(items)):
+                yield index, f"{path}:{index}", items[index]
+
+def count_file_items(path: str) -> int:
+    """
+    统计训练数据文件中的条目数（JSONL只统计非空行，不解析内容）
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        int: 条目数
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            return sum(1 for line in f if line.strip())
+        data = json.load(f)
+        return len(data) if isinstance(data, list) else 1
+
+def expand_patterns(patterns: List[str]) -> List[str]:
+    """
+    展开文件通配符，保持参数顺序并去掉重复文件
+
+    Args:
+        patterns: 文件路径或通配符列表
+
+    Returns:
+        List[str]: 文件路径列表
+    """
+    paths = []
+    for pattern in patterns:
+        matched = sorted(glob.glob(pattern, recursive=True))
+        if not matched:
+            logger.warning(f"没有匹配的训练文件: {pattern}")
+        paths.extend(path for path in matched if path not in paths)
+    return paths
+
+def iter_training_items(patterns: List[str]) -> Iterator[Tuple[str, Any]]:
+    """
+    读取训练数据文件，支持通配符、JSON（数组）和JSONL（每行一个对象）
+
+    Args:
+        patterns: 文件路径或通配符列表
+
+    Yields:
+        Tuple[str, Any]: 数据来源（文件名:序号）和原始条目
+    """
+    for path in expand_patterns(patterns):
+        for _, source, item in iter_file_items(path):
+            yield source, item
+
+def to_document(request: TrainingRequest) -> Tuple[str, str]:
+    """
+    将训练请求转换为向量文档
+
+    Args:
+        request: 训练请求
+
+    Returns:
+        Tuple[str, str]: 训练数据类型（sql、ddl或documentation）和文档内容
+    """
+    if request.question and request.sql:
+        return 'sql', json.dumps({"question": request.question, "sql": request.sql}, ensure_ascii=False)
+    if request.ddl:
+        return 'ddl', request.ddl
+    if request.documentation:
+        return 'documentation', request.documentation
+    raise ValueError("训练请求必须包含问题和SQL、DDL或文档")
+
+class TrainingDataStore:
+    """
+    训练数据批量写入器
+    """
+
+    def __init__(self, db_connection, embedding_model, batch_size: Optional[int] = None,
+                 vector_mirror=None):
+        """
+        初始化批量写入器
+
+        Args:
+            db_connection: 数据库连接实例（向量表所在的数据库）
+            embedding_model: Embedding模型，需支持embed_documents
+            batch_size: 每批条数，为None时使用配置值
+            vector_mirror: 可选，进程内向量镜像，写入后同步
+        """
+        self.db_connection = db_connection
+        self.embedding_model = embedding_model
+        self.batch_size = batch_size or TRAINING_CONFIG['batch_size']
+        self.vector_mirror = vector_mirror
+        self.embedding_table = f"{VECTOR_STORAGE_CONFIG['schema']}.{VECTOR_STORAGE_CONFIG['embedding_table']}"
+        self.collection_table = f"{VECTOR_STORAGE_CONFIG['schema']}.{VECTOR_STORAGE_CONFIG['collection_table']}"
+        self._collection_ids: Dict[str, str] = {}
+        self._hash_index_ready = False
+
+    def _ensure_hash_index(self):
+        """为cmetadata中的content_hash创建表达式索引（不存在时），用于快速查找已有内容"""
+        if self._hash_index_ready:
+            return
+        index_name = f"{VECTOR_STORAGE_CONFIG['table_prefix']}embedding_content_hash_idx"
+        with self.db_connection.get_connection() as conn:
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {index_name} "
+                f"ON {self.embedding_table} ((cmetadata->>'content_hash'))"
+            ))
+            conn.commit()
+        self._hash_index_ready = True
+
+    def find_existing(self, hashes: List[str]) -> Dict[str, str]:
+        """
+        查找已存在的内容
+
+        Args:
+            hashes: 内容哈希列表
+
+        Returns:
+            Dict[str, str]: {内容哈希: 已有的训练ID}
+        """
+        if not hashes:
+            return {}
+        self._ensure_hash_index()
+        with self.db_connection.get_connection() as conn:
+            rows = conn.execute(
+                text(
+                    f"SELECT cmetadata->>'content_hash', id FROM {self.embedding_table} "
+                    "WHERE cmetadata->>'content_hash' = ANY(:hashes)"
+                ),
+                {'hashes': list(hashes)}
+            )
+            return {row[0]: row[1] for row in rows}
+
+    def get_collection_id(self, training_type: str) -> str:
+        """
+        获取训练数据类型对应的集合ID
+
+        Args:
+            training_type: sql、ddl或documentation
+
+        Returns:
+            str: 集合ID（uuid）
+
+        Raises:
+            ValueError: 集合不存在（Vanna尚未初始化向量存储）
+        """
+        if training_type not in self._collection_ids:
+            collection_name = VECTOR_STORAGE_CONFIG['collections'][training_type]
+            with self.db_connection.get_connection() as conn:
+                row = conn.execute(
+                    text(f"SELECT uuid FROM {self.collection_table} WHERE name = :name"),
+                    {'name': collection_name}
+                ).fetchone()
+            if row is None:
+                raise ValueError(f"向量集合不存在: {collection_name}，请先初始化Vanna向量存储")
+            self._collection_ids[training_type] = str(row[0])
+        return self._collection_ids[training_type]
+
+    def _insert(self, rows: List[Tuple[str, str, str, str, str]]):
+        """
+        在一个事务中用多行INSERT写入一批向量，ID已存在的行被忽略
+
+        Args:
+            rows: (id, collection_id, 向量文本, 文档, 元数据JSON)列表
+        """
+        with self.db_connection.get_connection() as conn:
+            with conn.connection.cursor() as cursor:
+                execute_values(
+                    cursor,
+                    f"INSERT INTO {self.embedding_table} (id, collection_id, embedding, document, cmetadata) "
+                    "VALUES %s ON CONFLICT (id) DO NOTHING",
+                    rows,
+                    template="(%s, %s::uuid, %s::vector, %s, %s::jsonb)",
+                    page_size=len(rows)
+                )
+            conn.commit()
+
+    def _prepare(self, documents: List[Tuple[str, str]]) -> Tuple[List[Tuple[str, str, str, str]], int]:
+        """
+        计算内容哈希，去掉批内重复和已存在的内容
+
+        Args:
+            documents: (训练数据类型, 文档内容)列表
+
+        Returns:
+            Tuple[List, int]: 需要写入的(训练数据类型, 文档内容, 内容哈希, 训练ID)列表和跳过的条数
+        """
+        unique = {}
+        for training_type, content in documents:
+            digest = content_hash(training_type, content)
+            unique.setdefault(digest, (training_type, content))
+
+        existing = self.find_existing(list(unique))
+        pending = [
+            (training_type, content, digest, training_id_for(training_type, digest))
+            for digest, (training_type, content) in unique.items()
+            if digest not in existing
+        ]
+        return pending, len(documents) - len(pending)
+
+    def _embed(self, pending: List[Tuple[str, str, str, str]]) -> List[List[float]]:
+        """计算一批文档的向量（一次embed_documents调用）"""
+        if not pending:
+            return []
+        return self.embedding_model.embed_documents([content for _, content, _, _ in pending])
+
+    def _write(self, pending: List[Tuple[str, str, str, str]], embeddings: List[List[float]]) -> List[str]:
+        """写入一批已计算向量的文档"""
+        rows = [
+            (
+                training_id,
+                self.get_collection_id(training_type),
+                '[' + ','.join(repr(float(value)) for value in embedding) + ']',
+                content,
+                json.dumps({'id': training_id, 'content_hash': digest}),
+            )
+            for (training_type, content, digest, training_id), embedding in zip(pending, embeddings)
+        ]
+        if rows:
+            self._insert(rows)
+            if self.vector_mirror is not None:
+                by_type: Dict[str, List[Tuple[str, str, List[float]]]] = {}
+                for (training_type, content, _, training_id), embedding in zip(pending, embeddings):
+                    by_type.setdefault(training_type, []).append((training_id, content, embedding))
+                for training_type, items in by_type.items():
+                    self.vector_mirror.add(training_type, items)
+        return [row[0] for row in rows]
+
+    def add_item(self, training_type: str, content: str) -> Tuple[str, bool]:
+        """
+        写入单条训练数据，内容已存在时直接返回已有ID，不计算向量
+
+        Args:
+            training_type: sql、ddl或documentation
+            content: 文档内容
+
+        Returns:
+            Tuple[str, bool]: 训练ID和是否新写入
+        """
+        digest = content_hash(training_type, content)
+        existing = self.find_existing([digest])
+        if digest in existing:
+            return existing[digest], False
+
+        pending = [(training_type, content, digest, training_id_for(training_type, digest))]
+        return self._write(pending, self._embed(pending))[0], True
+
+    def add_documents(self, documents: Iterator[Tuple[str, str]],
+                      on_commit: Optional[Callable[[Dict[str, int]], None]] = None) -> Dict[str, Any]:
+        """
+        分批写入文档，写入当前批次的同时计算下一批的向量；已存在的内容跳过
+
+        Args:
+            documents: (训练数据类型, 文档内容)迭代器
+            on_commit: 可选，每批写入提交后在调用线程中回调，参数为累计统计
+                （committed为已提交的输入条数，包含跳过的条目；written、skipped）
+
+        Returns:
+            Dict[str, Any]: 统计信息（written、skipped、batches、seconds、items_per_second）
+        """
+        start_time = time.time()
+        written = 0
+        skipped = 0
+        processed = 0
+        committed = 0
+        batches = 0
+        pending_write = None
+
+        def wait_for_write():
+            # 等待上一批写入完成，输入条目按顺序提交
+            nonlocal written, skipped, committed
+            future, batch_count, batch_skipped = pending_write
+            written += len(future.result())
+            skipped += batch_skipped
+            committed += batch_count
+            if on_commit is not None:
+                on_commit({'committed': committed, 'written': written, 'skipped': skipped})
+
+        def flush(batch):
+            nonlocal processed, batches, pending_write
+            pending, batch_skipped = self._prepare(batch)
+            embeddings = self._embed(pending)
+            if pending_write is not None:
+                wait_for_write()
+            pending_write = (writer.submit(self._write, pending, embeddings), len(batch), batch_skipped)
+            processed += len(batch)
+            batches += 1
+
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="training-writer") as writer:
+            batch = []
+            for document in documents:
+                batch.append(document)
+                if len(batch) >= self.batch_size:
+                    flush(batch)
+                    logger.info(f"已提交 {batches} 批，累计写入 {written} 条，跳过已存在 {skipped} 条")
+                    batch = []
+            if batch:
+                flush(batch)
+            if pending_write is not None:
+                wait_for_write()
+
+        seconds = time.time() - start_time
+        return {
+            'written': written,
+            'skipped': skipped,
+            'batches': batches,
+            'seconds': seconds,
+            'items_per_second': processed / seconds if seconds > 0 else 0.0,
+        }
+
+    def deduplicate(self, dry_run: bool = False) -> Dict[str, int]:
+        """
+        清理已有集合中的重复训练数据，并为缺少content_hash的行补充哈希
+
+        每组相同内容保留一行（优先保留ID由哈希确定的行），其余删除
+
+        Args:
+            dry_run: 只统计，不修改数据
+
+        Returns:
+            Dict[str, int]: 统计信息（scanned、duplicates、backfilled）
+        """
+        stats = {'scanned': 0, 'duplicates': 0, 'backfilled': 0}
+
+        for training_type, collection_name in VECTOR_STORAGE_CONFIG['collections'].items():
+            try:
+                collection_id = self.get_collection_id(training_type)
+            except ValueError:
+                logger.info(f"向量集合 {collection_name} 不存在，跳过")
+                continue
+
+            with self.db_connection.get_connection() as conn:
+                rows = conn.execute(
+                    text(
+                        f"SELECT id, document, cmetadata->>'content_hash' FROM {self.embedding_table} "
+                        "WHERE collection_id = CAST(:collection_id AS uuid) ORDER BY id"
+                    ),
+                    {'collection_id': collection_id}
+                ).fetchall()
+
+            groups: Dict[str, List[Tuple[str, Optional[str]]]] = {}
+            for training_id, document, stored_hash in rows:
+                groups.setdefault(content_hash(training_type, document), []).append((training_id, stored_hash))
+            stats['scanned'] += len(rows)
+
+            duplicate_ids = []
+            backfill = []
+            for digest, members in groups.items():
+                preferred_id = training_id_for(training_type, digest)
+                members.sort(key=lambda member: member[0] != preferred_id)
+                keep_id, keep_hash = members[0]
+                duplicate_ids.extend(training_id for training_id, _ in members[1:])
+                if keep_hash != digest:
+                    backfill.append({'id': keep_id, 'content_hash': digest})
+
+            logger.info(
+                f"集合 {collection_name}: {len(rows)} 行，{len(groups)} 条不同内容，"
+                f"重复 {len(duplicate_ids)} 行，需补充哈希 {len(backfill)} 行"
+            )
+            stats['duplicates'] += len(duplicate_ids)
+            stats['backfilled'] += len(backfill)
+            if dry_run:
+                continue
+
+            with self.db_connection.get_connection() as conn:
+                if duplicate_ids:
+                    conn.execute(
+                        text(f"DELETE FROM {self.embedding_table} WHERE id = ANY(:ids)"),
+                        {'ids': duplicate_ids}
+                    )
+                if backfill:
+                    conn.execute(
+                        text(
+                            f"UPDATE {self.embedding_table} "
+                            "SET cmetadata = COALESCE(cmetadata, '{}'::jsonb) || "
+                            "jsonb_build_object('content_hash', CAST(:content_hash AS text)) "
+                            "WHERE id = :id"
+                        ),
+                        backfill
+                    )
+                conn.commit()
+
+        if not dry_run:
+            self._ensure_hash_index()
+        return stats
@@ -0,0 +1,483 @@
+"""
+向量索引管理模块
+
+为Vanna的sql、ddl、documentation集合分别创建pgvector近似最近邻索引（HNSW或IVFFlat，
+按collection_id建部分索引），使检索延迟不随训练数据增长而线性增加；并提供召回率-延迟基准测试，
+用于选择ef_search/probes参数。
+
+pgvector的索引要求向量列有固定维度，LangChain创建的embedding列没有维度时，
+在所有向量维度一致的前提下将其改为vector(维度)。
+
+初始化Vanna时只检查索引状态并记录日志；创建、改列类型和按参数重建索引由scripts/manage_vector_index.py
+执行，重建时先以临时名称并发创建新索引，再在一个事务中删除旧索引并改名，检索始终有可用的索引。
+维护索引的进程持有PostgreSQL会话级咨询锁，同一时间只有一个进程维护索引。
+
+检索参数（ef_search/probes）通过Vanna向量存储引擎的connect事件按连接设置，不修改数据库角色的配置。
+"""
+import json
+import math
+import time
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+from app.config import VECTOR_STORAGE_CONFIG, VECTOR_INDEX_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 距离类型对应的运算符和索引操作符类，需与检索时使用的距离一致（LangChain默认为余弦距离）
+_DISTANCE_OPS = {
+    'cosine': ('<=>', 'vector_cosine_ops'),
+    'l2': ('<->', 'vector_l2_ops'),
+    'ip': ('<#>', 'vector_ip_ops'),
+}
+
+# 维护索引时持有的咨询锁名（按hashtext转为锁的键）
+_ADVISORY_LOCK_NAME = 'nl2sql_vector_index'
+
+# 重建时新索引的临时名称后缀
+_BUILD_SUFFIX = '_new'
+
+# 索引方法对应的查询参数
+_SEARCH_SETTINGS = {
+    'hnsw': 'hnsw.ef_search',
+    'ivfflat': 'ivfflat.probes',
+}
+
+def auto_lists(rows: int) -> int:
+    """
+    按行数计算IVFFlat的lists（pgvector建议：100万行以内为行数/1000，以上为行数的平方根）
+
+    Args:
+        rows: 集合行数
+
+    Returns:
+        int: lists
+    """
+    if rows <= 1000000:
+        return max(1, rows // 1000)
+    return int(math.sqrt(rows))
+
+def _percentile(values: List[float], percent: float) -> float:
+    """计算已排序列表的百分位数"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * percent))]
+
+class VectorIndexManager:
+    """
+    pgvector近似最近邻索引管理器
+    """
+
+    def __init__(self, db_connection, config: Optional[Dict[str, Any]] = None):
+        """
+        初始化索引管理器
+
+        Args:
+            db_connection: 数据库连接实例（向量表所在的数据库）
+            config: 索引配置，为None时使用VECTOR_INDEX_CONFIG
+
+        Raises:
+            ValueError: 索引方法或距离类型不支持
+        """
+        self.db_connection = db_connection
+        self.config = config or VECTOR_INDEX_CONFIG
+        if self.config['method'] not in _SEARCH_SETTINGS:
+            raise ValueError(f"不支持的向量索引方法: {self.config['method']}")
+        if self.config['distance'] not in _DISTANCE_OPS:
+            raise ValueError(f"不支持的向量距离类型: {self.config['distance']}")
+        self.schema = VECTOR_STORAGE_CONFIG['schema']
+        self.embedding_table = f"{self.schema}.{VECTOR_STORAGE_CONFIG['embedding_table']}"
+        self.collection_table = f"{self.schema}.{VECTOR_STORAGE_CONFIG['collection_table']}"
+
+    def index_name(self, training_type: str) -> str:
+        """
+        集合对应的索引名（不含schema，与索引方法无关，切换方法时替换原索引）
+
+        Args:
+            training_type: sql、ddl或documentation
+
+        Returns:
+            str: 索引名
+        """
+        return f"{VECTOR_STORAGE_CONFIG['table_prefix']}{training_type}_embedding_idx"
+
+    def _collections(self, conn) -> Dict[str, Tuple[str, int]]:
+        """返回已存在的集合 {训练数据类型: (集合ID, 行数)}"""
+        names = VECTOR_STORAGE_CONFIG['collections']
+        rows = conn.execute(
+            text(
+                f"SELECT c.name, CAST(c.uuid AS text), "
+                f"(SELECT count(*) FROM {self.embedding_table} e WHERE e.collection_id = c.uuid) "
+                f"FROM {self.collection_table} c WHERE c.name = ANY(:names)"
+            ),
+            {'names': list(names.values())}
+        ).fetchall()
+        by_name = {row[0]: (row[1], row[2]) for row in rows}
+        return {
+            training_type: by_name[name]
+            for training_type, name in names.items() if name in by_name
+        }
+
+    def _lock(self, conn, wait: bool) -> bool:
+        """
+        获取维护索引的咨询锁（会话级，需在同一连接上调用_unlock释放）
+
+        Args:
+            conn: 自动提交的连接
+            wait: 是否等待其他进程释放锁
+
+        Returns:
+            bool: 是否获取到锁
+        """
+        function = 'pg_advisory_lock' if wait else 'pg_try_advisory_lock'
+        acquired = conn.execute(
+            text(f"SELECT {function}(hashtext(:name))"), {'name': _ADVISORY_LOCK_NAME}
+        ).scalar()
+        return acquired is not False
+
+    @staticmethod
+    def _unlock(conn):
+        """释放维护索引的咨询锁"""
+        conn.execute(text("SELECT pg_advisory_unlock(hashtext(:name))"), {'name': _ADVISORY_LOCK_NAME})
+
+    def _column_dimension(self, conn) -> Optional[int]:
+        """embedding列的固定维度，列没有维度时返回None"""
+        typmod = conn.execute(
+            text(
+                "SELECT atttypmod FROM pg_attribute "
+                "WHERE attrelid = CAST(:table AS regclass) AND attname = 'embedding'"
+            ),
+            {'table': self.embedding_table}
+        ).scalar()
+        return typmod if typmod and typmod > 0 else None
+
+    def _ensure_dimension(self, conn) -> Optional[int]:
+        """
+        确保embedding列有固定维度（改列类型会重写整张表，只在维护脚本中执行）
+
+        Returns:
+            Optional[int]: 向量维度，表中没有数据且列没有维度时返回None
+
+        Raises:
+            ValueError: 表中存在不同维度的向量（更换过Embedding模型）
+        """
+        dimension = self._column_dimension(conn)
+        if dimension is not None:
+            return dimension
+
+        dimensions = [
+            row[0] for row in conn.execute(
+                text(f"SELECT DISTINCT vector_dims(embedding) FROM {self.embedding_table} LIMIT 2")
+            )
+        ]
+        if not dimensions:
+            return None
+        if len(dimensions) > 1:
+            raise ValueError(
+                f"{self.embedding_table} 中存在不同维度的向量，无法创建索引，请先清理旧Embedding模型的训练数据"
+            )
+
+        logger.info(f"将 {self.embedding_table}.embedding 改为 vector({dimensions[0]})")
+        conn.execute(text(
+            f"ALTER TABLE {self.embedding_table} ALTER COLUMN embedding TYPE vector({int(dimensions[0])})"
+        ))
+        return dimensions[0]
+
+    def _desired_params(self, rows: int) -> Dict[str, Any]:
+        """按配置和集合行数计算期望的索引参数"""
+        params = {'method': self.config['method'], 'distance': self.config['distance']}
+        if self.config['method'] == 'hnsw':
+            params.update(m=self.config['m'], ef_construction=self.config['ef_construction'])
+        else:
+            params['lists'] = self.config['lists'] or auto_lists(rows)
+        return params
+
+    def _needs_rebuild(self, current: Optional[Dict[str, Any]], desired: Dict[str, Any]) -> bool:
+        """判断已有索引是否需要重建"""
+        if current is None:
+            return True
+        if desired['method'] == 'ivfflat' and not self.config['lists'] and current.get('method') == 'ivfflat':
+            # 自动计算的lists随数据增长变化，相差两倍以上才重建
+            lists = current.get('lists') or 0
+            others_match = all(current.get(key) == value for key, value in desired.items() if key != 'lists')
+            return not others_match or not (lists / 2 <= desired['lists'] <= lists * 2)
+        return current != desired
+
+    def _current_params(self, conn, training_type: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        读取已有索引及其参数（创建时写在索引注释中）
+
+        并发创建中断留下的无效索引视为不存在，创建时先删除
+        """
+        row = conn.execute(
+            text(
+                "SELECT i.indisvalid, obj_description(i.indexrelid, 'pg_class') "
+                "FROM pg_index i WHERE i.indexrelid = to_regclass(:name)"
+            ),
+            {'name': f"{self.schema}.{self.index_name(training_type)}"}
+        ).fetchone()
+        if row is None or not row[0]:
+            return False, None
+        try:
+            return True, json.loads(row[1]) if row[1] else None
+        except ValueError:
+            return True, None
+
+    def _create_index(self, conn, training_type: str, collection_id: str, params: Dict[str, Any],
+                      replace: bool = False):
+        """
+        创建集合的部分索引（CONCURRENTLY，不阻塞写入，调用方持有咨询锁）
+
+        Args:
+            conn: 自动提交的连接
+            training_type: sql、ddl或documentation
+            collection_id: 集合ID
+            params: 索引参数
+            replace: 是否替换已有的有效索引：先以临时名称创建新索引，再在一个事务中删除旧索引并改名
+        """
+        index_name = self.index_name(training_type)
+        build_name = f"{index_name}{_BUILD_SUFFIX}" if replace else index_name
+        _, ops = _DISTANCE_OPS[params['distance']]
+        if params['method'] == 'hnsw':
+            options = f"m = {int(params['m'])}, ef_construction = {int(params['ef_construction'])}"
+        else:
+            options = f"lists = {int(params['lists'])}"
+        comment = json.dumps(params, sort_keys=True)
+
+        start_time = time.time()
+        # 同名的只可能是之前中断的创建留下的无效索引（持有咨询锁，没有其他进程在创建）
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {self.schema}.{build_name}"))
+        conn.execute(
+            text(
+                f"CREATE INDEX CONCURRENTLY {build_name} ON {self.embedding_table} "
+                f"USING {params['method']} (embedding {ops}) WITH ({options}) "
+                "WHERE collection_id = CAST(:collection_id AS uuid)"
+            ),
+            {'collection_id': collection_id}
+        )
+        if replace:
+            with self.db_connection.get_connection() as swap_conn:
+                swap_conn.execute(text(f"DROP INDEX {self.schema}.{index_name}"))
+                swap_conn.execute(text(f"ALTER INDEX {self.schema}.{build_name} RENAME TO {index_name}"))
+                swap_conn.execute(
+                    text(f"COMMENT ON INDEX {self.schema}.{index_name} IS :comment"), {'comment': comment}
+                )
+                swap_conn.commit()
+        else:
+            conn.execute(text(f"COMMENT ON INDEX {self.schema}.{index_name} IS :comment"), {'comment': comment})
+        logger.info(f"已创建向量索引 {index_name} ({options})，用时 {time.time() - start_time:.1f} 秒")
+
+    def check_indexes(self) -> Dict[str, str]:
+        """
+        检查每个集合的索引状态（初始化Vanna时调用，只读，不创建或重建索引）
+
+        在大集合上创建HNSW索引可能需要数分钟，不能阻塞工作进程启动；缺失、无效或参数与配置不一致的
+        索引只记录日志，由scripts/manage_vector_index.py创建或重建
+
+        Returns:
+            Dict[str, str]: {训练数据类型: ok、missing、invalid、outdated或skipped}
+        """
+        results = {training_type: 'skipped' for training_type in VECTOR_STORAGE_CONFIG['collections']}
+
+        with self.db_connection.get_connection() as conn:
+            for training_type, (_, rows) in self._collections(conn).items():
+                index_name = self.index_name(training_type)
+                valid = conn.execute(
+                    text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+                    {'name': f"{self.schema}.{index_name}"}
+                ).scalar()
+                if valid is None:
+                    results[training_type] = 'missing'
+                elif not valid:
+                    results[training_type] = 'invalid'
+                else:
+                    _, current = self._current_params(conn, training_type)
+                    outdated = self._needs_rebuild(current, self._desired_params(rows))
+                    results[training_type] = 'outdated' if outdated else 'ok'
+            conn.rollback()
+
+        pending = {name: status for name, status in results.items() if status in ('missing', 'invalid', 'outdated')}
+        if pending:
+            logger.warning(
+                "向量索引需要维护（" + ", ".join(f"{name} {status}" for name, status in pending.items()) +
+                "），请执行 python scripts/manage_vector_index.py"
+            )
+        else:
+            logger.info("向量索引: " + ", ".join(f"{name} {status}" for name, status in results.items()))
+        return results
+
+    def ensure_indexes(self, rebuild: bool = False) -> Dict[str, str]:
+        """
+        为每个集合创建或维护近似最近邻索引（维护脚本调用，等待其他进程释放咨询锁）
+
+        参数与配置一致的索引保持不变；IVFFlat在自动计算的lists变化两倍以上时重建
+
+        Args:
+            rebuild: 是否强制重建所有索引
+
+        Returns:
+            Dict[str, str]: {训练数据类型: created、rebuilt、unchanged或skipped}
+        """
+        results = {training_type: 'skipped' for training_type in VECTOR_STORAGE_CONFIG['collections']}
+
+        with self.db_connection.get_connection() as conn:
+            # CREATE INDEX CONCURRENTLY不能在事务中执行
+            conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+            self._lock(conn, wait=True)
+            try:
+                if self._ensure_dimension(conn) is None:
+                    logger.info("向量表中还没有数据，暂不创建向量索引")
+                    return results
+
+                for training_type, (collection_id, rows) in self._collections(conn).items():
+                    desired = self._desired_params(rows)
+                    exists, current = self._current_params(conn, training_type)
+                    if exists and not rebuild and not self._needs_rebuild(current, desired):
+                        results[training_type] = 'unchanged'
+                        continue
+                    if desired['method'] == 'ivfflat' and rows == 0:
+                        # IVFFlat的聚类中心由已有数据计算，空集合上建索引没有意义
+                        continue
+                    self._create_index(conn, training_type, collection_id, desired, replace=exists)
+                    results[training_type] = 'rebuilt' if exists else 'created'
+            finally:
+                self._unlock(conn)
+
+        logger.info("向量索引: " + ", ".join(f"{name} {status}" for name, status in results.items()))
+        return results
+
+    def configure_engine(self, engine: Engine):
+        """
+        在引擎的每个新连接上设置ef_search/probes（会话级，只影响该引擎的连接）
+
+        Args:
+            engine: 检索向量使用的SQLAlchemy引擎
+        """
+        settings = (('hnsw.ef_search', int(self.config['ef_search'])),
+                    ('ivfflat.probes', int(self.config['probes'])))
+
+        def set_search_settings(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for setting, value in settings:
+                    cursor.execute(f"SET {setting} = {value}")
+                # 提交后SET在连接归还连接池时的回滚中保留
+                dbapi_connection.commit()
+            except Exception as e:
+                dbapi_connection.rollback()
+                logger.warning(f"设置向量检索参数失败，将使用pgvector默认值: {str(e)}")
+            finally:
+                cursor.close()
+
+        event.listen(engine, "connect", set_search_settings)
+        # 已建立的连接没有经过connect事件，关闭后按需重建
+        engine.dispose()
+
+    def configure_vector_store(self, vector_store) -> int:
+        """
+        为Vanna向量存储使用的引擎设置检索参数
+
+        向量存储的引擎是其内部属性，这里在向量存储及其直接属性中查找Engine实例
+
+        Args:
+            vector_store: Vanna的PGVector向量存储
+
+        Returns:
+            int: 设置的引擎数
+        """
+        engines = []
+        attributes = list(getattr(vector_store, '__dict__', {}).values())
+        candidates = [vector_store] + [value for value in attributes if hasattr(value, '__dict__')]
+        for candidate in candidates:
+            for value in getattr(candidate, '__dict__', {}).values():
+                if isinstance(value, Engine) and all(value is not engine for engine in engines):
+                    engines.append(value)
+        for engine in engines:
+            self.configure_engine(engine)
+        if not engines:
+            logger.warning("没有找到向量存储的数据库引擎，向量检索将使用pgvector默认的ef_search/probes")
+        return len(engines)
+
+    def benchmark(self, training_type: str, values: List[int], k: int = 10,
+                  samples: int = 50) -> List[Dict[str, Any]]:
+        """
+        测试不同ef_search（HNSW）或probes（IVFFlat）下的召回率和检索延迟
+
+        以集合中随机抽取的向量作为查询，关闭索引扫描得到精确的前k个结果作为基准
+
+        Args:
+            training_type: sql、ddl或documentation
+            values: 要测试的ef_search或probes取值
+            k: 每次检索返回的条数
+            samples: 查询次数
+
+        Returns:
+            List[Dict[str, Any]]: 每个取值的结果（setting、value、recall、p50_ms、p95_ms、uses_index），
+                第一项为精确检索
+        """
+        operator, _ = _DISTANCE_OPS[self.config['distance']]
+        setting = _SEARCH_SETTINGS[self.config['method']]
+        search_sql = text(
+            f"SELECT id FROM {self.embedding_table} WHERE collection_id = CAST(:collection_id AS uuid) "
+            f"ORDER BY embedding {operator} CAST(:query AS vector) LIMIT :k"
+        )
+
+        with self.db_connection.get_connection() as conn:
+            collections = self._collections(conn)
+            if training_type not in collections:
+                raise ValueError(f"集合不存在: {training_type}")
+            collection_id, rows = collections[training_type]
+            queries = [
+                row[0] for row in conn.execute(
+                    text(
+                        f"SELECT CAST(embedding AS text) FROM {self.embedding_table} "
+                        "WHERE collection_id = CAST(:collection_id AS uuid) ORDER BY random() LIMIT :samples"
+                    ),
+                    {'collection_id': collection_id, 'samples': samples}
+                )
+            ]
+            conn.rollback()
+            if not queries:
+                return []
+
+            def run(setup_statements: List[str]) -> Tuple[List[set], List[float], bool]:
+                # SET LOCAL只在当前事务内有效，结束后回滚
+                for statement in setup_statements:
+                    conn.execute(text(statement))
+                params = {'collection_id': collection_id, 'query': queries[0], 'k': k}
+                plan = '\n'.join(
+                    row[0] for row in conn.execute(text(f"EXPLAIN {search_sql.text}"), params)
+                )
+                results, latencies = [], []
+                for query in queries:
+                    start_time = time.perf_counter()
+                    ids = conn.execute(search_sql, {**params, 'query': query}).fetchall()
+                    latencies.append((time.perf_counter() - start_time) * 1000)
+                    results.append({row[0] for row in ids})
+                conn.rollback()
+                return results, sorted(latencies), self.index_name(training_type) in plan
+
+            exact, latencies, _ = run(["SET LOCAL enable_indexscan = off"])
+            report = [{
+                'setting': 'exact', 'value': None, 'recall': 1.0,
+                'p50_ms': _percentile(latencies, 0.5), 'p95_ms': _percentile(latencies, 0.95),
+                'uses_index': False,
+            }]
+
+            for value in values:
+                approximate, latencies, uses_index = run([f"SET LOCAL {setting} = {int(value)}"])
+                recall = sum(
+                    len(found & expected) / len(expected)
+                    for found, expected in zip(approximate, exact) if expected
+                ) / len(exact)
+                report.append({
+                    'setting': setting, 'value': value, 'recall': recall,
+                    'p50_ms': _percentile(latencies, 0.5), 'p95_ms': _percentile(latencies, 0.95),
+                    'uses_index': uses_index,
+                })
+
+        logger.info(f"向量索引基准测试完成: {training_type}，{rows} 行，{len(queries)} 次查询，k={k}")
+        return report
@@ -0,0 +1,297 @@
+"""
+进程内向量镜像模块
+
+启动时将sql、ddl、documentation集合的向量加载到连续的float32矩阵（行已归一化），
+检索时用一次矩阵乘法计算余弦相似度并取前k个，省去访问pgvector的网络往返。
+
+通过TrainingDataStore写入和VannaTrainer删除的数据即时同步到镜像；其他途径（其他进程、
+Vanna的add_*接口）的修改通过数据版本号检测，版本变化时在后台线程中按ID增量同步。
+"""
+import time
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from app.config import VECTOR_STORAGE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+def parse_vector(value: Any) -> np.ndarray:
+    """
+    将pgvector的文本表示（"[0.1,0.2,...]"）或数值列表转换为float32数组
+
+    Args:
+        value: 向量
+
+    Returns:
+        np.ndarray: float32数组
+    """
+    if isinstance(value, str):
+        value = value.strip('[]').split(',')
+    return np.asarray(value, dtype=np.float32)
+
+class _Collection:
+    """
+    单个集合的向量矩阵（预留容量，删除时用最后一行填补空位）
+    """
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self.matrix: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, training_id: str, document: str, vector: np.ndarray):
+        """添加或替换一行"""
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+
+        position = self.positions.get(training_id)
+        if position is not None:
+            self.documents[position] = document
+            self.matrix[position] = vector
+            return
+
+        size = len(self.ids)
+        if self.matrix is None:
+            self.matrix = np.empty((1024, vector.shape[0]), dtype=np.float32)
+        elif vector.shape[0] != self.matrix.shape[1]:
+            raise ValueError(f"向量维度不一致: {vector.shape[0]} != {self.matrix.shape[1]}")
+        elif size == self.matrix.shape[0]:
+            # 容量翻倍，保持矩阵连续
+            grown = np.empty((size * 2, self.matrix.shape[1]), dtype=np.float32)
+            grown[:size] = self.matrix[:size]
+            self.matrix = grown
+
+        self.matrix[size] = vector
+        self.ids.append(training_id)
+        self.documents.append(document)
+        self.positions[training_id] = size
+
+    def remove(self, training_id: str) -> bool:
+        """删除一行，返回是否存在"""
+        position = self.positions.pop(training_id, None)
+        if position is None:
+            return False
+        last = len(self.ids) - 1
+        if position != last:
+            self.matrix[position] = self.matrix[last]
+            self.ids[position] = self.ids[last]
+            self.documents[position] = self.documents[last]
+            self.positions[self.ids[position]] = position
+        self.ids.pop()
+        self.documents.pop()
+        return True
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[float, str]]:
+        """返回余弦相似度最高的k行 (相似度, 文档)"""
+        size = len(self.ids)
+        if size == 0 or k <= 0:
+            return []
+        scores = self.matrix[:size] @ query
+        if k < size:
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+        else:
+            top = np.argsort(-scores)
+        return [(float(scores[i]), self.documents[i]) for i in top]
+
+class VectorMirror:
+    """
+    向量集合的进程内镜像，提供与pgvector余弦距离检索一致的top-k检索
+    """
+
+    def __init__(self, db_connection, version_provider: Optional[Callable[[], Any]] = None,
+                 refresh_interval: float = 30):
+        """
+        初始化向量镜像（不加载数据，需调用load）
+
+        Args:
+            db_connection: 数据库连接实例（向量表所在的数据库）
+            version_provider: 返回向量数据版本号的函数，版本变化时增量同步
+            refresh_interval: 检查数据版本的最小间隔（秒）
+        """
+        self.db_connection = db_connection
+        self.version_provider = version_provider
+        self.refresh_interval = refresh_interval
+        self.embedding_table = f"{VECTOR_STORAGE_CONFIG['schema']}.{VECTOR_STORAGE_CONFIG['embedding_table']}"
+        self.collection_table = f"{VECTOR_STORAGE_CONFIG['schema']}.{VECTOR_STORAGE_CONFIG['collection_table']}"
+
+        self._collections = {training_type: _Collection() for training_type in VECTOR_STORAGE_CONFIG['collections']}
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._version = None
+        self._version_checked_at = 0.0
+        self._refreshing = False
+
+    @property
+    def loaded(self) -> bool:
+        """是否已完成首次加载"""
+        return self._loaded
+
+    def _fetch(self, conn, where: str = "", params: Optional[Dict[str, Any]] = None):
+        """读取向量行 (训练数据类型, ID, 向量文本, 文档)"""
+        types_by_name = {name: training_type for training_type, name in VECTOR_STORAGE_CONFIG['collections'].items()}
+        result = conn.execution_options(stream_results=True).execute(
+            text(
+                f"SELECT c.name, e.id, CAST(e.embedding AS text), e.document "
+                f"FROM {self.embedding_table} e JOIN {self.collection_table} c ON c.uuid = e.collection_id "
+                f"WHERE c.name = ANY(:names) {where}"
+            ),
+            {'names': list(types_by_name), **(params or {})}
+        )
+        for name, training_id, embedding, document in result:
+            yield types_by_name[name], training_id, embedding, document
+
+    def load(self):
+        """从向量表加载全部集合"""
+        start_time = time.time()
+        if self.version_provider is not None:
+            # 先取版本号，加载期间的修改会在下次检查时同步
+            self._version = self._get_version()
+            self._version_checked_at = time.time()
+
+        collections = {training_type: _Collection() for training_type in self._collections}
+        with self.db_connection.get_connection() as conn:
+            for training_type, training_id, embedding, document in self._fetch(conn):
+                collections[training_type].add(training_id, document, parse_vector(embedding))
+
+        with self._lock:
+            self._collections = collections
+            self._loaded = True
+        logger.info(
+            f"向量镜像加载完成，用时 {time.time() - start_time:.3f} 秒: " +
+            ", ".join(f"{training_type} {len(collection)}" for training_type, collection in collections.items())
+        )
+
+    def refresh(self):
+        """按ID与向量表对比，加载新增的行并删除已不存在的行"""
+        start_time = time.time()
+        # 先记录镜像中已有的ID，读取期间即时写入镜像的行不会被误删
+        with self._lock:
+            known_ids = set()
+            for collection in self._collections.values():
+                known_ids.update(collection.ids)
+
+        with self.db_connection.get_connection() as conn:
+            rows = conn.execute(
+                text(
+                    f"SELECT e.id FROM {self.embedding_table} e "
+                    f"JOIN {self.collection_table} c ON c.uuid = e.collection_id WHERE c.name = ANY(:names)"
+                ),
+                {'names': list(VECTOR_STORAGE_CONFIG['collections'].values())}
+            )
+            current_ids = {row[0] for row in rows}
+
+            added_ids = current_ids - known_ids
+            added = list(self._fetch(conn, "AND e.id = ANY(:ids)", {'ids': list(added_ids)})) if added_ids else []
+
+        removed_ids = known_ids - current_ids
+        with self._lock:
+            for training_id in removed_ids:
+                for collection in self._collections.values():
+                    if collection.remove(training_id):
+                        break
+            for training_type, training_id, embedding, document in added:
+                self._collections[training_type].add(training_id, document, parse_vector(embedding))
+
+        if added or removed_ids:
+            logger.info(
+                f"向量镜像同步完成，新增 {len(added)}，删除 {len(removed_ids)}，用时 {time.time() - start_time:.3f} 秒"
+            )
+
+    def _get_version(self) -> Any:
+        """获取数据版本号，失败时返回None"""
+        try:
+            return self.version_provider()
+        except Exception as e:
+            logger.warning(f"获取向量数据版本失败: {str(e)}")
+            return None
+
+    def _check_version(self):
+        """按间隔检查数据版本，版本变化时在后台线程中增量同步"""
+        if self.version_provider is None:
+            return
+        now = time.time()
+        if self._refreshing or now - self._version_checked_at < self.refresh_interval:
+            return
+        self._version_checked_at = now
+
+        version = self._get_version()
+        if version is None or version == self._version:
+            return
+        self._version = version
+        self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"向量镜像同步失败: {str(e)}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="vector-mirror-refresh", daemon=True).start()
+
+    def add(self, training_type: str, items: List[Tuple[str, str, List[float]]]):
+        """
+        添加或替换向量（写入向量表之后调用）
+
+        Args:
+            training_type: sql、ddl或documentation
+            items: (训练ID, 文档, 向量)列表
+        """
+        with self._lock:
+            collection = self._collections[training_type]
+            for training_id, document, embedding in items:
+                collection.add(training_id, document, parse_vector(embedding))
+
+    def remove(self, training_id: str) -> bool:
+        """
+        删除向量（从向量表删除之后调用）
+
+        Args:
+            training_id: 训练ID
+
+        Returns:
+            bool: 镜像中是否存在该ID
+        """
+        with self._lock:
+            return any(collection.remove(training_id) for collection in self._collections.values())
+
+    def search(self, training_type: str, embedding: List[float], k: int) -> List[Tuple[float, str]]:
+        """
+        检索余弦相似度最高的k个文档
+
+        Args:
+            training_type: sql、ddl或documentation
+            embedding: 查询向量
+            k: 返回条数
+
+        Returns:
+            List[Tuple[float, str]]: (相似度, 文档)列表，按相似度降序
+        """
+        self._check_version()
+        query = parse_vector(embedding)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        with self._lock:
+            return self._collections[training_type].search(query, k)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        获取各集合的向量数
+
+        Returns:
+            Dict[str, int]: {训练数据类型: 向量数}
+        """
+        with self._lock:
+            return {training_type: len(collection) for training_type, collection in self._collections.items()}
@@ -0,0 +1,122 @@
+"""
+Embedding客户端基准测试脚本
+在本地启动一个模拟阿里云Embedding接口的HTTP服务（带固定延迟），
+对比逐条请求与批量并发请求的耗时
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.langchain.embeddings import AliyunEmbedding
+
+def create_fake_server(latency: float, dimensions: int, fail_every: int) -> ThreadingHTTPServer:
+    """
+    创建模拟Embedding服务
+
+    Args:
+        latency: 每个请求的模拟延迟（秒）
+        dimensions: 返回向量的维度
+        fail_every: 每隔多少个请求返回一次429，0表示不失败
+
+    Returns:
+        ThreadingHTTPServer: HTTP服务实例
+    """
+    counter = {"requests": 0}
+    lock = threading.Lock()
+
+    class FakeEmbeddingHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            with lock:
+                counter["requests"] += 1
+                request_no = counter["requests"]
+
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            time.sleep(latency)
+
+            if fail_every and request_no % fail_every == 0:
+                self.send_response(429)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            data = [
+                {"index": i, "embedding": [float(len(text) % 7)] * dimensions}
+                for i, text in enumerate(texts)
+            ]
+            payload = json.dumps({"data": data}).encode("utf-8")
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeEmbeddingHandler)
+    server.request_counter = counter
+    return server
+
+def embed_one_by_one(api_uri: str, texts: list) -> None:
+    """旧实现：每条文本一次requests.post，无会话复用"""
+    for text in texts:
+        response = requests.post(api_uri, json={"model": "fake", "input": text})
+        response.raise_for_status()
+
+def main():
+    parser = argparse.ArgumentParser(description='Embedding客户端基准测试')
+    parser.add_argument('--texts', type=int, default=300, help='文本数量')
+    parser.add_argument('--latency', type=float, default=0.02, help='模拟服务端延迟（秒）')
+    parser.add_argument('--dimensions', type=int, default=1024, help='向量维度')
+    parser.add_argument('--batch-size', type=int, default=10, help='批量大小')
+    parser.add_argument('--concurrency', type=int, default=4, help='并发批次数')
+    parser.add_argument('--fail-every', type=int, default=0, help='每隔N个请求返回一次429')
+    args = parser.parse_args()
+
+    server = create_fake_server(args.latency, args.dimensions, args.fail_every)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_uri = f"http://127.0.0.1:{server.server_address[1]}/embeddings"
+
+    texts = [f"问题 {i}: 统计每个销售区域的互联网销售额" for i in range(args.texts)]
+
+    try:
+        if not args.fail_every:
+            start = time.perf_counter()
+            embed_one_by_one(api_uri, texts)
+            serial_time = time.perf_counter() - start
+            print(f"逐条请求: {serial_time:.3f} 秒")
+
+        client = AliyunEmbedding(
+            api_uri=api_uri,
+            api_key="fake",
+            model="fake",
+            batch_size=args.batch_size,
+            max_concurrency=args.concurrency,
+            backoff_factor=0.01
+        )
+        requests_before = server.request_counter["requests"]
+        start = time.perf_counter()
+        embeddings = client.embed_documents(texts)
+        batched_time = time.perf_counter() - start
+        client.close()
+
+        assert len(embeddings) == len(texts)
+        print(f"批量并发: {batched_time:.3f} 秒, "
+              f"{server.request_counter['requests'] - requests_before} 个HTTP请求")
+        if not args.fail_every:
+            print(f"加速比: {serial_time / batched_time:.1f}x")
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
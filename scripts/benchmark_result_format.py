@@ -0,0 +1,116 @@
+"""
+结果格式基准测试脚本
+用模拟的fact_reseller_sales宽表行数据，对比rows（字典列表）与columnar（列数组）
+两种结果格式的构建耗时、JSON序列化耗时和响应体大小
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+from decimal import Decimal
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.helpers import DateTimeEncoder, rows_to_columnar
+
+# fact_reseller_sales的列及取值生成方式
+FACT_RESELLER_SALES_COLUMNS = [
+    ("product_key", "int"), ("order_date_key", "int"), ("due_date_key", "int"),
+    ("ship_date_key", "int"), ("reseller_key", "int"), ("employee_key", "int"),
+    ("promotion_key", "int"), ("currency_key", "int"), ("sales_territory_key", "int"),
+    ("sales_order_number", "str"), ("sales_order_line_number", "int"),
+    ("revision_number", "int"), ("order_quantity", "int"), ("unit_price", "decimal"),
+    ("extended_amount", "decimal"), ("unit_price_discount_pct", "float"),
+    ("discount_amount", "float"), ("product_standard_cost", "decimal"),
+    ("total_product_cost", "decimal"), ("sales_amount", "decimal"),
+    ("tax_amt", "decimal"), ("freight", "decimal"), ("carrier_tracking_number", "str"),
+    ("customer_po_number", "str"), ("order_date", "date"), ("due_date", "date"),
+    ("ship_date", "date"),
+]
+
+class BenchmarkEncoder(DateTimeEncoder):
+    """与Flask jsonify行为一致，Decimal按字符串输出"""
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return str(obj)
+        return super().default(obj)
+
+def generate_rows(count: int) -> list:
+    """
+    生成模拟的行元组（与数据库驱动返回的行结构一致）
+
+    Args:
+        count: 行数
+
+    Returns:
+        list: 行元组列表
+    """
+    rng = random.Random(42)
+    base_date = datetime.date(2013, 1, 1)
+    generators = {
+        "int": lambda: rng.randint(1, 100000),
+        "str": lambda: f"SO{rng.randint(10000, 99999)}",
+        "decimal": lambda: Decimal(f"{rng.uniform(0, 5000):.4f}"),
+        "float": lambda: rng.random(),
+        "date": lambda: base_date + datetime.timedelta(days=rng.randint(0, 1500)),
+    }
+    return [
+        tuple(generators[kind]() for _, kind in FACT_RESELLER_SALES_COLUMNS)
+        for _ in range(count)
+    ]
+
+def measure(label: str, build, rounds: int):
+    """
+    测量构建和序列化耗时
+
+    Args:
+        label: 格式名称
+        build: 构建响应体的函数
+        rounds: 重复次数
+    """
+    build_time = 0.0
+    dump_time = 0.0
+    size = 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        payload = build()
+        build_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        body = json.dumps(payload, cls=BenchmarkEncoder, ensure_ascii=False)
+        dump_time += time.perf_counter() - start
+        size = len(body.encode("utf-8"))
+
+    print(f"{label:<10} 构建 {build_time / rounds * 1000:8.1f} ms  "
+          f"序列化 {dump_time / rounds * 1000:8.1f} ms  大小 {size / 1024 / 1024:6.2f} MB")
+    return build_time + dump_time, size
+
+def main():
+    parser = argparse.ArgumentParser(description='结果格式基准测试')
+    parser.add_argument('--rows', type=int, default=50000, help='行数')
+    parser.add_argument('--rounds', type=int, default=3, help='重复次数')
+    args = parser.parse_args()
+
+    columns = [name for name, _ in FACT_RESELLER_SALES_COLUMNS]
+    rows = generate_rows(args.rows)
+    print(f"{len(columns)} 列 x {len(rows)} 行")
+
+    rows_time, rows_size = measure(
+        "rows",
+        lambda: {"columns": columns, "results": [dict(zip(columns, row)) for row in rows]},
+        args.rounds
+    )
+    columnar_time, columnar_size = measure(
+        "columnar",
+        lambda: {"columns": columns, "results": rows_to_columnar(rows, len(columns))},
+        args.rounds
+    )
+
+    print(f"columnar相对rows: 耗时 {columnar_time / rows_time:.0%}, 大小 {columnar_size / rows_size:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+SQL安全检查基准测试脚本
+测量SQLSecurityFilter首次解析和命中语法树缓存时的耗时，
+命中缓存的平均耗时超过--max-us时以非零状态退出，可在CI中作为回归检查
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import statistics
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.config import SECURITY_CONFIG
+from app.db.security import SQLSecurityFilter
+
+# 典型的生成SQL（AdventureWorks数仓）
+QUERIES = [
+    "SELECT COUNT(*) FROM public.dim_customer",
+    "SELECT english_product_name, list_price FROM public.dim_product WHERE list_price > 1000 ORDER BY list_price DESC LIMIT 20",
+    "SELECT d.calendar_year, SUM(f.sales_amount) AS total_sales "
+    "FROM public.fact_internet_sales f JOIN public.dim_date d ON f.order_date_key = d.date_key "
+    "GROUP BY d.calendar_year ORDER BY d.calendar_year",
+    "WITH territory_sales AS ("
+    "  SELECT t.sales_territory_region, SUM(f.sales_amount) AS sales "
+    "  FROM public.fact_reseller_sales f "
+    "  JOIN public.dim_sales_territory t ON f.sales_territory_key = t.sales_territory_key "
+    "  WHERE f.order_date >= '2013-01-01'::date GROUP BY t.sales_territory_region"
+    ") SELECT sales_territory_region, sales, RANK() OVER (ORDER BY sales DESC) AS sales_rank "
+    "FROM territory_sales",
+    "SELECT p.english_product_name FROM public.dim_product p "
+    "WHERE p.product_key IN (SELECT product_key FROM public.fact_internet_sales GROUP BY product_key HAVING COUNT(*) > 100) "
+    "UNION SELECT p.english_product_name FROM public.dim_product p WHERE p.color = 'Red'",
+]
+
+def measure(security_filter: SQLSecurityFilter, rounds: int, max_rows: int) -> list:
+    """
+    测量每次validate_and_sanitize的耗时
+
+    Args:
+        security_filter: 安全过滤器
+        rounds: 每条SQL的重复次数
+        max_rows: 行数上限
+
+    Returns:
+        list: 每次调用的耗时（微秒）
+    """
+    timings = []
+    for _ in range(rounds):
+        for sql in QUERIES:
+            start = time.perf_counter()
+            security_filter.validate_and_sanitize(sql, max_rows=max_rows)
+            timings.append((time.perf_counter() - start) * 1e6)
+    return timings
+
+def report(label: str, timings: list):
+    """输出耗时分布"""
+    timings = sorted(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{label:<8} 平均 {statistics.mean(timings):9.1f} us  p50 {timings[len(timings) // 2]:9.1f} us  "
+          f"p99 {p99:9.1f} us  ({len(timings)} 次)")
+
+def main():
+    parser = argparse.ArgumentParser(description='SQL安全检查基准测试')
+    parser.add_argument('--rounds', type=int, default=2000, help='命中缓存时每条SQL的重复次数')
+    parser.add_argument('--max-rows', type=int, default=10000, help='行数上限')
+    parser.add_argument('--max-us', type=float, default=1000, help='命中缓存时允许的平均耗时（微秒）')
+    args = parser.parse_args()
+
+    # 避免每次调用的INFO日志影响测量
+    logging.getLogger('app.db.security').setLevel(logging.WARNING)
+
+    # 首次解析：每轮使用新的过滤器，缓存为空
+    cold = []
+    for _ in range(20):
+        cold.extend(measure(SQLSecurityFilter(SECURITY_CONFIG), 1, args.max_rows))
+    report("首次解析", cold)
+
+    security_filter = SQLSecurityFilter(SECURITY_CONFIG)
+    measure(security_filter, 1, args.max_rows)
+    cached = measure(security_filter, args.rounds, args.max_rows)
+    report("命中缓存", cached)
+
+    mean = statistics.mean(cached)
+    print(f"加速比 {statistics.mean(cold) / mean:.0f}x")
+    if mean > args.max_us:
+        print(f"命中缓存的平均耗时 {mean:.1f} us 超过上限 {args.max_us:.0f} us")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
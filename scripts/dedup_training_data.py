@@ -0,0 +1,50 @@
+"""
+清理重复训练数据的脚本
+
+按内容哈希对sql、ddl、documentation三个向量集合去重，每组相同内容只保留一行，
+并为历史数据补充content_hash元数据，之后的训练会自动跳过已有内容:
+    python scripts/dedup_training_data.py --dry-run
+"""
+import os
+import sys
+import argparse
+import logging
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.logger import setup_logging
+from app.db.connection import DatabaseConnection
+from app.vanna.setup import VannaSetup
+from app.vanna.training_store import TrainingDataStore
+from app.langchain.llm_config import LLMFactory, EmbeddingFactory
+
+def main():
+    parser = argparse.ArgumentParser(description='清理重复的训练数据')
+    parser.add_argument('--dry-run', action='store_true', help='只统计重复数据，不删除')
+    args = parser.parse_args()
+
+    # 初始化日志
+    setup_logging()
+    logger = logging.getLogger(__name__)
+
+    # 初始化数据库连接
+    db_connection = DatabaseConnection()
+
+    # 初始化Vanna（确保向量集合已创建）
+    llm_model = LLMFactory.create_llm()
+    embedding_model = EmbeddingFactory.create_embedding()
+    vanna_setup = VannaSetup(llm_model, embedding_model)
+    vanna_setup.initialize_vanna(db_connection)
+
+    training_store = TrainingDataStore(db_connection, vanna_setup.embedding_model)
+    stats = training_store.deduplicate(dry_run=args.dry_run)
+
+    action = "发现" if args.dry_run else "删除"
+    logger.info(
+        f"去重完成: 扫描 {stats['scanned']} 条，{action}重复 {stats['duplicates']} 条，"
+        f"补充哈希 {stats['backfilled']} 条"
+    )
+
+if __name__ == "__main__":
+    main()
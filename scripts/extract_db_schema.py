@@ -11,15 +11,20 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from app.utils.logger import setup_logging
 from app.db.connection import DatabaseConnection
+from app.db.schema_extractor import SchemaExtractor
+from app.vanna.schema_sync import SchemaSynchronizer
 from app.vanna.setup import VannaSetup
 from app.langchain.llm_config import LLMFactory, EmbeddingFactory
 
-def extract_and_save_schema(force=False):
+def extract_and_save_schema(force=False, include_schemas=None, exclude_schemas=None, dry_run=False):
     """
-    从数据库提取schema并存储到Vanna
+    从数据库提取schema并增量存储到Vanna
     
     Args:
-        force: 是否强制更新已有schema
+        force: 是否忽略结构指纹，重新训练全部表
+        include_schemas: 只提取这些schema，为None时使用配置值
+        exclude_schemas: 排除的schema，为None时使用配置值
+        dry_run: 只输出差异，不修改训练数据
     """
     # 初始化日志
     setup_logging()
@@ -37,27 +42,19 @@ def extract_and_save_schema(force=False):
         vanna_setup = VannaSetup(llm_model, embedding_model)
         vanna_instance = vanna_setup.initialize_vanna(db_connection=db_connection)
         
-        # 手动提取schema
-        logger.info("从数据库提取schema...")
-        db_schema = db_connection.get_database_schema()
+        # 按表计算结构指纹，只重新训练新增、删除或变化的表
+        logger.info("从数据库提取schema并计算差异...")
+        extractor = SchemaExtractor(db_connection, include_schemas, exclude_schemas)
+        synchronizer = SchemaSynchronizer(vanna_instance, db_connection, extractor)
+        changes = synchronizer.sync(force=force, dry_run=dry_run)
         
-        # 如果强制更新，先尝试清除旧的schema数据
-        if force:
-            logger.info("强制更新模式：尝试清除现有schema...")
-            try:
-                # 使用数据库连接直接执行SQL
-                with db_connection._engine.connect() as conn:
-                    conn.execute("TRUNCATE TABLE IF EXISTS nl2vec.vanna_schemas")
-                    conn.commit()
-                logger.info("成功清除现有schema数据")
-            except Exception as e:
-                logger.warning(f"清除现有schema数据失败，将继续添加新schema: {str(e)}")
+        for change_type in ('added', 'changed', 'dropped'):
+            for table_name in changes[change_type]:
+                logger.info(f"{change_type}: {table_name}")
         
-        # 添加schema到Vanna
-        logger.info("向Vanna添加数据库schema...")
-        training_id = vanna_instance.add_ddl(db_schema)
-        
-        logger.info(f"成功提取并存储数据库schema，训练ID: {training_id}")
+        logger.info(f"成功同步数据库schema，{'（仅预览）' if dry_run else ''}"
+                    f"重新训练 {len(changes['added']) + len(changes['changed'])} 张表，"
+                    f"删除 {len(changes['dropped'])} 张表")
         return True
     except Exception as e:
         logger.error(f"提取和存储schema失败: {str(e)}")
@@ -65,10 +62,13 @@ def extract_and_save_schema(force=False):
 
 def main():
     parser = argparse.ArgumentParser(description='从数据库提取schema并存储到Vanna')
-    parser.add_argument('--force', action='store_true', help='强制更新已有schema')
+    parser.add_argument('--force', action='store_true', help='忽略结构指纹，重新训练全部表')
+    parser.add_argument('--dry-run', action='store_true', help='只输出结构差异，不修改训练数据')
+    parser.add_argument('--include-schema', action='append', help='只提取指定schema，可多次指定')
+    parser.add_argument('--exclude-schema', action='append', help='排除指定schema，可多次指定（覆盖默认的排除列表）')
     args = parser.parse_args()
     
-    success = extract_and_save_schema(args.force)
+    success = extract_and_save_schema(args.force, args.include_schema, args.exclude_schema, args.dry_run)
     
     if success:
         print("成功提取并存储数据库schema")
@@ -14,37 +14,49 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from app.utils.logger import setup_logging
 from app.db.connection import DatabaseConnection
 from app.vanna.setup import VannaSetup
+from app.vanna.schema_sync import SchemaSynchronizer
+from app.vanna.training_store import TrainingDataStore
 from app.langchain.llm_config import LLMFactory, EmbeddingFactory
 
 
-def add_ddl_from_file(vanna_instance, file_path):
-    """从文件添加DDL"""
+def add_ddl_from_file(vanna_instance, db_connection, file_path, force=False):
+    """
+    从文件添加DDL
+    
+    DDL按表拆分，每张表（附带其外键、注释和索引）作为一条训练数据，
+    检索时只返回与问题相关的表；文件再次加载时只重新训练发生变化的表
+    """
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
             ddl_content = f.read()
         
-        training_id = vanna_instance.add_ddl(ddl=ddl_content)
-        logging.info(f"DDL从文件 {file_path} 添加成功，训练ID: {training_id}")
+        synchronizer = SchemaSynchronizer(vanna_instance, db_connection)
+        changes = synchronizer.sync_ddl(ddl_content, source=os.path.normpath(file_path), force=force)
+        logging.info(
+            f"DDL从文件 {file_path} 添加成功: 新增 {len(changes['added'])} 张表，"
+            f"更新 {len(changes['changed'])} 张表，删除 {len(changes['dropped'])} 张表，"
+            f"未变化 {len(changes['unchanged'])} 张表"
+        )
         return True
     except Exception as e:
         logging.error(f"从文件添加DDL失败: {str(e)}")
         return False
 
-def add_documentation_from_file(vanna_instance, file_path):
-    """从文件添加表文档"""
+def add_documentation_from_file(training_store, file_path):
+    """从文件添加表文档（内容未变化时不会重复添加）"""
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
             doc_content = f.read()
         
-        training_id = vanna_instance.add_documentation(documentation=doc_content)
-        logging.info(f"表文档从文件 {file_path} 添加成功，训练ID: {training_id}")
+        training_id, created = training_store.add_item('documentation', doc_content)
+        logging.info(f"表文档从文件 {file_path} {'添加成功' if created else '已存在'}，训练ID: {training_id}")
         return True
     except Exception as e:
         logging.error(f"从文件添加表文档失败: {str(e)}")
         return False
 
-def extract_and_add_comments(vanna_instance, db_connection):
-    """从数据库提取并添加注释"""
+def extract_and_add_comments(training_store, db_connection):
+    """从数据库提取并添加注释（注释未变化时不会重复添加）"""
     try:
         # 查询表和列的注释
         comments_query = """
@@ -92,8 +104,8 @@ def extract_and_add_comments(vanna_instance, db_connection):
                 documentation += f"- {column_name}: {column_comment}\n"
         
         # 添加到Vanna
-        training_id = vanna_instance.add_documentation(documentation=documentation)
-        logging.info(f"数据库注释提取并添加成功，训练ID: {training_id}")
+        training_id, created = training_store.add_item('documentation', documentation)
+        logging.info(f"数据库注释提取并{'添加成功' if created else '已存在'}，训练ID: {training_id}")
         return True
     except Exception as e:
         logging.error(f"提取并添加数据库注释失败: {str(e)}")
@@ -111,6 +123,7 @@ def main():
     parser.add_argument('--ddl-file', help='DDL文件路径')
     parser.add_argument('--doc-file', help='表文档文件路径')
     parser.add_argument('--extract-comments', action='store_true', help='从数据库提取注释')
+    parser.add_argument('--force', action='store_true', help='忽略表指纹，重新训练DDL文件中的全部表')
     args = parser.parse_args()
     
     # 初始化日志
@@ -124,6 +137,7 @@ def main():
     embedding_model = EmbeddingFactory.create_embedding()
     vanna_setup = VannaSetup(llm_model, embedding_model)
     vanna_instance = vanna_setup.initialize_vanna(db_connection=db_connection)
+    training_store = TrainingDataStore(db_connection, vanna_setup.embedding_model)
     
     success_count = 0
     
@@ -134,17 +148,17 @@ def main():
     
     # 添加DDL文件
     if ddl_file:
-        if add_ddl_from_file(vanna_instance, ddl_file):
+        if add_ddl_from_file(vanna_instance, db_connection, ddl_file, force=args.force):
             success_count += 1
     
     # 添加表文档文件
     if doc_file:
-        if add_documentation_from_file(vanna_instance, doc_file):
+        if add_documentation_from_file(training_store, doc_file):
             success_count += 1
     
     # 从数据库提取注释
     if extract_comments:
-        if extract_and_add_comments(vanna_instance, db_connection):
+        if extract_and_add_comments(training_store, db_connection):
             success_count += 1
     
     if success_count > 0:
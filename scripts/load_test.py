@@ -0,0 +1,141 @@
+"""
+Web API压力测试脚本
+以固定并发向/api/query发送请求，统计吞吐量、延迟分位数和服务进程内存，
+用于对比同步(Flask)与异步(ASGI)两种服务模式在相同内存下能承载的并发数
+
+示例:
+    python web/app.py &                        # 同步模式
+    hypercorn web.asgi:app --bind 0.0.0.0:5001 &  # 异步模式
+    python scripts/load_test.py --url http://localhost:5000 --concurrency 200 --server-pid <PID>
+    python scripts/load_test.py --url http://localhost:5001 --concurrency 200 --server-pid <PID>
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+import httpx
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+DEFAULT_QUESTIONS = [
+    "统计每个销售区域的互联网销售总额",
+    "列出销售额最高的前10个产品",
+    "按年份统计经销商销售额",
+    "显示每个产品类别的平均单价",
+]
+
+def read_rss_mb(pid: int) -> float:
+    """
+    读取进程的常驻内存（MB），仅支持Linux
+
+    Args:
+        pid: 进程ID
+
+    Returns:
+        float: 常驻内存大小，无法读取时返回0
+    """
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+def percentile(values: list, p: float) -> float:
+    """计算分位数"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+async def run_load_test(url: str, total: int, concurrency: int, questions: list,
+                        server_pid: int, timeout: float):
+    """
+    执行压力测试
+
+    Args:
+        url: 服务地址
+        total: 请求总数
+        concurrency: 并发数
+        questions: 轮流发送的问题列表
+        server_pid: 服务进程ID，用于采样内存，0表示不采样
+        timeout: 单个请求超时（秒）
+    """
+    latencies = []
+    errors = 0
+    in_flight = 0
+    peak_in_flight = 0
+    peak_rss = read_rss_mb(server_pid) if server_pid else 0.0
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(questions[i % len(questions)])
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+
+        async def worker():
+            nonlocal errors, in_flight, peak_in_flight
+            while not queue.empty():
+                question = queue.get_nowait()
+                in_flight += 1
+                peak_in_flight = max(peak_in_flight, in_flight)
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/api/query", json={"question": question})
+                    if response.status_code != 200 or not response.json().get("success"):
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                finally:
+                    in_flight -= 1
+                latencies.append(time.perf_counter() - start)
+
+        async def sample_memory():
+            nonlocal peak_rss
+            while True:
+                peak_rss = max(peak_rss, read_rss_mb(server_pid))
+                await asyncio.sleep(0.2)
+
+        sampler = asyncio.create_task(sample_memory()) if server_pid else None
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        if sampler:
+            sampler.cancel()
+
+    print(f"目标: {url}")
+    print(f"请求数: {total}, 并发: {concurrency}, 峰值在途: {peak_in_flight}, 失败: {errors}")
+    print(f"总耗时: {elapsed:.2f} 秒, 吞吐量: {total / elapsed:.1f} req/s")
+    print(f"延迟: 平均 {statistics.mean(latencies):.3f}s, p50 {percentile(latencies, 50):.3f}s, "
+          f"p95 {percentile(latencies, 95):.3f}s, p99 {percentile(latencies, 99):.3f}s")
+    if server_pid:
+        print(f"服务进程峰值内存: {peak_rss:.1f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description='Web API压力测试')
+    parser.add_argument('--url', default='http://localhost:5000', help='服务地址')
+    parser.add_argument('--requests', type=int, default=1000, help='请求总数')
+    parser.add_argument('--concurrency', type=int, default=100, help='并发数')
+    parser.add_argument('--server-pid', type=int, default=0, help='服务进程ID，用于采样内存')
+    parser.add_argument('--timeout', type=float, default=120, help='单个请求超时（秒）')
+    parser.add_argument('--question', action='append', help='要发送的问题，可多次指定')
+    args = parser.parse_args()
+
+    asyncio.run(run_load_test(
+        args.url,
+        args.requests,
+        args.concurrency,
+        args.question or DEFAULT_QUESTIONS,
+        args.server_pid,
+        args.timeout
+    ))
+
+if __name__ == "__main__":
+    main()
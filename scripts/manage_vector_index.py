@@ -0,0 +1,77 @@
+"""
+管理Vanna向量集合的近似最近邻索引，并测试不同检索参数下的召回率和延迟
+
+应用启动时只检查索引状态；创建索引、修改embedding列维度、参数变化后重建索引需执行本脚本。
+重建时新索引以临时名称并发创建，完成后再替换旧索引，执行期间检索不受影响
+
+    python scripts/manage_vector_index.py                      # 按配置创建/维护索引
+    python scripts/manage_vector_index.py --method ivfflat --rebuild
+    python scripts/manage_vector_index.py --benchmark sql --values 10,20,40,80,160
+"""
+import os
+import sys
+import argparse
+import logging
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.config import VECTOR_INDEX_CONFIG
+from app.utils.logger import setup_logging
+from app.db.connection import DatabaseConnection
+from app.vanna.vector_index import VectorIndexManager
+
+def main():
+    parser = argparse.ArgumentParser(description='管理向量索引')
+    parser.add_argument('--method', choices=['hnsw', 'ivfflat'], default=None, help='索引方法')
+    parser.add_argument('--m', type=int, default=None, help='HNSW的m')
+    parser.add_argument('--ef-construction', type=int, default=None, help='HNSW的ef_construction')
+    parser.add_argument('--lists', type=int, default=None, help='IVFFlat的lists，0表示按行数自动计算')
+    parser.add_argument('--rebuild', action='store_true', help='强制重建索引')
+    parser.add_argument('--benchmark', metavar='COLLECTION', choices=['sql', 'ddl', 'documentation'],
+                        default=None, help='测试指定集合的召回率和延迟（不修改索引）')
+    parser.add_argument('--values', default=None,
+                        help='要测试的ef_search（HNSW）或probes（IVFFlat），逗号分隔')
+    parser.add_argument('--k', type=int, default=10, help='每次检索返回的条数')
+    parser.add_argument('--samples', type=int, default=50, help='查询次数')
+    args = parser.parse_args()
+
+    setup_logging()
+    logger = logging.getLogger(__name__)
+
+    config = dict(VECTOR_INDEX_CONFIG)
+    for key in ('method', 'm', 'ef_construction', 'lists'):
+        if getattr(args, key) is not None:
+            config[key] = getattr(args, key)
+
+    db_connection = DatabaseConnection()
+    manager = VectorIndexManager(db_connection, config)
+
+    if args.benchmark is None:
+        results = manager.ensure_indexes(rebuild=args.rebuild)
+        for training_type, status in results.items():
+            print(f"{training_type}: {status}")
+        return
+
+    if args.values:
+        values = [int(value) for value in args.values.split(',')]
+    elif config['method'] == 'hnsw':
+        values = [10, 20, 40, 80, 160]
+    else:
+        values = [1, 5, 10, 20, 50]
+
+    report = manager.benchmark(args.benchmark, values, k=args.k, samples=args.samples)
+    if not report:
+        logger.warning(f"集合 {args.benchmark} 中没有数据")
+        return
+
+    print(f"{'setting':<16} {'value':>6} {'recall@' + str(args.k):>10} {'p50 ms':>9} {'p95 ms':>9}  index")
+    for row in report:
+        value = '' if row['value'] is None else row['value']
+        print(
+            f"{row['setting']:<16} {value:>6} {row['recall']:>10.3f} "
+            f"{row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f}  {'yes' if row['uses_index'] else 'no'}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,16 @@
 """
 执行Vanna训练的简单脚本
 要先执行generate_training_data.py，生成四个json数据集，然后再执行当前的脚本，加载那四个json数据集
+
+也可以指定任意JSON/JSONL文件或通配符进行批量训练，例如从查询日志挖掘出的问题-SQL对:
+    python scripts/run_training.py "data/query_logs/*.jsonl" --batch-size 1000
+
+指定文件时以训练任务运行，每批提交后保存检查点，中断后可从检查点继续:
+    python scripts/run_training.py --resume <任务ID>
 """
 import os
 import sys
+import argparse
 import logging
 
 # 添加项目根目录到Python路径
@@ -13,9 +20,17 @@ from app.utils.logger import setup_logging
 from app.db.connection import DatabaseConnection
 from app.vanna.setup import VannaSetup
 from app.vanna.trainer import VannaTrainer
+from app.vanna.training_store import TrainingDataStore
+from app.vanna.training_jobs import TrainingJobManager, STATUS_COMPLETED
 from app.langchain.llm_config import LLMFactory, EmbeddingFactory
 
 def main():
+    parser = argparse.ArgumentParser(description='执行Vanna训练')
+    parser.add_argument('files', nargs='*', help='训练数据文件或通配符（JSON/JSONL），不指定时加载默认的四个数据集')
+    parser.add_argument('--batch-size', type=int, default=None, help='每批计算向量并写入的条数')
+    parser.add_argument('--resume', metavar='JOB_ID', default=None, help='从检查点继续指定的训练任务')
+    args = parser.parse_args()
+    
     # 初始化日志
     setup_logging()
     logger = logging.getLogger(__name__)
@@ -32,11 +47,20 @@ def main():
     
     # 创建训练器
     logger.info("开始训练...")
-    trainer = VannaTrainer(vanna)
+    training_store = TrainingDataStore(db_connection, vanna_setup.embedding_model, batch_size=args.batch_size)
+    trainer = VannaTrainer(vanna, training_store=training_store)
     
-    # 调用train_from_files方法
-    result = trainer.train_from_files()
+    if args.files or args.resume:
+        training_jobs = TrainingJobManager(training_store)
+        job_id = args.resume or training_jobs.create(args.files, args.batch_size).job_id
+        logger.info(f"训练任务ID: {job_id}")
+        job = training_jobs.run(job_id)
+        if job.status != STATUS_COMPLETED:
+            logger.error(f"训练任务未完成，可执行 python scripts/run_training.py --resume {job_id} 继续")
+            sys.exit(1)
+        return
     
+    result = trainer.train_from_files()
     logger.info(f"训练结果: {result.message}")
 
 if __name__ == "__main__":
@@ -0,0 +1,54 @@
+"""
+SQL安全过滤器测试：禁止的函数（按函数名和函数族前缀）
+"""
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.config import SECURITY_CONFIG
+from app.db.security import SQLSecurityFilter, UnsafeSQLError
+
+@pytest.fixture
+def security_filter():
+    return SQLSecurityFilter(SECURITY_CONFIG)
+
+@pytest.mark.parametrize('sql', [
+    "SELECT pg_sleep(10)",
+    "SELECT pg_sleep_for('10 seconds')",
+    "SELECT pg_sleep_until(now() + interval '10 seconds')",
+    "SELECT pg_catalog.pg_sleep(10)",
+    "SELECT \"pg_sleep\"(10)",
+    "SELECT dblink('host=evil', 'SELECT 1')",
+    "SELECT dblink_connect('host=evil')",
+    "SELECT dblink_send_query('conn', 'DELETE FROM public.dim_customer')",
+    "SELECT nextval('public.orders_id_seq')",
+    "SELECT setval('public.orders_id_seq', 1)",
+    "SELECT lo_get(16385)",
+    "SELECT lo_put(16385, 0, 'x')",
+    "SELECT lo_create(0)",
+    "SELECT lo_unlink(16385)",
+    "SELECT lo_from_bytea(0, 'x')",
+    "SELECT pg_advisory_lock(1)",
+    "SELECT pg_try_advisory_lock(1)",
+    "SELECT pg_advisory_xact_lock_shared(1)",
+    "SELECT pg_ls_waldir()",
+    "SELECT pg_read_file('/etc/passwd')",
+    "SELECT query_to_xml('SELECT * FROM nl2vec.langchain_pg_embedding', true, false, '')",
+    "SELECT * FROM public.dim_customer WHERE customer_key = (SELECT pg_sleep(1))::text::int",
+])
+def test_blocked_functions(security_filter, sql):
+    with pytest.raises(UnsafeSQLError):
+        security_filter.validate_and_sanitize(sql)
+
+@pytest.mark.parametrize('sql', [
+    "SELECT lower(english_product_name), length(color) FROM public.dim_product",
+    "SELECT COUNT(*), SUM(sales_amount) FROM public.fact_internet_sales",
+    "SELECT date_trunc('month', order_date) FROM public.fact_internet_sales",
+    "SELECT coalesce(color, 'NA'), round(list_price, 2) FROM public.dim_product",
+])
+def test_allowed_functions(security_filter, sql):
+    assert security_filter.validate_and_sanitize(sql)
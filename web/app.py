@@ -9,46 +9,42 @@ import os
 # 添加项目根目录到系统路径
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Blueprint, request, jsonify, render_template, Response, stream_with_context, current_app
 from flask_cors import CORS
 
-from app.db.connection import DatabaseConnection
-from app.vanna.setup import VannaSetup
-from app.langchain.llm_config import LLMFactory, EmbeddingFactory
-from app.vanna.query_processor import QueryProcessor
-from app.vanna.trainer import VannaTrainer
-from app.schemas.request import NLQueryRequest, FeedbackRequest, TrainingRequest
+from app.config import WARMUP_CONFIG
+from app.services import services
+from app.db.result_pager import WrongWorkerError
+from app.schemas.request import NLQueryRequest, FeedbackRequest, TrainingRequest, TrainingJobRequest
+from app.utils.metrics import metrics, stage_timer
 
 logger = logging.getLogger(__name__)
 
-# 创建Flask应用
-app = Flask(__name__)
-CORS(app)  # 启用CORS
-
-# 初始化组件
-logger.info("初始化NL2SQL Demo应用")
-db_connection = DatabaseConnection()  # 尝试连接数据库，如果失败则抛出异常并退出
-llm_model = LLMFactory.create_llm()
-embedding_model = EmbeddingFactory.create_embedding()
-vanna_setup = VannaSetup(llm_model, embedding_model)
-vanna_instance = vanna_setup.initialize_vanna(db_connection=db_connection)
-query_processor = QueryProcessor(vanna_instance, db_connection)
-trainer = VannaTrainer(vanna_instance)
-
-@app.route('/')
+# 路由定义在蓝图中，由create_app注册；组件由services在首次请求时按需初始化
+bp = Blueprint('nl2sql', __name__)
+
+@bp.route('/')
 def index():
     """提供主页"""
     return render_template('index.html')
 
-@app.route('/api/query', methods=['POST'])
+@bp.route('/api/query', methods=['POST'])
 def handle_query():
     """处理查询请求"""
     try:
         data = request.json
         query_request = NLQueryRequest(**data)
         
-        result = query_processor.process_query(query_request.question)
-        return jsonify(result)
+        result = services.query_processor.process_query(
+            query_request.question,
+            max_results=query_request.max_results,
+            result_format=query_request.format,
+            include_timings=query_request.include_timings,
+            page_size=query_request.page_size
+        )
+        # 序列化发生在响应内容确定之后，只计入/metrics的阶段统计，不在响应的timings中
+        with stage_timer("serialization"):
+            return jsonify(result)
     except Exception as e:
         logger.error(f"处理查询请求错误: {str(e)}")
         return jsonify({
@@ -56,14 +52,76 @@ def handle_query():
             "error": str(e)
         }), 400
 
-@app.route('/api/feedback', methods=['POST'])
+@bp.route('/api/query/<query_id>/page', methods=['GET', 'POST'])
+def handle_query_page(query_id):
+    """
+    读取分页查询的下一页，从服务端游标当前位置继续读取，不重新执行查询
+    
+    每页行数可通过查询参数或JSON请求体中的page_size指定，默认与第一页相同
+    """
+    try:
+        page_size = request.args.get('page_size', type=int)
+        if page_size is None and request.is_json:
+            page_size = (request.get_json(silent=True) or {}).get('page_size')
+        
+        page = services.query_pager.fetch(query_id, page_size)
+        with stage_timer("serialization"):
+            return jsonify({"success": True, **page})
+    except WrongWorkerError as e:
+        # 游标在其他工作进程中，需要按query_id粘性路由
+        return jsonify({"success": False, "error": str(e)}), 421
+    except KeyError as e:
+        return jsonify({"success": False, "error": e.args[0]}), 404
+    except Exception as e:
+        logger.error(f"读取分页查询错误: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 400
+
+@bp.route('/api/query/stream', methods=['POST'])
+def handle_query_stream():
+    """
+    流式处理查询请求
+    
+    默认返回NDJSON（每行一个事件），请求头Accept为text/event-stream时返回SSE
+    """
+    try:
+        data = request.json
+        query_request = NLQueryRequest(**data)
+    except Exception as e:
+        logger.error(f"处理流式查询请求错误: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+    
+    use_sse = 'text/event-stream' in request.headers.get('Accept', '')
+    
+    def generate():
+        for event in services.query_processor.stream_query(
+            query_request.question,
+            max_results=query_request.max_results,
+            result_format=query_request.format,
+            explain=query_request.explain
+        ):
+            payload = current_app.json.dumps(event)
+            if use_sse:
+                yield f"event: {event['type']}\ndata: {payload}\n\n"
+            else:
+                yield payload + "\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream' if use_sse else 'application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@bp.route('/api/feedback', methods=['POST'])
 def handle_feedback():
     """处理反馈请求"""
     try:
         data = request.json
         feedback_request = FeedbackRequest(**data)
         
-        success = query_processor.train_from_feedback(
+        success = services.query_processor.train_from_feedback(
             feedback_request.question,
             feedback_request.sql,
             feedback_request.is_correct
@@ -80,14 +138,14 @@ def handle_feedback():
             "error": str(e)
         }), 400
 
-@app.route('/api/train', methods=['POST'])
+@bp.route('/api/train', methods=['POST'])
 def handle_train():
     """处理训练请求"""
     try:
         data = request.json
         training_request = TrainingRequest(**data)
         
-        response = trainer.train_single_item(training_request)
+        response = services.trainer.train_single_item(training_request)
         return jsonify(response.dict())
     except Exception as e:
         logger.error(f"处理训练请求错误: {str(e)}")
@@ -97,8 +155,80 @@ def handle_train():
             "training_data_id": None
         }), 400
 
+@bp.route('/api/train/jobs', methods=['POST'])
+def handle_create_training_job():
+    """创建并在后台启动训练任务，立即返回任务ID"""
+    try:
+        job_request = TrainingJobRequest(**request.json)
+        training_jobs = services.training_jobs
+        job = training_jobs.create(training_jobs.resolve_patterns(job_request.files), job_request.batch_size)
+        training_jobs.start(job.job_id)
+        return jsonify(job.to_dict()), 202
+    except Exception as e:
+        logger.error(f"创建训练任务错误: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 400
+
+@bp.route('/api/train/jobs', methods=['GET'])
+def handle_list_training_jobs():
+    """列出训练任务"""
+    return jsonify([job.to_dict() for job in services.training_jobs.list_jobs()])
+
+@bp.route('/api/train/jobs/<job_id>', methods=['GET'])
+def handle_get_training_job(job_id):
+    """查询训练任务的状态和进度"""
+    job = services.training_jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": f"训练任务不存在: {job_id}"}), 404
+    return jsonify(job.to_dict())
+
+@bp.route('/api/train/jobs/<job_id>/resume', methods=['POST'])
+def handle_resume_training_job(job_id):
+    """从检查点继续失败的训练任务"""
+    try:
+        job = services.training_jobs.start(job_id)
+        return jsonify(job.to_dict()), 202
+    except KeyError as e:
+        return jsonify({"success": False, "error": e.args[0]}), 404
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 409
+
+@bp.route('/metrics')
+def handle_metrics():
+    """以Prometheus文本格式导出指标"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+def create_app(warmup: bool = None) -> Flask:
+    """
+    创建Flask应用
+    
+    导入和创建应用都不会访问网络，组件在首次请求时初始化（每个进程一份），
+    因此可以安全地用于gunicorn --preload等预加载多进程部署。
+    
+    Args:
+        warmup: 是否立即预热组件，为None时使用WARMUP_CONFIG['on_start']。
+            预加载部署应在worker进程中（例如gunicorn的post_fork钩子）调用services.warmup()
+        
+    Returns:
+        Flask: Flask应用
+    """
+    flask_app = Flask(__name__)
+    CORS(flask_app)  # 启用CORS
+    flask_app.register_blueprint(bp)
+    
+    if warmup is None:
+        warmup = WARMUP_CONFIG['on_start']
+    if warmup:
+        services.warmup()
+    
+    return flask_app
+
+# 模块级应用供 python web/app.py 和 gunicorn web.app:app 使用，导入时不做预热
+app = create_app(warmup=False)
+
 def run_app(host='0.0.0.0', port=5000, debug=False):
     """运行Flask应用"""
+    if WARMUP_CONFIG['on_start']:
+        services.warmup()
     app.run(host=host, port=port, debug=debug)
 
 if __name__ == '__main__':
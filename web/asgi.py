@@ -0,0 +1,291 @@
+"""
+Web应用异步入口（ASGI），提供与web/app.py相同的API
+
+运行方式: hypercorn web.asgi:app --bind 0.0.0.0:5000
+"""
+import asyncio
+import logging
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加项目根目录到系统路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from quart import Quart, Response, request, jsonify, render_template, current_app
+
+from app.config import ASYNC_SERVER_CONFIG, WARMUP_CONFIG
+from app.services import services
+from app.db.result_pager import WrongWorkerError
+from app.db.async_connection import AsyncDatabaseConnection
+from app.vanna.async_query_processor import AsyncQueryProcessor
+from app.schemas.request import NLQueryRequest, FeedbackRequest, TrainingRequest, TrainingJobRequest
+from app.utils.metrics import metrics, stage_timer
+
+logger = logging.getLogger(__name__)
+
+# 创建Quart应用
+app = Quart(__name__)
+
+# 异步组件在服务启动时创建，同步组件由services按需初始化
+async_services = {}
+
+@app.before_serving
+async def startup():
+    """服务启动时创建异步连接池"""
+    logger.info("初始化NL2SQL Demo异步应用")
+    loop = asyncio.get_running_loop()
+    # 同步的向量检索和训练通过asyncio.to_thread执行，限制线程数量
+    loop.set_default_executor(ThreadPoolExecutor(
+        max_workers=ASYNC_SERVER_CONFIG['blocking_workers'],
+        thread_name_prefix="blocking"
+    ))
+
+    async_db_connection = AsyncDatabaseConnection()
+    await async_db_connection.connect()
+    async_services['async_db_connection'] = async_db_connection
+
+    if WARMUP_CONFIG['on_start']:
+        await asyncio.to_thread(services.warmup)
+
+async def get_query_processor() -> AsyncQueryProcessor:
+    """获取异步查询处理器"""
+    query_processor = async_services.get('query_processor')
+    if query_processor is None:
+        # 首次调用时在线程中创建同步组件（会访问网络），不阻塞事件循环
+        sync_query_processor = await asyncio.to_thread(lambda: services.query_processor)
+        # 同步和异步连接共用一份查询结果缓存
+        async_services['async_db_connection'].result_cache = services.result_cache
+        query_processor = AsyncQueryProcessor(
+            sync_query_processor,
+            async_services['async_db_connection'],
+            embedding_model=services.embedding_model
+        )
+        async_services['query_processor'] = query_processor
+    return query_processor
+
+@app.after_serving
+async def shutdown():
+    """服务停止时释放连接"""
+    if 'async_db_connection' in async_services:
+        await async_services['async_db_connection'].close()
+    query_processor = async_services.get('query_processor')
+    embedding_model = getattr(query_processor.embedding_model, 'embedding_model', None) if query_processor else None
+    if hasattr(embedding_model, 'aclose'):
+        await embedding_model.aclose()
+
+@app.route('/')
+async def index():
+    """提供主页"""
+    return await render_template('index.html')
+
+@app.route('/api/query', methods=['POST'])
+async def handle_query():
+    """处理查询请求"""
+    try:
+        data = await request.get_json()
+        query_request = NLQueryRequest(**data)
+
+        query_processor = await get_query_processor()
+        result = await query_processor.process_query(
+            query_request.question,
+            max_results=query_request.max_results,
+            result_format=query_request.format,
+            include_timings=query_request.include_timings,
+            page_size=query_request.page_size
+        )
+        # 序列化发生在响应内容确定之后，只计入/metrics的阶段统计，不在响应的timings中
+        with stage_timer("serialization"):
+            return jsonify(result)
+    except Exception as e:
+        logger.error(f"处理查询请求错误: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+
+async def iterate_in_thread(iterator):
+    """
+    在线程中逐项读取同步迭代器，不阻塞事件循环；迭代结束或客户端断开时关闭迭代器
+
+    Args:
+        iterator: 同步迭代器（生成器）
+
+    Yields:
+        Any: 迭代器的每一项
+    """
+    sentinel = object()
+    try:
+        while True:
+            item = await asyncio.to_thread(next, iterator, sentinel)
+            if item is sentinel:
+                break
+            yield item
+    finally:
+        # 关闭生成器以释放其持有的数据库连接
+        await asyncio.to_thread(iterator.close)
+
+@app.route('/api/query/stream', methods=['POST'])
+async def handle_query_stream():
+    """
+    流式处理查询请求（与web/app.py相同的事件格式）
+
+    默认返回NDJSON（每行一个事件），请求头Accept为text/event-stream时返回SSE。
+    流式查询复用同步QueryProcessor.stream_query，在线程中逐个事件读取
+    """
+    try:
+        data = await request.get_json()
+        query_request = NLQueryRequest(**data)
+    except Exception as e:
+        logger.error(f"处理流式查询请求错误: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+
+    use_sse = 'text/event-stream' in request.headers.get('Accept', '')
+    # 首次调用时在线程中创建同步组件（会访问网络），不阻塞事件循环
+    query_processor = await asyncio.to_thread(lambda: services.query_processor)
+    json_provider = current_app.json
+
+    async def generate():
+        events = query_processor.stream_query(
+            query_request.question,
+            max_results=query_request.max_results,
+            result_format=query_request.format,
+            explain=query_request.explain
+        )
+        async for event in iterate_in_thread(events):
+            payload = json_provider.dumps(event)
+            if use_sse:
+                yield f"event: {event['type']}\ndata: {payload}\n\n"
+            else:
+                yield payload + "\n"
+
+    response = Response(
+        generate(),
+        mimetype='text/event-stream' if use_sse else 'application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # SQL生成和解释可能超过默认的响应超时
+    response.timeout = None
+    return response
+
+@app.route('/api/query/<query_id>/page', methods=['GET', 'POST'])
+async def handle_query_page(query_id):
+    """
+    读取分页查询的下一页，从服务端游标当前位置继续读取，不重新执行查询
+
+    每页行数可通过查询参数或JSON请求体中的page_size指定，默认与第一页相同
+    """
+    try:
+        page_size = request.args.get('page_size', type=int)
+        if page_size is None and request.is_json:
+            page_size = ((await request.get_json(silent=True)) or {}).get('page_size')
+
+        # 分页游标为同步实现，在线程中读取
+        page = await asyncio.to_thread(lambda: services.query_pager.fetch(query_id, page_size))
+        with stage_timer("serialization"):
+            return jsonify({"success": True, **page})
+    except WrongWorkerError as e:
+        # 游标在其他工作进程中，需要按query_id粘性路由
+        return jsonify({"success": False, "error": str(e)}), 421
+    except KeyError as e:
+        return jsonify({"success": False, "error": e.args[0]}), 404
+    except Exception as e:
+        logger.error(f"读取分页查询错误: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 400
+
+@app.route('/api/feedback', methods=['POST'])
+async def handle_feedback():
+    """处理反馈请求"""
+    try:
+        data = await request.get_json()
+        feedback_request = FeedbackRequest(**data)
+
+        query_processor = await get_query_processor()
+        success = await query_processor.train_from_feedback(
+            feedback_request.question,
+            feedback_request.sql,
+            feedback_request.is_correct
+        )
+
+        return jsonify({
+            "success": success,
+            "message": "反馈已处理" if success else "处理反馈时出错"
+        })
+    except Exception as e:
+        logger.error(f"处理反馈请求错误: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+
+@app.route('/api/train', methods=['POST'])
+async def handle_train():
+    """处理训练请求"""
+    try:
+        data = await request.get_json()
+        training_request = TrainingRequest(**data)
+
+        response = await asyncio.to_thread(lambda: services.trainer.train_single_item(training_request))
+        return jsonify(response.dict())
+    except Exception as e:
+        logger.error(f"处理训练请求错误: {str(e)}")
+        return jsonify({
+            "success": False,
+            "message": f"训练失败: {str(e)}",
+            "training_data_id": None
+        }), 400
+
+@app.route('/api/train/jobs', methods=['POST'])
+async def handle_create_training_job():
+    """创建并在后台启动训练任务，立即返回任务ID"""
+    try:
+        job_request = TrainingJobRequest(**(await request.get_json()))
+
+        def create_and_start():
+            # 统计文件条目数需要读取文件，在线程中执行
+            training_jobs = services.training_jobs
+            job = training_jobs.create(training_jobs.resolve_patterns(job_request.files), job_request.batch_size)
+            return training_jobs.start(job.job_id)
+
+        job = await asyncio.to_thread(create_and_start)
+        return jsonify(job.to_dict()), 202
+    except Exception as e:
+        logger.error(f"创建训练任务错误: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 400
+
+@app.route('/api/train/jobs', methods=['GET'])
+async def handle_list_training_jobs():
+    """列出训练任务"""
+    # 任务状态从检查点文件读取，在线程中执行
+    jobs = await asyncio.to_thread(lambda: services.training_jobs.list_jobs())
+    return jsonify([job.to_dict() for job in jobs])
+
+@app.route('/api/train/jobs/<job_id>', methods=['GET'])
+async def handle_get_training_job(job_id):
+    """查询训练任务的状态和进度"""
+    job = await asyncio.to_thread(lambda: services.training_jobs.get(job_id))
+    if job is None:
+        return jsonify({"success": False, "error": f"训练任务不存在: {job_id}"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/train/jobs/<job_id>/resume', methods=['POST'])
+async def handle_resume_training_job(job_id):
+    """从检查点继续失败的训练任务"""
+    try:
+        job = await asyncio.to_thread(lambda: services.training_jobs.start(job_id))
+        return jsonify(job.to_dict()), 202
+    except KeyError as e:
+        return jsonify({"success": False, "error": e.args[0]}), 404
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 409
+
+@app.route('/metrics')
+async def handle_metrics():
+    """以Prometheus文本格式导出指标"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5000)